@@ -20,11 +20,24 @@ import webbrowser
 import queue
 import platform
 import re
+import shlex
+import codecs
+import socket
+import select
+import struct
+import stat
+import array
+import hashlib
+import io
+import tarfile
+import posixpath
+import fnmatch
 import tempfile
 import shutil
 import urllib.request
 import ctypes
 from functools import partial
+from collections import namedtuple, OrderedDict, deque
 
 # 修复PIL导入问题
 try:
@@ -59,7 +72,3539 @@ except ImportError:
     BOOTSTRAP_AVAILABLE = False
     print("警告: ttkbootstrap未安装，将使用默认主题")
 
+class ADBError(Exception):
+    """ADB服务端返回FAIL或协议错误"""
+    pass
+
+
+class ADBServerUnavailable(ADBError):
+    """无法连接到adb server"""
+    pass
+
+
+class ADBSyncFailure(ADBError):
+    """设备拒绝了某个sync请求（文件不存在、无权限等），与连接故障无关"""
+    pass
+
+
+class ADBConnectionPool:
+    """ADB服务端连接池
+
+    ADB协议的连接在切换transport或请求服务后即为一次性连接，
+    因此连接池负责预先建立空闲连接（省去建连开销）并限制并发连接数。
+    """
+
+    def __init__(self, host="127.0.0.1", port=5037, max_connections=8, max_idle=2, timeout=5):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_connections = max_connections
+        self._in_use = 0
+        self._idle = []
+        self._refilling = False
+        self._lock = threading.Lock()
+        self._slots = threading.Condition(self._lock)
+
+    def _open(self):
+        """建立新连接"""
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise ADBServerUnavailable(f"无法连接adb server: {e}") from e
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def _is_alive(sock):
+        """检查空闲连接是否仍然可用（服务端关闭后会变为可读）"""
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            return not readable
+        except (OSError, ValueError):
+            return False
+
+    def resize(self, max_connections):
+        """调整最大并发连接数（已借出的连接不受影响）"""
+        with self._slots:
+            self.max_connections = max_connections
+            self._slots.notify_all()
+
+    def acquire(self, timeout=None):
+        """获取一个连接"""
+        with self._slots:
+            if not self._slots.wait_for(lambda: self._in_use < self.max_connections,
+                                        timeout if timeout is not None else self.timeout):
+                raise ADBError("ADB连接池已满")
+            self._in_use += 1
+        try:
+            with self._lock:
+                while self._idle:
+                    sock = self._idle.pop()
+                    if self._is_alive(sock):
+                        sock.settimeout(self.timeout)
+                        return sock
+                    sock.close()
+            return self._open()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release_slot(self):
+        with self._slots:
+            self._in_use -= 1
+            self._slots.notify()
+
+    def release(self, sock):
+        """归还连接（连接已被使用，直接关闭，并在后台线程中补充空闲连接）"""
+        try:
+            sock.close()
+        except OSError:
+            pass
+        self._release_slot()
+        with self._lock:
+            if self._refilling or len(self._idle) >= self.max_idle:
+                return
+            self._refilling = True
+        threading.Thread(target=self._refill, daemon=True).start()
+
+    def _refill(self):
+        """补充预建立的空闲连接（同一时间只有一个补充线程）"""
+        try:
+            while True:
+                with self._lock:
+                    if len(self._idle) >= self.max_idle:
+                        return
+                try:
+                    sock = self._open()
+                except ADBError:
+                    return
+                with self._lock:
+                    if len(self._idle) < self.max_idle:
+                        self._idle.append(sock)
+                        continue
+                sock.close()
+                return
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+
+class ADBServerClient:
+    """ADB服务端协议客户端
+
+    直接通过socket与本地adb server（默认 localhost:5037）通信，
+    支持 host:devices、host:transport:<serial>、shell:/exec: 等服务，
+    避免每条命令都启动一个adb进程。
+    """
+
+    SHELL_V2_STDIN = 0
+    SHELL_V2_STDOUT = 1
+    SHELL_V2_STDERR = 2
+    SHELL_V2_EXIT = 3
+    SHELL_V2_CLOSE_STDIN = 4
+
+    # 不支持shell v2时在命令后输出退出码，格式为 "\n<标记><退出码>\n"
+    EXIT_MARKER = b"@@ADBTB_EXIT "
+
+    def __init__(self, host="127.0.0.1", port=5037, timeout=10, max_connections=8):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool = ADBConnectionPool(host, port, max_connections=max_connections, timeout=timeout)
+        self._features = {}
+
+    # ---- 底层协议 ----
+
+    @staticmethod
+    def _recv_exact(sock, size):
+        """读取指定长度的数据"""
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            chunk = sock.recv(remaining)
+            if not chunk:
+                raise ADBError("ADB连接意外关闭")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    @staticmethod
+    def _recv_all(sock):
+        """读取数据直到连接关闭"""
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _read_length_prefixed(self, sock):
+        """读取4位十六进制长度前缀的数据"""
+        length = int(self._recv_exact(sock, 4), 16)
+        return self._recv_exact(sock, length)
+
+    def _read_status(self, sock):
+        """读取OKAY/FAIL状态"""
+        status = self._recv_exact(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            message = self._read_length_prefixed(sock).decode("utf-8", errors="ignore")
+            raise ADBError(message)
+        raise ADBError(f"未知的ADB响应: {status!r}")
+
+    def _send_request(self, sock, request):
+        """发送请求并检查状态"""
+        data = request.encode("utf-8")
+        sock.sendall(b"%04x" % len(data) + data)
+        self._read_status(sock)
+
+    # ---- host服务 ----
+
+    def is_available(self):
+        """检查adb server是否可以连接"""
+        try:
+            self.host_request("host:version")
+            return True
+        except (OSError, ADBError):
+            return False
+
+    def host_request(self, request):
+        """执行host服务请求并返回响应内容"""
+        sock = self.pool.acquire()
+        try:
+            self._send_request(sock, request)
+            return self._read_length_prefixed(sock).decode("utf-8", errors="ignore")
+        finally:
+            self.pool.release(sock)
+
+    def devices(self):
+        """获取设备列表，返回 [(serial, state), ...]"""
+        return self.parse_devices(self.host_request("host:devices"))
+
+    @staticmethod
+    def parse_devices(text):
+        """解析host:devices的输出"""
+        devices = []
+        for line in text.splitlines():
+            if "\t" in line:
+                serial, state = line.split("\t", 1)
+                devices.append((serial.strip(), state.strip()))
+        return devices
+
+    def connect_device(self, address):
+        """连接网络设备"""
+        return self.host_request(f"host:connect:{address}")
+
+    def disconnect_device(self, address=""):
+        """断开网络设备"""
+        return self.host_request(f"host:disconnect:{address}")
+
+    def open_host_stream(self, request):
+        """为长连接的host服务（如host:track-devices）单独建立连接，不占用连接池"""
+        sock = self.pool._open()
+        try:
+            self._send_request(sock, request)
+            return sock
+        except Exception:
+            sock.close()
+            raise
+
+    def get_features(self, serial):
+        """获取设备支持的特性（带缓存；查询失败时不缓存，设备上线后重新查询）"""
+        if serial and serial in self._features:
+            return self._features[serial]
+        request = f"host-serial:{serial}:features" if serial else "host:features"
+        try:
+            features = set(self.host_request(request).split(","))
+        except ADBError:
+            return set()
+        if serial:
+            self._features[serial] = features
+        return features
+
+    # ---- 设备服务 ----
+
+    def open_service(self, serial, service, timeout=None):
+        """切换到设备transport并打开服务，返回已就绪的socket（调用方负责release）
+
+        连接池已满时最多等待 timeout 秒（未指定时使用连接池的默认等待时间）。
+        """
+        sock = self.pool.acquire(timeout)
+        try:
+            sock.settimeout(timeout if timeout is not None else self.timeout)
+            self._send_request(sock, f"host:transport:{serial}" if serial else "host:transport-any")
+            self._send_request(sock, service)
+            return sock
+        except Exception:
+            self.pool.release(sock)
+            raise
+
+    def shell(self, serial, command, timeout=None):
+        """执行shell命令，返回 (returncode, stdout_bytes, stderr_bytes)"""
+        use_v2 = "shell_v2" in self.get_features(serial)
+        service = f"shell,v2,raw:{command}" if use_v2 else f"shell:{self._with_exit_marker(command)}"
+        sock = self.open_service(serial, service, timeout)
+        try:
+            if use_v2:
+                return self._read_shell_v2(sock)
+            stdout, returncode = self._split_exit_marker(self._recv_all(sock))
+            return returncode, stdout, b""
+        finally:
+            self.pool.release(sock)
+
+    @classmethod
+    def _with_exit_marker(cls, command):
+        """旧版shell协议不返回退出码，在命令后（换行分隔，兼容末尾的注释和&）输出退出码标记"""
+        return f"{command}\nprintf '\\n{cls.EXIT_MARKER.decode()}%s\\n' $?"
+
+    @classmethod
+    def _split_exit_marker(cls, output):
+        """从旧版shell协议的输出中分离退出码，返回 (输出, 退出码)；没有标记时（例如命令中执行了exit）退出码为0"""
+        index = output.rfind(b"\n" + cls.EXIT_MARKER)
+        if index < 0:
+            return output, 0
+        code = output[index + 1 + len(cls.EXIT_MARKER):].strip()
+        # 使用pty的旧设备会把换行转换为\r\n
+        if output[index - 1:index] == b"\r":
+            index -= 1
+        return output[:index], int(code) if code.isdigit() else 0
+
+    def _read_shell_v2(self, sock):
+        """解析shell v2协议数据包"""
+        stdout, stderr = [], []
+        returncode = 0
+        while True:
+            header = sock.recv(5)
+            if not header:
+                break
+            if len(header) < 5:
+                header += self._recv_exact(sock, 5 - len(header))
+            packet_id, length = struct.unpack("<BI", header)
+            payload = self._recv_exact(sock, length) if length else b""
+            if packet_id == self.SHELL_V2_STDOUT:
+                stdout.append(payload)
+            elif packet_id == self.SHELL_V2_STDERR:
+                stderr.append(payload)
+            elif packet_id == self.SHELL_V2_EXIT:
+                returncode = payload[0] if payload else 0
+                break
+        return returncode, b"".join(stdout), b"".join(stderr)
+
+    def shell_stream(self, serial, command, on_output, cancel_event=None, timeout=None, on_idle=None):
+        """流式执行shell命令，返回退出码
+        
+        输出到达时回调 on_output(stream, data)；cancel_event被设置时中止并返回None；
+        超过timeout秒抛出socket.timeout。
+        """
+        use_v2 = "shell_v2" in self.get_features(serial)
+        service = f"shell,v2,raw:{command}" if use_v2 else f"shell:{self._with_exit_marker(command)}"
+        sock = self.open_service(serial, service)
+        deadline = time.time() + timeout if timeout else None
+        buffer = bytearray()
+        marker = b"\n" + self.EXIT_MARKER
+        try:
+            sock.settimeout(0.2)
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                if deadline is not None and time.time() > deadline:
+                    raise socket.timeout("shell命令执行超时")
+                try:
+                    chunk = sock.recv(65536)
+                except socket.timeout:
+                    if on_idle:
+                        on_idle()
+                    continue
+                if not chunk:
+                    if use_v2:
+                        return 0
+                    output, returncode = self._split_exit_marker(bytes(buffer))
+                    if output:
+                        on_output("stdout", output)
+                    return returncode
+                if not use_v2:
+                    # 保留可能是退出码标记开头的末尾数据，其余立即输出
+                    buffer += chunk
+                    index = buffer.find(marker)
+                    if index >= 0:
+                        keep = index - 1 if buffer[index - 1:index] == b"\r" else index
+                    else:
+                        keep = max(len(buffer) - len(marker) - 1, 0)
+                    if keep:
+                        on_output("stdout", bytes(buffer[:keep]))
+                        del buffer[:keep]
+                    continue
+                    
+                buffer += chunk
+                while len(buffer) >= 5:
+                    packet_id, length = struct.unpack_from("<BI", buffer)
+                    if len(buffer) < 5 + length:
+                        break
+                    payload = bytes(buffer[5:5 + length])
+                    del buffer[:5 + length]
+                    if packet_id == self.SHELL_V2_STDOUT:
+                        on_output("stdout", payload)
+                    elif packet_id == self.SHELL_V2_STDERR:
+                        on_output("stderr", payload)
+                    elif packet_id == self.SHELL_V2_EXIT:
+                        return payload[0] if payload else 0
+        finally:
+            self.pool.release(sock)
+
+    def exec_out(self, serial, command, timeout=None):
+        """通过exec:服务执行命令，返回原始输出字节"""
+        sock = self.open_service(serial, f"exec:{command}", timeout)
+        try:
+            return self._recv_all(sock)
+        finally:
+            self.pool.release(sock)
+
+    def open_sync(self, serial, timeout=None):
+        """打开sync服务会话（用于目录列表、文件状态和文件传输）"""
+        features = self.get_features(serial)
+        sock = self.open_service(serial, "sync:", timeout)
+        return ADBSyncSession(self, sock, features)
+
+    def list_dir(self, serial, path):
+        """通过sync协议列出目录内容"""
+        with self.open_sync(serial) as sync:
+            return sync.list(path)
+
+    def stat_path(self, serial, path):
+        """通过sync协议获取文件状态，文件不存在时返回None"""
+        with self.open_sync(serial) as sync:
+            return sync.stat(path)
+
+    def reboot(self, serial, target=""):
+        """重启设备"""
+        sock = self.open_service(serial, f"reboot:{target}")
+        try:
+            return self._recv_all(sock)
+        finally:
+            self.pool.release(sock)
+
+    def close(self):
+        """关闭连接池"""
+        self.pool.close()
+
+
+# sync协议返回的目录项/文件状态；uid、gid在v1协议下不可用，ls回退解析时为用户名/组名
+SyncEntry = namedtuple("SyncEntry", ["name", "mode", "size", "mtime", "uid", "gid"])
+SyncEntry.__new__.__defaults__ = (None, None)
+
+
+class ADBSyncSession:
+    """ADB sync协议会话
+
+    请求格式为 4字节ID + 小端32位长度 + 数据；设备支持ls_v2/stat_v2时
+    使用LIS2/STA2获取64位文件大小和完整的属主信息，否则使用LIST/STAT。
+    """
+
+    DATA_MAX = 64 * 1024
+    DENT_V1 = struct.Struct("<IIII")
+    DENT_V2 = struct.Struct("<IQQIIIIQqqqI")
+    STAT_V1 = struct.Struct("<III")
+    STAT_V2 = struct.Struct("<IQQIIIIQqqq")
+
+    def __init__(self, client, sock, features):
+        self.client = client
+        self.sock = sock
+        self.list_v2 = "ls_v2" in features
+        self.stat_v2 = "stat_v2" in features
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _send(self, command, data=b""):
+        """发送sync请求"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.sock.sendall(command + struct.pack("<I", len(data)) + data)
+
+    def _recv(self, size):
+        return self.client._recv_exact(self.sock, size)
+
+    def _raise_fail(self):
+        """读取FAIL响应中的错误信息并抛出异常"""
+        length = struct.unpack("<I", self._recv(4))[0]
+        raise ADBSyncFailure(self._recv(length).decode("utf-8", errors="ignore"))
+
+    def list(self, path):
+        """列出目录内容，返回 [SyncEntry, ...]（不含 . 和 ..）"""
+        entries = []
+        if self.list_v2:
+            self._send(b"LIS2", path)
+            while True:
+                response = self._recv(4)
+                if response == b"FAIL":
+                    self._raise_fail()
+                fields = self.DENT_V2.unpack(self._recv(self.DENT_V2.size))
+                if response == b"DONE":
+                    break
+                if response != b"DNT2":
+                    raise ADBError(f"未知的sync响应: {response!r}")
+                error, _dev, _ino, mode, _nlink, uid, gid, size, _atime, mtime, _ctime, name_length = fields
+                name = self._recv(name_length).decode("utf-8", errors="replace")
+                if not error and name not in (".", ".."):
+                    entries.append(SyncEntry(name, mode, size, mtime, uid, gid))
+        else:
+            self._send(b"LIST", path)
+            while True:
+                response = self._recv(4)
+                if response == b"FAIL":
+                    self._raise_fail()
+                mode, size, mtime, name_length = self.DENT_V1.unpack(self._recv(self.DENT_V1.size))
+                if response == b"DONE":
+                    break
+                if response != b"DENT":
+                    raise ADBError(f"未知的sync响应: {response!r}")
+                name = self._recv(name_length).decode("utf-8", errors="replace")
+                if name not in (".", ".."):
+                    entries.append(SyncEntry(name, mode, size, mtime))
+        return entries
+
+    def stat(self, path):
+        """获取文件状态，文件不存在时返回None"""
+        self._send(b"STA2" if self.stat_v2 else b"STAT", path)
+        return self._resolve_links([path], [self._read_stat(path)])[0]
+
+    def stat_many(self, paths, batch_size=256):
+        """批量获取文件状态：一次发送多个请求再依次读取响应，避免逐个等待往返"""
+        results = []
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start:start + batch_size]
+            results.extend(self._resolve_links(batch, self._stat_batch(batch)))
+        return results
+
+    def _stat_batch(self, paths):
+        command = b"STA2" if self.stat_v2 else b"STAT"
+        self.sock.sendall(b"".join(command + struct.pack("<I", len(path.encode("utf-8"))) + path.encode("utf-8")
+                                   for path in paths))
+        return [self._read_stat(path) for path in paths]
+
+    def _resolve_links(self, paths, results):
+        """v1的STAT相当于lstat，不跟随符号链接（例如 /sdcard）
+
+        对 "链接/." 执行STAT时路径解析会经过链接，得到的是目标目录的状态；
+        指向文件的链接无法这样解析，保留链接本身的状态。STA2本身跟随链接，无需处理。
+        """
+        if self.stat_v2:
+            return results
+        links = [i for i, result in enumerate(results) if result is not None and stat.S_ISLNK(result.mode)]
+        if not links:
+            return results
+        results = list(results)
+        targets = self._stat_batch([paths[i].rstrip("/") + "/." for i in links])
+        for i, target in zip(links, targets):
+            if target is not None and stat.S_ISDIR(target.mode):
+                results[i] = target._replace(name=results[i].name)
+        return results
+
+    def _read_stat(self, path):
+        name = path.rstrip("/").rsplit("/", 1)[-1] or "/"
+        if self.stat_v2:
+            response = self._recv(4)
+            if response == b"FAIL":
+                self._raise_fail()
+            error, _dev, _ino, mode, _nlink, uid, gid, size, _atime, mtime, _ctime = self.STAT_V2.unpack(
+                self._recv(self.STAT_V2.size))
+            if error:
+                return None
+            return SyncEntry(name, mode, size, mtime, uid, gid)
+        response = self._recv(4)
+        if response == b"FAIL":
+            self._raise_fail()
+        mode, size, mtime = self.STAT_V1.unpack(self._recv(self.STAT_V1.size))
+        if mode == 0:
+            return None
+        return SyncEntry(name, mode, size, mtime)
+
+    def send(self, fileobj, remote_path, mode, mtime, on_data=None):
+        """通过SEND把文件对象的内容写入设备文件（设备端会自动创建上级目录）"""
+        self._send(b"SEND", f"{remote_path},{mode}")
+        while True:
+            data = fileobj.read(self.DATA_MAX)
+            if not data:
+                break
+            self.sock.sendall(b"DATA" + struct.pack("<I", len(data)) + data)
+            if on_data:
+                on_data(len(data))
+        self.sock.sendall(b"DONE" + struct.pack("<I", int(mtime) & 0xffffffff))
+        response = self._recv(4)
+        if response == b"FAIL":
+            self._raise_fail()
+        if response != b"OKAY":
+            raise ADBError(f"未知的sync响应: {response!r}")
+        self._recv(4)
+
+    def recv(self, remote_path, fileobj, on_data=None):
+        """通过RECV读取设备文件内容并写入文件对象"""
+        self._send(b"RECV", remote_path)
+        while True:
+            response = self._recv(4)
+            if response == b"FAIL":
+                self._raise_fail()
+            length = struct.unpack("<I", self._recv(4))[0]
+            if response == b"DONE":
+                break
+            if response != b"DATA":
+                raise ADBError(f"未知的sync响应: {response!r}")
+            fileobj.write(self._recv(length))
+            if on_data:
+                on_data(length)
+
+    def close(self):
+        """结束sync会话"""
+        if self.sock is None:
+            return
+        try:
+            self._send(b"QUIT")
+        except OSError:
+            pass
+        self.client.pool.release(self.sock)
+        self.sock = None
+
+
+def parse_ls_output(text):
+    """解析 ls -la 的输出为 [SyncEntry, ...]（sync协议不可用时的回退方案）
+
+    兼容toybox（日期为 YYYY-MM-DD HH:MM）和busybox（日期为 Mon DD HH:MM）格式，
+    文件名中的空格会被保留。
+    """
+    entries = []
+    for line in text.splitlines():
+        if line.startswith('total') or not line.strip():
+            continue
+        parts = line.split(None, 5)
+        if len(parts) < 6 or len(parts[0]) < 10:
+            continue
+        permissions = parts[0]
+        # 设备文件的大小列为 "major, minor"
+        rest = parts[5]
+        size_text = parts[4].rstrip(",")
+        if parts[4].endswith(","):
+            size_text, rest = "0", rest.split(None, 1)[1] if " " in rest else ""
+        if re.match(r"\d{4}-\d{2}-\d{2}", rest):
+            fields = rest.split(None, 2)
+            date_text, name_index = " ".join(fields[:2]), 2
+            date_format = "%Y-%m-%d %H:%M"
+        else:
+            fields = rest.split(None, 3)
+            date_text, name_index = " ".join(fields[:3]), 3
+            date_format = "%b %d %H:%M" if ":" in date_text else "%b %d %Y"
+        if len(fields) <= name_index:
+            continue
+        name = fields[name_index]
+        if permissions.startswith('l') and " -> " in name:
+            name = name.split(" -> ", 1)[0]
+        if name in (".", ".."):
+            continue
+            
+        mode = {'d': stat.S_IFDIR, 'l': stat.S_IFLNK, 'c': stat.S_IFCHR, 'b': stat.S_IFBLK,
+                'p': stat.S_IFIFO, 's': stat.S_IFSOCK}.get(permissions[0], stat.S_IFREG)
+        for i, char in enumerate(permissions[1:10]):
+            if char not in '-STL':
+                mode |= 1 << (8 - i)
+        try:
+            if date_format == "%b %d %H:%M":
+                # busybox对当年的文件不显示年份
+                date_text, date_format = f"{time.localtime().tm_year} {date_text}", "%Y %b %d %H:%M"
+            mtime = int(time.mktime(time.strptime(date_text, date_format)))
+        except (ValueError, OverflowError):
+            mtime = 0
+        try:
+            size = int(size_text)
+        except ValueError:
+            size = 0
+        entries.append(SyncEntry(name, mode, size, mtime, parts[2], parts[3]))
+    return entries
+
+
+def normalize_device_path(path):
+    """规范化设备路径（统一分隔符、解析 ../，始终为绝对路径）"""
+    path = posixpath.normpath("/" + path.replace("\\", "/").strip())
+    return "/" + path.lstrip("/")
+
+
+class DirectoryCache:
+    """设备目录列表缓存
+
+    以 (设备序列号, 目录路径) 为键保存目录的修改时间、列表内容和列出的时间，
+    目录修改时间未变化时可以直接复用；超出容量时淘汰最久未访问的目录。
+    """
+
+    def __init__(self, max_dirs=256, max_entries=500000):
+        self.max_dirs = max_dirs
+        self.max_entries = max_entries
+        self._dirs = OrderedDict()
+        self._entry_count = 0
+        self._lock = threading.Lock()
+
+    def get(self, serial, path):
+        """返回 (目录修改时间, 列表, 列出的时间)，未缓存时返回None"""
+        with self._lock:
+            cached = self._dirs.get((serial, path))
+            if cached is not None:
+                self._dirs.move_to_end((serial, path))
+            return cached
+
+    def put(self, serial, path, mtime, entries):
+        with self._lock:
+            old = self._dirs.pop((serial, path), None)
+            if old is not None:
+                self._entry_count -= len(old[1])
+            self._dirs[(serial, path)] = (mtime, entries, time.time())
+            self._entry_count += len(entries)
+            while len(self._dirs) > 1 and (len(self._dirs) > self.max_dirs or self._entry_count > self.max_entries):
+                _key, (_mtime, evicted, _listed) = self._dirs.popitem(last=False)
+                self._entry_count -= len(evicted)
+
+    def invalidate(self, serial=None, path=None):
+        """清除缓存；不指定参数时清除全部"""
+        with self._lock:
+            for key in list(self._dirs):
+                if (serial is None or key[0] == serial) and (path is None or key[1] == path):
+                    self._entry_count -= len(self._dirs.pop(key)[1])
+
+    @staticmethod
+    def diff(old, new):
+        """比较两次列表，返回 (新增, 删除, 变化) 的文件名列表"""
+        old_map = {entry.name: entry for entry in old}
+        new_map = {entry.name: entry for entry in new}
+        added = [name for name in new_map if name not in old_map]
+        removed = [name for name in old_map if name not in new_map]
+        changed = [name for name, entry in new_map.items()
+                   if name in old_map and old_map[name][1:4] != entry[1:4]]
+        return added, removed, changed
+
+
+class DeviceFileIndex:
+    """设备文件搜索索引
+
+    保存搜索根目录下每个目录的修改时间和目录项（名称、大小、修改时间、是否目录），
+    持久化为本地JSON。更新时目录修改时间未变化的目录直接复用，只重新列出变化的目录；
+    复用目录中子目录的修改时间和文件的大小、修改时间（原地修改文件不会改变目录的修改时间）
+    通过批量STAT重新获取。搜索只在内存中的扁平列表上进行。
+    """
+
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, path, serial, root):
+        self.path = path
+        self.serial = serial
+        self.root = normalize_device_path(root)
+        self.dirs = {}
+        self.built = None
+        self._flat = []
+        # 搜索和存储空间分析共用同一个索引，更新必须依次进行
+        self._refresh_lock = threading.Lock()
+        self.load()
+
+    @property
+    def file_count(self):
+        return len(self._flat)
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("root") == self.root:
+                self.dirs = data.get("dirs", {})
+                self.built = data.get("built")
+        except (OSError, ValueError):
+            self.dirs = {}
+        self._rebuild_flat()
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"serial": self.serial, "root": self.root, "built": self.built, "dirs": self.dirs}, f)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def _rebuild_flat(self):
+        flat = []
+        for directory, (_mtime, entries) in self.dirs.items():
+            prefix = directory.rstrip("/") + "/"
+            for name, size, mtime, is_dir in entries:
+                flat.append((name.lower(), prefix + name, size, mtime, is_dir))
+        self._flat = flat
+
+    def refresh(self, client, on_progress=None, cancel_event=None, on_dir=None, force=False):
+        """遍历设备目录树更新索引，返回 (列出的目录数, 复用的目录数)
+
+        on_dir(目录, 目录项) 在每个目录处理完后立即回调；force为True时忽略修改时间重新列出所有目录。
+        已有其他更新在进行时等待其完成，之后的更新可以复用它刚列出的目录。
+        """
+        while not self._refresh_lock.acquire(timeout=0.2):
+            if cancel_event is not None and cancel_event.is_set():
+                raise TransferCancelled()
+        try:
+            return self._refresh(client, on_progress, cancel_event, on_dir, force)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, client, on_progress, cancel_event, on_dir, force):
+        old_dirs = self.dirs
+        new_dirs = {}
+        listed = reused = 0
+        last_report = 0
+        with client.open_sync(self.serial) as sync:
+            root_stat = sync.stat(self.root)
+            if root_stat is None or not stat.S_ISDIR(root_stat.mode):
+                raise ADBError(f"{self.root}: 目录不存在")
+            pending = [(self.root, root_stat.mtime)]
+            unknown = []
+            deferred = []
+
+            def finish_dir(directory, mtime, entries):
+                new_dirs[directory] = [mtime, entries]
+                if on_dir:
+                    on_dir(directory, entries)
+
+            while pending or unknown or deferred:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise TransferCancelled()
+                if not pending:
+                    # 复用的目录：子目录需要重新获取修改时间；文件原地修改不会改变目录的修改时间，
+                    # 也要重新获取大小和修改时间。两者合并为一次批量STAT
+                    files = [(entry, directory.rstrip("/") + "/" + entry[0])
+                             for directory, _mtime, entries in deferred for entry in entries if not entry[3]]
+                    results = sync.stat_many(unknown + [path for _entry, path in files])
+                    for child, child_stat in zip(unknown, results):
+                        if child_stat is not None and stat.S_ISDIR(child_stat.mode):
+                            pending.append((child, child_stat.mtime))
+                    for (entry, _path), file_stat in zip(files, results[len(unknown):]):
+                        if file_stat is not None:
+                            entry[1], entry[2] = file_stat.size, file_stat.mtime
+                    for directory, mtime, entries in deferred:
+                        finish_dir(directory, mtime, entries)
+                    unknown = []
+                    deferred = []
+                    continue
+                    
+                directory, mtime = pending.pop()
+                prefix = directory.rstrip("/") + "/"
+                cached = old_dirs.get(directory)
+                if not force and cached is not None and cached[0] == mtime:
+                    entries = [list(entry) for entry in cached[1]]
+                    unknown.extend(prefix + name for name, _size, _mtime, is_dir in entries if is_dir)
+                    deferred.append((directory, mtime, entries))
+                    reused += 1
+                else:
+                    entries = []
+                    for entry in sync.list(directory):
+                        is_dir = stat.S_ISDIR(entry.mode)
+                        entries.append([entry.name, entry.size, entry.mtime, is_dir])
+                        if is_dir:
+                            pending.append((prefix + entry.name, entry.mtime))
+                    listed += 1
+                    finish_dir(directory, mtime, entries)
+                
+                if on_progress and time.time() - last_report >= self.PROGRESS_INTERVAL:
+                    last_report = time.time()
+                    on_progress(len(new_dirs), sum(len(item[1]) for item in new_dirs.values()))
+                    
+        self.dirs = new_dirs
+        self.built = time.time()
+        self._rebuild_flat()
+        self.save()
+        return listed, reused
+
+    def search(self, query, min_size=None, max_size=None, limit=2000):
+        """按名称（子串或通配符，忽略大小写）和大小搜索，返回 (结果, 匹配总数)"""
+        query = query.strip().lower()
+        if any(ch in query for ch in "*?["):
+            pattern = re.compile(fnmatch.translate(query))
+            match_name = lambda name: pattern.match(name) is not None
+        else:
+            match_name = lambda name: query in name
+        results = []
+        total = 0
+        for name, path, size, mtime, is_dir in self._flat:
+            if query and not match_name(name):
+                continue
+            if (min_size is not None or max_size is not None) and is_dir:
+                continue
+            if min_size is not None and size < min_size:
+                continue
+            if max_size is not None and size > max_size:
+                continue
+            total += 1
+            if len(results) < limit:
+                results.append((path, size, mtime, is_dir))
+        return results, total
+
+
+class DiskUsageTree:
+    """目录占用空间统计
+
+    每收到一个目录的列表就把其中文件的大小累加到该目录及所有上级目录，
+    扫描过程中随时可以按大小从大到小读取任意目录的子项。
+    """
+
+    def __init__(self, root):
+        self.root = normalize_device_path(root)
+        self.totals = {}
+        self.counts = {}
+        self.files = {}
+        self.subdirs = {}
+        self.version = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_index(cls, index):
+        """从已有的文件索引直接生成统计"""
+        tree = cls(index.root)
+        for directory, (_mtime, entries) in list(index.dirs.items()):
+            tree.add_dir(directory, entries)
+        return tree
+
+    def add_dir(self, directory, entries):
+        files = []
+        subdirs = []
+        size = 0
+        for name, entry_size, _mtime, is_dir in entries:
+            if is_dir:
+                subdirs.append(name)
+            else:
+                files.append((name, entry_size))
+                size += entry_size
+        with self._lock:
+            self.files[directory] = files
+            self.subdirs[directory] = subdirs
+            path = directory
+            while True:
+                self.totals[path] = self.totals.get(path, 0) + size
+                self.counts[path] = self.counts.get(path, 0) + len(files)
+                if path == self.root or path == "/":
+                    break
+                path = posixpath.dirname(path)
+            self.version += 1
+
+    def total(self, path):
+        with self._lock:
+            return self.totals.get(path, 0), self.counts.get(path, 0)
+
+    def children(self, directory):
+        """目录的子项 [(名称, 完整路径, 大小, 文件数, 是否目录), ...]，按大小从大到小排序"""
+        prefix = directory.rstrip("/") + "/"
+        with self._lock:
+            rows = [(name, prefix + name, self.totals.get(prefix + name, 0), self.counts.get(prefix + name, 0), True)
+                    for name in self.subdirs.get(directory, [])]
+            rows.extend((name, prefix + name, size, None, False) for name, size in self.files.get(directory, []))
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+
+def format_size(num_bytes):
+    """格式化字节数"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(num_bytes) < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def format_duration(seconds):
+    """格式化时长"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+class TransferRecord:
+    """一次传输的进度记录，可在任意线程中更新"""
+
+    RATE_WINDOW = 3.0
+
+    def __init__(self, record_id, description, device, direction, total_bytes=0):
+        self.id = record_id
+        self.description = description
+        self.device = device
+        self.direction = direction
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.started = time.time()
+        self.finished = None
+        self.status = "传输中"
+        self.error = None
+        self._samples = deque([(self.started, 0)])
+
+    def update(self, done_bytes, total_bytes=None):
+        """更新已传输字节数（累计值）"""
+        now = time.time()
+        self.done_bytes = done_bytes
+        if total_bytes is not None:
+            self.total_bytes = total_bytes
+        self._samples.append((now, done_bytes))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.RATE_WINDOW:
+            self._samples.popleft()
+
+    def add(self, num_bytes):
+        self.update(self.done_bytes + num_bytes)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def average_rate(self):
+        return self.done_bytes / max(self.elapsed, 0.001)
+
+    @property
+    def instant_rate(self):
+        """最近几秒内的速率"""
+        if self.finished:
+            return self.average_rate
+        first_time, first_bytes = self._samples[0]
+        duration = time.time() - first_time
+        return (self.done_bytes - first_bytes) / duration if duration > 0 else 0
+
+    @property
+    def eta(self):
+        """预计剩余秒数，总大小未知时返回None"""
+        rate = self.instant_rate or self.average_rate
+        if not self.total_bytes or not rate:
+            return None
+        return max(self.total_bytes - self.done_bytes, 0) / rate
+
+    def to_dict(self):
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "description": self.description,
+            "device": self.device,
+            "direction": self.direction,
+            "bytes": self.done_bytes,
+            "elapsed": round(self.elapsed, 2),
+            "rate": round(self.average_rate),
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class TransferTracker:
+    """跟踪进行中的传输并保存已完成传输的历史（含吞吐量）"""
+
+    HISTORY_LIMIT = 200
+
+    def __init__(self, history_path=None):
+        self.history_path = history_path
+        self._active = OrderedDict()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.history = []
+        self.version = 0
+        self.load()
+
+    def load(self):
+        if not self.history_path:
+            return
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                self.history = json.load(f)[-self.HISTORY_LIMIT:]
+        except (OSError, ValueError):
+            self.history = []
+
+    def save(self):
+        if not self.history_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+            with open(self.history_path, 'w', encoding='utf-8') as f:
+                json.dump(self.history, f, ensure_ascii=False, indent=1)
+        except OSError:
+            pass
+
+    def start(self, description, device, direction, total_bytes=0):
+        """登记一次新的传输"""
+        with self._lock:
+            self._seq += 1
+            record = TransferRecord(self._seq, description, device, direction, total_bytes)
+            self._active[record.id] = record
+        return record
+
+    def finish(self, record, status="完成", error=None):
+        """结束传输并写入历史"""
+        record.finished = time.time()
+        record.status = status
+        record.error = error
+        with self._lock:
+            self._active.pop(record.id, None)
+            self.history.append(record.to_dict())
+            del self.history[:-self.HISTORY_LIMIT]
+            self.version += 1
+        self.save()
+
+    def active(self):
+        with self._lock:
+            return list(self._active.values())
+
+    def clear_history(self):
+        with self._lock:
+            self.history = []
+            self.version += 1
+        self.save()
+
+
+class LRUFileCache:
+    """按总大小淘汰最久未使用文件的本地文件缓存
+
+    每个缓存项以键（由设备序列号、路径、大小、修改时间等计算）保存在独立的子目录中，
+    文件保留原始文件名以便系统按扩展名打开；索引记录大小和最近访问时间。
+    频繁访问时索引最多每 SAVE_INTERVAL 秒写入一次，退出前调用 flush() 写入剩余的变化。
+    """
+
+    SAVE_INTERVAL = 5
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        self._index = {}
+        self._total = 0
+        self._dirty = False
+        self._saved_at = 0
+        self.load()
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+        self._total = sum(entry["size"] for entry in self._index.values())
+
+    def save(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = self.index_path + ".tmp"
+            with self._lock:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._index, f, ensure_ascii=False)
+                self._dirty = False
+                self._saved_at = time.time()
+            os.replace(temp_path, self.index_path)
+        except OSError:
+            pass
+
+    def flush(self):
+        """写入尚未保存的索引变化"""
+        if self._dirty:
+            self.save()
+
+    def _changed(self):
+        self._dirty = True
+        if time.time() - self._saved_at >= self.SAVE_INTERVAL:
+            self.save()
+
+    def path_for(self, key, filename):
+        """缓存项的文件路径（用于下载），目录会自动创建"""
+        item_dir = os.path.join(self.directory, key[:2], key)
+        os.makedirs(item_dir, exist_ok=True)
+        return os.path.join(item_dir, filename)
+
+    def discard(self, key):
+        """删除未登记的缓存项目录（下载失败或取消后调用）"""
+        with self._lock:
+            if key in self._index:
+                return
+        shutil.rmtree(os.path.join(self.directory, key[:2], key), ignore_errors=True)
+
+    def get(self, key):
+        """命中时返回文件路径并更新访问时间，未命中返回None"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            if not os.path.exists(entry["file"]):
+                self._total -= self._index.pop(key)["size"]
+                return None
+            entry["access"] = time.time()
+        self._changed()
+        return entry["file"]
+
+    def put(self, key, path, info=None):
+        """登记已下载到 path_for() 路径的文件，并按容量淘汰旧文件"""
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._total -= old["size"]
+            self._index[key] = {"file": path, "size": os.path.getsize(path), "access": time.time(), "info": info}
+            self._total += self._index[key]["size"]
+            if self._total > self.max_bytes:
+                self._evict(keep=key)
+        self._changed()
+
+    def total_size(self):
+        with self._lock:
+            return self._total
+
+    def _remove(self, key):
+        """删除缓存项的文件并移出索引；文件仍被占用（例如Windows上正被其他程序打开）时保留，返回是否已删除"""
+        entry = self._index[key]
+        try:
+            shutil.rmtree(os.path.dirname(entry["file"]))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # 保留在索引中，下次淘汰时重试
+            return False
+        del self._index[key]
+        self._total -= entry["size"]
+        return True
+
+    def _evict(self, keep=None):
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]["access"]):
+            if self._total <= self.max_bytes:
+                break
+            if key != keep:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+        self.save()
+
+
+# 批量传输中的单个文件
+TransferItem = namedtuple("TransferItem", ["source", "target", "size", "mtime", "mode"])
+
+
+class TransferCancelled(Exception):
+    """传输被取消"""
+
+
+class BulkTransfer:
+    """多连接并行的批量文件传输
+
+    先遍历本地或设备端目录树生成文件清单，再按大小切分为工作单元
+    （大文件单独成为一个单元，小文件合并），由多个sync连接并行处理。
+    """
+
+    UNIT_BYTES = 8 * 1024 * 1024
+    UNIT_FILES = 64
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, client, serial, streams=4, on_progress=None, cancel_event=None):
+        self.client = client
+        self.serial = serial
+        self.streams = max(1, streams)
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event or threading.Event()
+        self._lock = threading.Lock()
+        self._last_progress = 0
+        self.total_bytes = 0
+        self.total_files = 0
+        self.done_bytes = 0
+        self.done_files = 0
+        self.started = 0
+
+    @staticmethod
+    def plan_push(local_path, remote_path):
+        """生成推送清单，返回 (文件列表, 需要创建的空目录列表)"""
+        local_path = os.path.abspath(local_path)
+        if os.path.isfile(local_path):
+            st = os.stat(local_path)
+            return [TransferItem(local_path, remote_path, st.st_size, st.st_mtime,
+                                 stat.S_IFREG | (st.st_mode & 0o777))], []
+        items, empty_dirs = [], []
+        for root, dirs, files in os.walk(local_path):
+            relative = os.path.relpath(root, local_path).replace(os.sep, "/")
+            remote_dir = remote_path.rstrip("/") if relative == "." else f"{remote_path.rstrip('/')}/{relative}"
+            if not dirs and not files:
+                empty_dirs.append(remote_dir)
+            for name in files:
+                source = os.path.join(root, name)
+                try:
+                    st = os.stat(source)
+                except OSError:
+                    continue
+                items.append(TransferItem(source, f"{remote_dir}/{name}", st.st_size, st.st_mtime,
+                                          stat.S_IFREG | (st.st_mode & 0o777)))
+        return items, empty_dirs
+
+    def plan_pull(self, remote_path, local_path):
+        """遍历设备端目录树生成拉取清单，返回 (文件列表, 需要创建的本地目录列表)"""
+        items, local_dirs = [], [local_path]
+        with self.client.open_sync(self.serial) as sync:
+            remote_stat = sync.stat(remote_path)
+            if remote_stat is None:
+                raise ADBError(f"{remote_path}: 路径不存在")
+            if not stat.S_ISDIR(remote_stat.mode):
+                return [TransferItem(remote_path, local_path, remote_stat.size, remote_stat.mtime, remote_stat.mode)], []
+            pending = [(remote_path.rstrip("/") or "/", local_path)]
+            while pending:
+                if self.cancel_event.is_set():
+                    raise TransferCancelled()
+                remote_dir, local_dir = pending.pop()
+                for entry in sync.list(remote_dir):
+                    remote_child = f"{remote_dir.rstrip('/')}/{entry.name}"
+                    local_child = os.path.join(local_dir, entry.name)
+                    if stat.S_ISDIR(entry.mode):
+                        local_dirs.append(local_child)
+                        pending.append((remote_child, local_child))
+                    elif stat.S_ISREG(entry.mode):
+                        items.append(TransferItem(remote_child, local_child, entry.size, entry.mtime, entry.mode))
+        return items, local_dirs
+
+    @classmethod
+    def split_units(cls, items):
+        """按大小切分工作单元，大文件优先处理"""
+        units, current, current_bytes = [], [], 0
+        for item in sorted(items, key=lambda item: item.size, reverse=True):
+            if item.size >= cls.UNIT_BYTES:
+                units.append([item])
+                continue
+            current.append(item)
+            current_bytes += item.size
+            if current_bytes >= cls.UNIT_BYTES or len(current) >= cls.UNIT_FILES:
+                units.append(current)
+                current, current_bytes = [], 0
+        if current:
+            units.append(current)
+        return units
+
+    def _add_progress(self, num_bytes, files=0):
+        """累计传输量，并按间隔回调进度"""
+        with self._lock:
+            self.done_bytes += num_bytes
+            self.done_files += files
+            now = time.time()
+            due = now - self._last_progress >= self.PROGRESS_INTERVAL
+            if due:
+                self._last_progress = now
+        if self.cancel_event.is_set():
+            raise TransferCancelled()
+        if due and self.on_progress:
+            self.on_progress(self.stats())
+
+    def stats(self):
+        """当前传输统计"""
+        elapsed = max(time.time() - self.started, 0.001)
+        return {
+            "done_bytes": self.done_bytes,
+            "total_bytes": self.total_bytes,
+            "done_files": self.done_files,
+            "total_files": self.total_files,
+            "elapsed": elapsed,
+            "rate": self.done_bytes / elapsed,
+        }
+
+    def _push_unit(self, sync, item):
+        with open(item.source, "rb") as f:
+            sync.send(f, item.target, item.mode, item.mtime, self._add_progress)
+
+    def _pull_unit(self, sync, item):
+        try:
+            with open(item.target, "wb") as f:
+                sync.recv(item.source, f, self._add_progress)
+            if item.mtime:
+                os.utime(item.target, (item.mtime, item.mtime))
+        except BaseException:
+            # 删除不完整的文件
+            try:
+                os.remove(item.target)
+            except OSError:
+                pass
+            raise
+
+    def push(self, items, empty_dirs=()):
+        """并行推送文件，返回传输结果"""
+        for i in range(0, len(empty_dirs), 50):
+            self.client.shell(self.serial, "mkdir -p " + " ".join(shlex.quote(d) for d in empty_dirs[i:i + 50]))
+        return self._run(items, self._push_unit)
+
+    def pull(self, items, local_dirs=()):
+        """并行拉取文件，返回传输结果"""
+        for local_dir in local_dirs:
+            os.makedirs(local_dir, exist_ok=True)
+        return self._run(items, self._pull_unit)
+
+    def _run(self, items, handler):
+        """由多个工作线程各自建立sync连接，从队列中领取工作单元"""
+        self.total_bytes = sum(item.size for item in items)
+        self.total_files = len(items)
+        self.started = time.time()
+        units = queue.Queue()
+        for unit in self.split_units(items):
+            units.put(unit)
+        failed = []
+
+        def worker():
+            sync = None
+            try:
+                while not self.cancel_event.is_set():
+                    try:
+                        unit = units.get_nowait()
+                    except queue.Empty:
+                        break
+                    for item in unit:
+                        if self.cancel_event.is_set():
+                            break
+                        try:
+                            if sync is None:
+                                sync = self.client.open_sync(self.serial)
+                            handler(sync, item)
+                            self._add_progress(0, 1)
+                        except TransferCancelled:
+                            break
+                        except (ADBError, OSError) as e:
+                            failed.append((item.source, str(e)))
+                            # 出错后连接状态未知，重新建立
+                            if sync is not None:
+                                sync.close()
+                                sync = None
+            finally:
+                if sync is not None:
+                    sync.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(self.streams, max(units.qsize(), 1)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result = self.stats()
+        result["failed"] = failed
+        result["cancelled"] = self.cancel_event.is_set()
+        return result
+
+
+class ArchiveTransfer:
+    """通过tar流传输整个目录，适合包含大量小文件的目录
+
+    拉取时设备端 tar -c 的输出经 exec: 服务传回，主机端用tarfile流模式边接收边解包；
+    推送时主机端用tarfile流模式打包，经shell v2的标准输入交给设备端 tar -x。
+    两端都不生成中间归档文件，避免了sync协议逐个文件往返的开销。
+    """
+
+    SMALL_FILE_SIZE = 256 * 1024
+    MIN_FILES = 200
+    STDIN_PACKET = 32 * 1024
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, client, serial, compress=False, on_progress=None, cancel_event=None):
+        self.client = client
+        self.serial = serial
+        self.compress = compress
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event or threading.Event()
+        self.total_bytes = 0
+        self.total_files = 0
+        self.done_bytes = 0
+        self.done_files = 0
+        self.started = 0
+        self.failed = []
+        self._last_progress = 0
+
+    @classmethod
+    def should_use(cls, items):
+        """文件数量多且平均大小较小时使用tar流"""
+        if len(items) < cls.MIN_FILES:
+            return False
+        return sum(item.size for item in items) / len(items) < cls.SMALL_FILE_SIZE
+
+    def stats(self):
+        elapsed = max(time.time() - self.started, 0.001)
+        return {
+            "done_bytes": self.done_bytes,
+            "total_bytes": self.total_bytes,
+            "done_files": self.done_files,
+            "total_files": self.total_files,
+            "elapsed": elapsed,
+            "rate": self.done_bytes / elapsed,
+            "failed": list(self.failed),
+            "cancelled": False,
+        }
+
+    def _file_done(self, size):
+        self.done_files += 1
+        self.done_bytes += size
+        if self.cancel_event.is_set():
+            raise TransferCancelled()
+        now = time.time()
+        if self.on_progress and now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.on_progress(self.stats())
+
+    @staticmethod
+    def _safe_member(member):
+        """只解包目录内的普通文件和目录，拒绝绝对路径和 .. """
+        parts = member.name.replace("\\", "/").split("/")
+        if member.name.startswith("/") or ".." in parts:
+            return False
+        return member.isfile() or member.isdir()
+
+    def pull(self, remote_dir, local_dir, items=()):
+        """拉取设备目录的内容到本地目录；items为预先遍历得到的文件清单（用于统计进度）"""
+        self.total_files = len(items)
+        self.total_bytes = sum(item.size for item in items)
+        self.started = time.time()
+        os.makedirs(local_dir, exist_ok=True)
+        flags = "czf" if self.compress else "cf"
+        command = f"tar -{flags} - -C {shlex.quote(remote_dir)} ."
+        # shell v2 分开传回标准错误和退出码，可以知道哪些文件没有读取成功；旧设备只能丢弃错误输出
+        use_v2 = "shell_v2" in self.client.get_features(self.serial)
+        service = f"shell,v2,raw:{command}" if use_v2 else f"exec:{command} 2>/dev/null"
+        sock = self.client.open_service(self.serial, service, timeout=60)
+        client = self.client
+        stderr = []
+        status = {"returncode": None}
+
+        class SocketReader:
+            pending = b""
+
+            @classmethod
+            def read(cls, size):
+                if not use_v2:
+                    return sock.recv(min(size, 1024 * 1024))
+                while not cls.pending and status["returncode"] is None:
+                    packet_id, length = struct.unpack("<BI", client._recv_exact(sock, 5))
+                    payload = client._recv_exact(sock, length) if length else b""
+                    if packet_id == ADBServerClient.SHELL_V2_STDOUT:
+                        cls.pending = payload
+                    elif packet_id == ADBServerClient.SHELL_V2_STDERR:
+                        stderr.append(payload)
+                    elif packet_id == ADBServerClient.SHELL_V2_EXIT:
+                        status["returncode"] = payload[0] if payload else 0
+                data, cls.pending = cls.pending[:size], cls.pending[size:]
+                return data
+
+        extracted = set()
+        try:
+            with tarfile.open(fileobj=SocketReader(), mode="r|gz" if self.compress else "r|") as tar:
+                for member in tar:
+                    if not self._safe_member(member):
+                        continue
+                    if hasattr(tarfile, "data_filter"):
+                        tar.extract(member, local_dir, filter="data")
+                    else:
+                        tar.extract(member, local_dir)
+                    if member.isfile():
+                        extracted.add(posixpath.normpath(member.name))
+                        self._file_done(member.size)
+            # 归档结束后读完剩余的错误输出和退出码
+            while use_v2 and status["returncode"] is None:
+                SocketReader.read(65536)
+        except tarfile.TarError as e:
+            try:
+                while use_v2 and status["returncode"] is None:
+                    SocketReader.read(65536)
+            except (ADBError, OSError):
+                pass
+            detail = b"".join(stderr).decode("utf-8", errors="replace").strip()
+            raise ADBError(f"tar流解析失败（设备可能不支持tar）: {detail or e}")
+        finally:
+            self.client.pool.release(sock)
+
+        errors = b"".join(stderr).decode("utf-8", errors="replace").splitlines()
+        if status["returncode"] and not extracted and items:
+            raise ADBError(f"设备端tar打包失败: {errors[-1] if errors else '返回码 ' + str(status['returncode'])}")
+        # 清单中tar没有传回的文件（无权限、读取出错等）记为失败
+        prefix = remote_dir.rstrip("/") + "/"
+        for item in items:
+            relative = item.source[len(prefix):] if item.source.startswith(prefix) else posixpath.basename(item.source)
+            if relative in extracted:
+                continue
+            message = next((line for line in errors if relative in line), None)
+            self.failed.append((item.source, message or (errors[-1] if errors else "未包含在tar流中")))
+        return self.stats()
+
+    def push(self, local_dir, remote_dir):
+        """把本地目录的内容推送到设备目录"""
+        entries = []
+        for root, dirs, files in os.walk(local_dir):
+            relative = os.path.relpath(root, local_dir).replace(os.sep, "/")
+            entries.append((root, "." if relative == "." else f"./{relative}"))
+            for name in files:
+                path = os.path.join(root, name)
+                entries.append((path, f"./{name}" if relative == "." else f"./{relative}/{name}"))
+        files = [path for path, _arcname in entries if os.path.isfile(path)]
+        self.total_files = len(files)
+        self.total_bytes = sum(os.path.getsize(path) for path in files)
+        self.started = time.time()
+
+        flags = "xzf" if self.compress else "xf"
+        command = f"mkdir -p {shlex.quote(remote_dir)} && tar -{flags} - -C {shlex.quote(remote_dir)}"
+        use_v2 = "shell_v2" in self.client.get_features(self.serial)
+        service = f"shell,v2,raw:{command}" if use_v2 else f"exec:{command}"
+        sock = self.client.open_service(self.serial, service, timeout=60)
+        packet = self.STDIN_PACKET
+
+        class StdinWriter:
+            @staticmethod
+            def write(data):
+                if not use_v2:
+                    sock.sendall(data)
+                    return len(data)
+                view = memoryview(data)
+                for offset in range(0, len(view), packet):
+                    chunk = view[offset:offset + packet]
+                    sock.sendall(struct.pack("<BI", ADBServerClient.SHELL_V2_STDIN, len(chunk)) + chunk)
+                return len(data)
+
+        try:
+            with tarfile.open(fileobj=StdinWriter(), mode="w|gz" if self.compress else "w|") as tar:
+                for path, arcname in entries:
+                    tar.add(path, arcname=arcname, recursive=False)
+                    if os.path.isfile(path):
+                        self._file_done(os.path.getsize(path))
+            if use_v2:
+                sock.sendall(struct.pack("<BI", ADBServerClient.SHELL_V2_CLOSE_STDIN, 0))
+                returncode, _out, err = self.client._read_shell_v2(sock)
+                if returncode != 0:
+                    raise ADBError(f"设备端tar解包失败: {err.decode('utf-8', errors='ignore').strip()}")
+            else:
+                # 旧设备没有shell v2，关闭写入端后等待设备端结束
+                sock.shutdown(socket.SHUT_WR)
+                self.client._recv_all(sock)
+        finally:
+            self.client.pool.release(sock)
+        return self.stats()
+
+
+class FolderSync:
+    """本地文件夹与设备文件夹之间的增量同步
+
+    按大小和修改时间比较两侧的文件：大小不同视为已变化，大小相同但修改时间
+    不同时计算两侧的MD5（设备端批量执行md5sum）再判断。只传输新增和变化的
+    文件，可选删除目标端多余的文件；plan() 的结果即为预览报告。
+    """
+
+    HASH_BATCH = 50
+
+    def __init__(self, client, serial, local_root, remote_root, direction, delete_extra=False,
+                 streams=4, on_progress=None, cancel_event=None):
+        self.client = client
+        self.serial = serial
+        self.local_root = os.path.abspath(local_root)
+        self.remote_root = remote_root.rstrip("/") or "/"
+        self.direction = direction
+        self.delete_extra = delete_extra
+        self.streams = streams
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event or threading.Event()
+
+    def local_path(self, relative):
+        return os.path.join(self.local_root, *relative.split("/"))
+
+    def remote_path(self, relative):
+        return f"{self.remote_root.rstrip('/')}/{relative}"
+
+    def scan_local(self):
+        """返回 {相对路径: (大小, 修改时间)}"""
+        files = {}
+        for root, _dirs, names in os.walk(self.local_root):
+            relative_dir = os.path.relpath(root, self.local_root).replace(os.sep, "/")
+            for name in names:
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                relative = name if relative_dir == "." else f"{relative_dir}/{name}"
+                files[relative] = (st.st_size, int(st.st_mtime))
+        return files
+
+    def scan_remote(self):
+        """通过sync协议遍历设备目录，返回 {相对路径: (大小, 修改时间)}；目录不存在时为空"""
+        files = {}
+        with self.client.open_sync(self.serial) as sync:
+            root_stat = sync.stat(self.remote_root)
+            if root_stat is None or not stat.S_ISDIR(root_stat.mode):
+                return files
+            pending = [""]
+            while pending:
+                if self.cancel_event.is_set():
+                    raise TransferCancelled()
+                relative_dir = pending.pop()
+                for entry in sync.list(self.remote_path(relative_dir) if relative_dir else self.remote_root):
+                    relative = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                    if stat.S_ISDIR(entry.mode):
+                        pending.append(relative)
+                    elif stat.S_ISREG(entry.mode):
+                        files[relative] = (entry.size, entry.mtime)
+        return files
+
+    def _remote_md5(self, relatives):
+        """在设备端批量计算MD5"""
+        hashes = {}
+        for i in range(0, len(relatives), self.HASH_BATCH):
+            batch = relatives[i:i + self.HASH_BATCH]
+            paths = {self.remote_path(relative): relative for relative in batch}
+            # 大文件的md5sum可能远超socket超时，流式读取且不设总超时，可随同步取消
+            output = []
+            returncode = self.client.shell_stream(self.serial, "md5sum " + " ".join(shlex.quote(path) for path in paths),
+                                                  lambda stream, data: stream == "stdout" and output.append(data),
+                                                  self.cancel_event)
+            if returncode is None:
+                raise TransferCancelled()
+            for line in b"".join(output).decode("utf-8", errors="replace").splitlines():
+                parts = line.split(None, 1)
+                if len(parts) == 2 and parts[1] in paths:
+                    hashes[paths[parts[1]]] = parts[0]
+        return hashes
+
+    @staticmethod
+    def _local_md5(path):
+        digest = hashlib.md5()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def plan(self):
+        """比较两侧文件，返回同步计划（预览报告）"""
+        local_files = self.scan_local()
+        remote_files = self.scan_remote()
+        source, target = (local_files, remote_files) if self.direction == "push" else (remote_files, local_files)
+
+        new, changed, ambiguous = [], [], []
+        for relative, (size, mtime) in source.items():
+            if relative not in target:
+                new.append(relative)
+            elif target[relative][0] != size:
+                changed.append(relative)
+            elif target[relative][1] != mtime:
+                ambiguous.append(relative)
+
+        # 大小相同但修改时间不同：比较内容哈希
+        if ambiguous:
+            remote_hashes = self._remote_md5(ambiguous)
+            for relative in ambiguous:
+                if self.cancel_event.is_set():
+                    raise TransferCancelled()
+                try:
+                    same = remote_hashes.get(relative) == self._local_md5(self.local_path(relative))
+                except OSError:
+                    same = False
+                if not same:
+                    changed.append(relative)
+
+        deleted = sorted(relative for relative in target if relative not in source) if self.delete_extra else []
+        new.sort()
+        changed.sort()
+        return {
+            "source": source,
+            "new": new,
+            "changed": changed,
+            "deleted": deleted,
+            "hashed": len(ambiguous),
+            "unchanged": len(source) - len(new) - len(changed),
+            "transfer_bytes": sum(source[relative][0] for relative in new + changed),
+        }
+
+    def execute(self, plan):
+        """按计划传输新增/变化的文件并删除多余文件，返回传输结果"""
+        engine = BulkTransfer(self.client, self.serial, self.streams, self.on_progress, self.cancel_event)
+        items = []
+        for relative in plan["new"] + plan["changed"]:
+            size, mtime = plan["source"][relative]
+            if self.direction == "push":
+                try:
+                    mode = stat.S_IFREG | (os.stat(self.local_path(relative)).st_mode & 0o777)
+                except OSError:
+                    mode = stat.S_IFREG | 0o644
+                items.append(TransferItem(self.local_path(relative), self.remote_path(relative), size, mtime, mode))
+            else:
+                items.append(TransferItem(self.remote_path(relative), self.local_path(relative), size, mtime, 0))
+
+        if self.direction == "push":
+            result = engine.push(items)
+            if result["cancelled"]:
+                plan = dict(plan, deleted=[])
+            for i in range(0, len(plan["deleted"]), self.HASH_BATCH):
+                batch = plan["deleted"][i:i + self.HASH_BATCH]
+                self.client.shell(self.serial, "rm -f " + " ".join(shlex.quote(self.remote_path(r)) for r in batch))
+        else:
+            result = engine.pull(items, sorted({os.path.dirname(item.target) for item in items}))
+            if result["cancelled"]:
+                plan = dict(plan, deleted=[])
+            for relative in plan["deleted"]:
+                try:
+                    os.remove(self.local_path(relative))
+                except OSError as e:
+                    result["failed"].append((self.local_path(relative), str(e)))
+        result["deleted"] = len(plan["deleted"])
+        return result
+
+
+class ResumableTransfer:
+    """可断点续传并校验的大文件拉取
+
+    文件按固定大小分块，通过 exec:dd 读取指定块写入本地 .part 文件；
+    已完成块的SHA-256记录在本地日志中，中断后重新开始时先校验已有的块，
+    再从缺失的块继续。全部完成后比较设备端 sha256sum 与本地哈希，
+    不一致时逐块比对并只重新传输出错的块。
+    """
+
+    CHUNK_SIZE = 4 * 1024 * 1024
+    STREAM_BLOCK = 64 * 1024      # 中断后续传的对齐单位，CHUNK_SIZE 必须是它的整数倍
+    IDLE_TIMEOUT = 30
+    RETRY_LIMIT = 10
+    RETRY_DELAY = 3
+    JOURNAL_INTERVAL = 1.0
+
+    def __init__(self, client, serial, remote_path, local_path, journal_dir, on_progress=None, cancel_event=None):
+        self.client = client
+        self.serial = serial
+        self.remote_path = remote_path
+        self.local_path = local_path
+        self.part_path = local_path + ".part"
+        self.journal_dir = journal_dir
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event or threading.Event()
+        key = hashlib.sha1(f"{serial}|{remote_path}|{os.path.abspath(local_path)}".encode("utf-8")).hexdigest()
+        self.journal_path = os.path.join(journal_dir, f"{key}.json")
+        self.journal = None
+
+    def _load_journal(self, size, mtime):
+        """读取传输日志，远端文件已变化时重新开始"""
+        journal = None
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                journal = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if (not journal or journal.get("size") != size or journal.get("mtime") != mtime
+                or journal.get("chunk_size") != self.CHUNK_SIZE or not os.path.exists(self.part_path)):
+            journal = {"serial": self.serial, "remote": self.remote_path, "local": self.local_path,
+                       "size": size, "mtime": mtime, "chunk_size": self.CHUNK_SIZE, "chunks": {}}
+        self.journal = journal
+
+    def _save_journal(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.journal, f)
+        os.replace(temp_path, self.journal_path)
+
+    def _chunk_length(self, index):
+        return min(self.CHUNK_SIZE, self.journal["size"] - index * self.CHUNK_SIZE)
+
+    def _verify_local_chunks(self, part):
+        """校验本地已有的块，返回校验通过的块数"""
+        chunks = self.journal["chunks"]
+        for index in sorted(chunks, key=int):
+            if self.cancel_event.is_set():
+                raise TransferCancelled()
+            part.seek(int(index) * self.CHUNK_SIZE)
+            data = part.read(self._chunk_length(int(index)))
+            if hashlib.sha256(data).hexdigest() != chunks[index]:
+                del chunks[index]
+        return len(chunks)
+
+    def _wait_retry(self, attempt, error):
+        """失败后等待重试（例如无线调试断线重连）"""
+        if attempt >= self.RETRY_LIMIT:
+            raise ADBError(f"重试 {self.RETRY_LIMIT} 次后仍然失败: {error}")
+        if self.cancel_event.wait(self.RETRY_DELAY):
+            raise TransferCancelled()
+
+    def _fetch_chunk(self, part, index):
+        """把设备文件的一个块写入 .part 文件
+
+        数据边接收边写入；超过 IDLE_TIMEOUT 秒收不到数据或连接中断时重试，
+        从已收到的位置（按 STREAM_BLOCK 对齐）继续，已收到的数据不会丢弃。
+        """
+        expected = self._chunk_length(index)
+        offset = index * self.CHUNK_SIZE
+        received = 0
+        attempt = 0
+        while True:
+            if self.cancel_event.is_set():
+                raise TransferCancelled()
+            attempt += 1
+            received -= received % self.STREAM_BLOCK
+            before = received
+            command = (f"dd if={shlex.quote(self.remote_path)} bs={self.STREAM_BLOCK} "
+                       f"skip={(offset + received) // self.STREAM_BLOCK} "
+                       f"count={-(-(expected - received) // self.STREAM_BLOCK)} 2>/dev/null")
+            try:
+                # socket超时作用于每次接收，即空闲超时，与块大小和链路速度无关
+                sock = self.client.open_service(self.serial, f"exec:{command}", timeout=self.IDLE_TIMEOUT)
+                try:
+                    part.seek(offset + received)
+                    while received < expected:
+                        data = sock.recv(min(1024 * 1024, expected - received))
+                        if not data:
+                            break
+                        part.write(data)
+                        received += len(data)
+                        if self.cancel_event.is_set():
+                            raise TransferCancelled()
+                finally:
+                    self.client.pool.release(sock)
+                if received == expected:
+                    return
+                error = f"块 {index} 长度不符: {received}/{expected}"
+            except socket.timeout:
+                error = f"块 {index} 超过 {self.IDLE_TIMEOUT} 秒没有收到数据"
+            except (ADBError, OSError) as e:
+                error = str(e)
+            if received - received % self.STREAM_BLOCK > before:
+                # 有进展时不计入重试次数（例如无线连接时断时续）
+                attempt = 1
+            self._wait_retry(attempt, error)
+
+    def _run_remote(self, command):
+        """执行耗时的校验命令，不受socket超时限制，可随传输取消"""
+        output = []
+        returncode = self.client.shell_stream(self.serial, command,
+                                              lambda stream, data: stream == "stdout" and output.append(data),
+                                              self.cancel_event)
+        if returncode is None:
+            raise TransferCancelled()
+        return b"".join(output).decode("utf-8", errors="ignore")
+
+    def _remote_hashes(self, chunk_count):
+        """在设备端逐块计算SHA-256（在设备上循环，命令长度与块数无关）"""
+        script = (f"i=0; while [ $i -lt {chunk_count} ]; do "
+                  f"dd if={shlex.quote(self.remote_path)} bs={self.CHUNK_SIZE} skip=$i count=1 2>/dev/null | sha256sum; "
+                  f"i=$((i+1)); done")
+        hashes = [line.split()[0] for line in self._run_remote(script).splitlines() if line.strip()]
+        return dict(enumerate(hashes))
+
+    def _remote_file_hash(self):
+        parts = self._run_remote(f"sha256sum {shlex.quote(self.remote_path)}").split()
+        if not parts or len(parts[0]) != 64:
+            raise ADBError("设备不支持sha256sum，无法校验")
+        return parts[0]
+
+    @staticmethod
+    def _local_file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _progress(self, started, resumed_bytes):
+        if not self.on_progress:
+            return
+        done = sum(self._chunk_length(int(index)) for index in self.journal["chunks"])
+        elapsed = max(time.time() - started, 0.001)
+        self.on_progress({"done_bytes": done, "total_bytes": self.journal["size"], "elapsed": elapsed,
+                          "rate": (done - resumed_bytes) / elapsed})
+
+    def _transfer_chunks(self, part, indexes, started, resumed_bytes):
+        """传输指定的块并定期保存日志"""
+        last_save = time.time()
+        for index in indexes:
+            self._fetch_chunk(part, index)
+            part.seek(index * self.CHUNK_SIZE)
+            self.journal["chunks"][str(index)] = hashlib.sha256(part.read(self._chunk_length(index))).hexdigest()
+            if time.time() - last_save >= self.JOURNAL_INTERVAL:
+                part.flush()
+                self._save_journal()
+                last_save = time.time()
+                self._progress(started, resumed_bytes)
+        part.flush()
+        self._save_journal()
+
+    def pull(self):
+        """执行拉取，返回结果字典（resumed_bytes为本次续传前已完成的字节数）"""
+        remote = self.client.stat_path(self.serial, self.remote_path)
+        if remote is None or not stat.S_ISREG(remote.mode):
+            raise ADBError(f"{self.remote_path}: 不是有效的文件")
+        self._load_journal(remote.size, remote.mtime)
+        chunk_count = -(-remote.size // self.CHUNK_SIZE)
+        started = time.time()
+
+        mode = 'r+b' if os.path.exists(self.part_path) else 'w+b'
+        with open(self.part_path, mode) as part:
+            self._verify_local_chunks(part)
+            resumed_bytes = sum(self._chunk_length(int(index)) for index in self.journal["chunks"])
+            part.truncate(remote.size)
+            missing = [index for index in range(chunk_count) if str(index) not in self.journal["chunks"]]
+            self._transfer_chunks(part, missing, started, resumed_bytes)
+
+            # 整体校验，不一致时逐块比对并重新传输出错的块
+            remote_hash = self._remote_file_hash()
+            part.flush()
+            local_hash = self._local_file_hash(self.part_path)
+            repaired = 0
+            if local_hash != remote_hash:
+                remote_hashes = self._remote_hashes(chunk_count)
+                bad = [index for index in range(chunk_count)
+                       if remote_hashes.get(index) != self.journal["chunks"].get(str(index))]
+                repaired = len(bad)
+                self._transfer_chunks(part, bad, started, resumed_bytes)
+                part.flush()
+                local_hash = self._local_file_hash(self.part_path)
+                if local_hash != remote_hash:
+                    raise ADBError("文件校验失败，设备端文件可能在传输过程中被修改")
+
+        os.replace(self.part_path, self.local_path)
+        if remote.mtime:
+            os.utime(self.local_path, (remote.mtime, remote.mtime))
+        try:
+            os.remove(self.journal_path)
+        except OSError:
+            pass
+        elapsed = max(time.time() - started, 0.001)
+        return {"size": remote.size, "resumed_bytes": resumed_bytes, "repaired_chunks": repaired,
+                "sha256": local_hash, "elapsed": elapsed, "rate": (remote.size - resumed_bytes) / elapsed}
+
+
+class RemoteFileReader:
+    """按需读取设备文件的指定字节范围（用于预览，不下载整个文件）
+
+    读取以 PAGE_SIZE 对齐的页为单位，通过 exec:dd 一次取回连续的多页，
+    已取回的页保存在有上限的LRU缓存中，来回滚动时不会重复传输。
+    """
+
+    PAGE_SIZE = 4096
+    MAX_CACHED_PAGES = 256
+
+    def __init__(self, client, serial, path, size):
+        self.client = client
+        self.serial = serial
+        self.path = path
+        self.size = size
+        self.bytes_fetched = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fetch_pages(self, first, count):
+        command = (f"dd if={shlex.quote(self.path)} bs={self.PAGE_SIZE} skip={first} count={count} 2>/dev/null")
+        data = self.client.exec_out(self.serial, command)
+        with self._lock:
+            self.bytes_fetched += len(data)
+            for index in range(count):
+                page = data[index * self.PAGE_SIZE:(index + 1) * self.PAGE_SIZE]
+                if not page:
+                    break
+                self._pages[first + index] = page
+            while len(self._pages) > self.MAX_CACHED_PAGES:
+                self._pages.popitem(last=False)
+
+    def read(self, offset, length):
+        """读取 [offset, offset+length) 范围的数据，只传输缓存中缺少的页"""
+        offset = max(0, offset)
+        end = min(offset + length, self.size)
+        if end <= offset:
+            return b""
+        first = offset // self.PAGE_SIZE
+        last = (end - 1) // self.PAGE_SIZE
+        
+        # 合并连续缺失的页，一次dd读取
+        missing_start = None
+        for index in range(first, last + 2):
+            with self._lock:
+                cached = index <= last and index in self._pages
+            if index <= last and not cached:
+                if missing_start is None:
+                    missing_start = index
+            elif missing_start is not None:
+                self._fetch_pages(missing_start, index - missing_start)
+                missing_start = None
+                
+        with self._lock:
+            pages = []
+            for index in range(first, last + 1):
+                page = self._pages.get(index, b"")
+                if index in self._pages:
+                    self._pages.move_to_end(index)
+                pages.append(page)
+        data = b"".join(pages)
+        start = offset - first * self.PAGE_SIZE
+        return data[start:start + end - offset]
+
+
+def format_hex_dump(data, offset=0):
+    """格式化为十六进制视图，每行16字节：偏移、十六进制、ASCII"""
+    lines = []
+    for pos in range(0, len(data), 16):
+        row = data[pos:pos + 16]
+        hex_part = " ".join(f"{b:02x}" for b in row)
+        text_part = "".join(chr(b) if 32 <= b < 127 else "." for b in row)
+        lines.append(f"{offset + pos:08x}  {hex_part:<47}  {text_part}")
+    return "\n".join(lines)
+
+
+def looks_like_text(data):
+    """粗略判断数据是否为文本（不含NUL且大部分为可打印字符）"""
+    if not data:
+        return True
+    if b"\0" in data[:8192]:
+        return False
+    sample = data[:8192]
+    printable = sum(1 for b in sample if b >= 32 or b in (9, 10, 13))
+    return printable / len(sample) > 0.9
+
+
+class BatchFileOperation:
+    """把对多个设备文件的同一操作编译为一个shell脚本，一次执行
+
+    每项命令之后输出带序号和返回码的标记行，据此得到每一项的结果和错误信息。
+    修改权限和查看属性时在同一脚本中用 stat 取回结果，无需重新列出目录。
+    """
+
+    MARKER = "@@ADBTB"
+    SCRIPT_LIMIT = 24 * 1024
+    OPERATIONS = ("delete", "move", "copy", "chmod", "stat")
+
+    def __init__(self, operation, paths, target=None, mode=None, recursive=False):
+        if operation not in self.OPERATIONS:
+            raise ValueError(f"未知的操作: {operation}")
+        if operation in ("move", "copy") and not target:
+            raise ValueError("移动或复制需要目标文件夹")
+        if operation == "chmod" and not re.fullmatch(r"[0-7]{3,4}|[ugoa]*[-+=][rwxXst]*(,[ugoa]*[-+=][rwxXst]*)*", mode or ""):
+            raise ValueError(f"无效的权限: {mode}")
+        self.operation = operation
+        self.paths = list(paths)
+        self.target = target
+        self.mode = mode
+        self.recursive = recursive
+
+    def item_command(self, path):
+        quoted = shlex.quote(path)
+        if self.operation == "delete":
+            return f"rm -rf -- {quoted}"
+        if self.operation == "move":
+            return f"mv -- {quoted} {shlex.quote(self.target.rstrip('/') + '/')}"
+        if self.operation == "copy":
+            return f"cp -R -- {quoted} {shlex.quote(self.target.rstrip('/') + '/')}"
+        if self.operation == "chmod":
+            recursive = "-R " if self.recursive else ""
+            return f"chmod {recursive}{shlex.quote(self.mode)} -- {quoted} && stat -c %f -- {quoted}"
+        return f"stat -c '%f|%s|%Y|%U|%G' -- {quoted} && du -sk -- {quoted} | cut -f1"
+
+    def scripts(self):
+        """生成脚本列表，通常只有一个；超过长度限制时分成多个"""
+        header = ""
+        if self.operation in ("move", "copy"):
+            header = f"mkdir -p -- {shlex.quote(self.target)}\n"
+        scripts = []
+        lines = []
+        length = len(header)
+        for index, path in enumerate(self.paths):
+            line = f"{{ {self.item_command(path)}; }} 2>&1; printf '\\n{self.MARKER} {index} %s\\n' $?\n"
+            if lines and length + len(line) > self.SCRIPT_LIMIT:
+                scripts.append(header + "".join(lines))
+                lines = []
+                length = len(header)
+            lines.append(line)
+            length += len(line)
+        if lines:
+            scripts.append(header + "".join(lines))
+        return scripts
+
+    @classmethod
+    def parse_output(cls, output):
+        """解析脚本输出，返回 {序号: (是否成功, 输出)}"""
+        results = {}
+        buffer = []
+        for line in output.splitlines():
+            parts = line.strip().split(" ")
+            if len(parts) == 3 and parts[0] == cls.MARKER and parts[1].isdigit() and parts[2].isdigit():
+                results[int(parts[1])] = (parts[2] == "0", "\n".join(buffer))
+                buffer = []
+            elif line.strip():
+                buffer.append(line.strip())
+        return results
+
+    def run(self, run_shell):
+        """执行操作，run_shell(脚本) 返回 (返回码, 标准输出, 错误输出)
+
+        返回 [(路径, 是否成功, 输出), ...]，顺序与 paths 相同。
+        """
+        results = {}
+        for script in self.scripts():
+            returncode, stdout, stderr = run_shell(script)
+            parsed = self.parse_output(stdout)
+            if not parsed and returncode != 0:
+                raise ADBError(stderr.strip() or f"返回码: {returncode}")
+            results.update(parsed)
+        return [(path,) + results.get(index, (False, "未执行"))
+                for index, path in enumerate(self.paths)]
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+
+
+def make_thumbnail(data, path, size):
+    """用Pillow把图片数据缩小为不超过 size×size 的JPEG缩略图"""
+    image = Image.open(io.BytesIO(data))
+    # JPEG可以直接按比例解码，大幅减少大照片的解码时间
+    image.draft("RGB", (size, size))
+    image.thumbnail((size, size))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.save(path, "JPEG", quality=85)
+
+
+class ThumbnailLoader:
+    """并行获取设备图片并生成缩略图
+
+    缩略图缓存以 (设备, 路径, 大小, 修改时间, 尺寸) 为键，已缓存的图片不访问设备；
+    其余图片由多个工作线程（各自使用独立的sync会话）获取，优先处理当前可见的图片。
+    """
+
+    MAX_IMAGE_SIZE = 64 * 1024 * 1024
+    MAX_SESSION_ERRORS = 3
+
+    def __init__(self, client, serial, cache, items, size=128, streams=4, on_ready=None, cancel_event=None):
+        self.client = client
+        self.serial = serial
+        self.cache = cache
+        self.items = items
+        self.size = size
+        self.streams = max(1, streams)
+        self.on_ready = on_ready
+        self.cancel_event = cancel_event or threading.Event()
+        self.keys = [LRUFileCache.make_key(serial, path, item_size, mtime, size)
+                     for path, item_size, mtime in items]
+        self.fetched = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._visible = range(0)
+        self._pending = set()
+        self._order = deque()
+
+    def cached(self, position):
+        """缩略图文件路径，未缓存时返回None"""
+        return self.cache.get(self.keys[position])
+
+    def set_visible(self, first, last):
+        with self._lock:
+            self._visible = range(first, last)
+
+    def _next(self):
+        with self._lock:
+            for position in self._visible:
+                if position in self._pending:
+                    self._pending.discard(position)
+                    return position
+            while self._order:
+                position = self._order.popleft()
+                if position in self._pending:
+                    self._pending.discard(position)
+                    return position
+        return None
+
+    def _load(self, sync, position):
+        path, size, _mtime = self.items[position]
+        if size > self.MAX_IMAGE_SIZE:
+            with self._lock:
+                self.failed += 1
+            return
+        buffer = io.BytesIO()
+        sync.recv(path, buffer)
+        try:
+            thumbnail_path = self.cache.path_for(self.keys[position], "thumb.jpg")
+            make_thumbnail(buffer.getvalue(), thumbnail_path, self.size)
+        except Exception:
+            # 无法识别或损坏的图片
+            self.cache.discard(self.keys[position])
+            with self._lock:
+                self.failed += 1
+            return
+        self.cache.put(self.keys[position], thumbnail_path, {"device": self.serial, "path": path})
+        with self._lock:
+            self.fetched += 1
+        if self.on_ready:
+            self.on_ready(position)
+
+    def _worker(self):
+        errors = 0
+        while not self.cancel_event.is_set() and errors < self.MAX_SESSION_ERRORS:
+            try:
+                with self.client.open_sync(self.serial) as sync:
+                    while not self.cancel_event.is_set():
+                        position = self._next()
+                        if position is None:
+                            return
+                        try:
+                            self._load(sync, position)
+                        except ADBSyncFailure:
+                            # 设备无法读取该图片（已删除、无权限等）只影响这一张；
+                            # adbd在FAIL后会结束sync会话，因此重新打开，不计入会话错误
+                            with self._lock:
+                                self.failed += 1
+                            break
+            except (ADBError, OSError):
+                # 连接出错时当前图片记为失败，重新打开会话继续
+                with self._lock:
+                    self.failed += 1
+                errors += 1
+
+    def run(self):
+        """获取所有未缓存的缩略图，返回新生成的数量"""
+        missing = [position for position in range(len(self.items)) if self.cached(position) is None]
+        with self._lock:
+            self._pending = set(missing)
+            self._order = deque(missing)
+        workers = [threading.Thread(target=self._worker, daemon=True)
+                   for _ in range(min(self.streams, len(missing)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if self.cancel_event.is_set():
+            raise TransferCancelled()
+        return self.fetched
+
+
+class FileListModel:
+    """数组存储的目录列表模型
+
+    条目按列存放在紧凑数组中，排序只重排索引数组，不涉及界面控件。
+    有上级目录时第0行固定为 "../"。
+    """
+
+    def __init__(self):
+        self.names = []
+        self.modes = array.array('I')
+        self.sizes = array.array('q')
+        self.mtimes = array.array('q')
+        self.order = array.array('I')
+        self.has_parent = False
+        self.sort_key = "name"
+        self.reverse = False
+
+    def set_entries(self, entries, has_parent=False):
+        """替换全部条目并按当前排序方式排序"""
+        self.names = [entry.name for entry in entries]
+        self.modes = array.array('I', (entry.mode for entry in entries))
+        self.sizes = array.array('q', (entry.size for entry in entries))
+        self.mtimes = array.array('q', (entry.mtime for entry in entries))
+        self.has_parent = has_parent
+        self.sort()
+
+    def __len__(self):
+        return len(self.order) + (1 if self.has_parent else 0)
+
+    def is_dir(self, index):
+        return stat.S_ISDIR(self.modes[index])
+
+    def sort(self, key=None, reverse=None):
+        """按名称/大小/修改时间排序，目录始终排在文件之前"""
+        if key is not None:
+            self.sort_key = key
+        if reverse is not None:
+            self.reverse = reverse
+        if self.sort_key == "size":
+            sort_key = self.sizes.__getitem__
+        elif self.sort_key == "mtime":
+            sort_key = self.mtimes.__getitem__
+        else:
+            names = self.names
+            sort_key = lambda index: names[index].lower()
+        dirs = [index for index in range(len(self.names)) if self.is_dir(index)]
+        files = [index for index in range(len(self.names)) if not self.is_dir(index)]
+        dirs.sort(key=sort_key, reverse=self.reverse)
+        files.sort(key=sort_key, reverse=self.reverse)
+        self.order = array.array('I', dirs + files)
+
+    def index_at(self, position):
+        """显示位置对应的条目索引，"../" 行返回None"""
+        if self.has_parent:
+            if position == 0:
+                return None
+            position -= 1
+        return self.order[position]
+
+    def entry(self, position):
+        """显示位置对应的条目，"../" 行返回None"""
+        index = self.index_at(position)
+        if index is None:
+            return None
+        return SyncEntry(self.names[index], self.modes[index], self.sizes[index], self.mtimes[index])
+
+    def positions_of(self, names):
+        """返回指定文件名的显示位置（"../" 行的名称为None）"""
+        offset = 1 if self.has_parent else 0
+        positions = {0} if self.has_parent and None in names else set()
+        for position, index in enumerate(self.order):
+            if self.names[index] in names:
+                positions.add(position + offset)
+        return positions
+
+    def row(self, position):
+        """返回显示位置的 (文本, 列值)"""
+        index = self.index_at(position)
+        if index is None:
+            return "../", ("", "", "")
+        mtime = self.mtimes[index]
+        date = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime)) if mtime else ""
+        name = self.names[index] + "/" if self.is_dir(index) else self.names[index]
+        return name, (self.sizes[index], date, stat.filemode(self.modes[index]))
+
+
+class VirtualFileList:
+    """虚拟化的文件列表视图
+
+    Treeview中只创建可见数量的行，滚动时复用这些行并更新其内容；
+    选中状态按模型中的位置记录，滚出可见区域后依然保留。
+    """
+
+    def __init__(self, tree, scrollbar, model):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.model = model
+        self.first = 0
+        self.slots = []
+        self.selected = set()
+        self.anchor = None
+        self.row_height = 20
+        self.scrollbar.configure(command=self.yview)
+        self.tree.bind("<Configure>", lambda event: self.render())
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        self.tree.bind("<Control-a>", self.select_all)
+        for key, delta in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "page-up"), ("<Next>", "page-down"),
+                           ("<Home>", "home"), ("<End>", "end")):
+            self.tree.bind(key, partial(self.on_key, delta))
+
+    def visible_rows(self):
+        """当前窗口高度可以显示的行数"""
+        top = 25
+        if self.slots:
+            bbox = self.tree.bbox(self.slots[0])
+            if bbox:
+                top, self.row_height = bbox[1], max(bbox[3], 1)
+        return max(1, (self.tree.winfo_height() - top) // self.row_height)
+
+    def reset(self):
+        """模型内容变化后回到顶部并清除选中"""
+        self.first = 0
+        self.selected = set()
+        self.anchor = None
+        self.render()
+
+    def render(self):
+        """把模型中可见区域的内容写入复用的行"""
+        total = len(self.model)
+        count = min(self.visible_rows(), total)
+        self.first = max(0, min(self.first, total - count))
+        while len(self.slots) < count:
+            self.slots.append(self.tree.insert("", tk.END, text=""))
+        while len(self.slots) > count:
+            self.tree.delete(self.slots.pop())
+            
+        selected_slots = []
+        for offset, item in enumerate(self.slots):
+            position = self.first + offset
+            text, values = self.model.row(position)
+            self.tree.item(item, text=text, values=values)
+            if position in self.selected:
+                selected_slots.append(item)
+        self.tree.selection_set(selected_slots)
+        
+        if total:
+            self.scrollbar.set(self.first / total, (self.first + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def position_of(self, item):
+        """行对应的模型位置"""
+        return self.first + self.slots.index(item)
+
+    def selected_positions(self):
+        return sorted(self.selected)
+
+    def selected_names(self):
+        """选中条目的文件名（"../" 行为None）"""
+        names = set()
+        for position in self.selected:
+            if position < len(self.model):
+                entry = self.model.entry(position)
+                names.add(entry.name if entry is not None else None)
+        return names
+
+    def select_all(self, event=None):
+        """选中全部条目（不含 "../" 行）"""
+        start = 1 if self.model.has_parent else 0
+        self.selected = set(range(start, len(self.model)))
+        self.anchor = start if self.selected else None
+        self.render()
+        return "break"
+
+    def keep_selection(self, names):
+        """模型内容更新后按文件名恢复选中，保持当前滚动位置"""
+        self.selected = self.model.positions_of(names)
+        self.anchor = min(self.selected) if self.selected else None
+        self.render()
+
+    def on_select(self, event=None):
+        """同步Treeview选中状态到模型位置（只替换可见区域内的部分）"""
+        visible = set(range(self.first, self.first + len(self.slots)))
+        chosen = {self.position_of(item) for item in self.tree.selection() if item in self.slots}
+        self.selected = (self.selected - visible) | chosen
+        if chosen and (self.anchor is None or self.anchor not in chosen):
+            self.anchor = min(chosen)
+
+    def yview(self, *args):
+        """滚动条回调"""
+        total = len(self.model)
+        if not args or not total:
+            return
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= max(1, len(self.slots) - 1)
+            self.first += amount
+        self.render()
+
+    def scroll(self, amount):
+        self.first += amount
+        self.render()
+        return "break"
+
+    def on_mousewheel(self, event):
+        if platform.system() == "Darwin":
+            return self.scroll(-event.delta)
+        return self.scroll(-3 * int(event.delta / 120))
+
+    def see(self, position):
+        """滚动到指定位置可见"""
+        if position < self.first:
+            self.first = position
+        elif position >= self.first + len(self.slots):
+            self.first = position - max(len(self.slots), 1) + 1
+        self.render()
+
+    def on_key(self, delta, event=None):
+        """键盘移动选中行，越过可见区域时滚动"""
+        total = len(self.model)
+        if not total:
+            return "break"
+        page = max(1, len(self.slots) - 1)
+        current = self.anchor if self.anchor is not None else self.first
+        if delta == "page-up":
+            position = current - page
+        elif delta == "page-down":
+            position = current + page
+        elif delta == "home":
+            position = 0
+        elif delta == "end":
+            position = total - 1
+        else:
+            position = current + delta
+        position = max(0, min(position, total - 1))
+        self.selected = {position}
+        self.anchor = position
+        self.see(position)
+        if self.first <= position < self.first + len(self.slots):
+            self.tree.focus(self.slots[position - self.first])
+        return "break"
+
+
+class ScheduledTask:
+    """调度器中的一个任务"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+    def __init__(self, func, args, kwargs, priority, device, description, key, seq):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.device = device
+        self.description = description
+        self.key = key
+        self.seq = seq
+        self.state = self.QUEUED
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        """任务是否已被取消"""
+        return self.cancel_event.is_set()
+
+    def wait(self, timeout=None):
+        """等待任务结束"""
+        return self.done_event.wait(timeout)
+
+
+class CommandScheduler:
+    """有界、分优先级的命令调度器
+
+    固定数量的工作线程按优先级取任务执行，并限制每台设备同时运行的任务数，
+    避免大量adb命令同时争抢同一条USB链路。后台任务最多占用 max_workers - RESERVED_WORKERS
+    个工作线程，保证交互任务总有空闲的工作线程可用。
+    """
+
+    PRIORITY_INTERACTIVE = 0
+    PRIORITY_BACKGROUND = 10
+    RESERVED_WORKERS = 1
+
+    def __init__(self, max_workers=4, per_device_limit=2, on_change=None):
+        self.max_workers = max_workers
+        self.per_device_limit = per_device_limit
+        self.on_change = on_change
+        self._queue = []
+        self._running = {}
+        self._device_running = {}
+        self._background_running = 0
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stopped = False
+        self._workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker, name=f"scheduler-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, func, *args, priority=PRIORITY_INTERACTIVE, device=None, description="", key=None, **kwargs):
+        """提交任务；若指定key且同key任务仍在排队，则直接返回已排队的任务（必要时提升其优先级）"""
+        with self._cond:
+            if key is not None:
+                for task in self._queue:
+                    if task.key == key:
+                        if priority < task.priority:
+                            task.priority = priority
+                            self._queue.sort(key=lambda t: (t.priority, t.seq))
+                            self._cond.notify()
+                        return task
+            self._seq += 1
+            task = ScheduledTask(func, args, kwargs, priority, device, description, key, self._seq)
+            self._queue.append(task)
+            self._queue.sort(key=lambda t: (t.priority, t.seq))
+            self._cond.notify()
+        self._notify_change()
+        return task
+
+    def cancel(self, task):
+        """取消任务；排队中的任务直接移除，运行中的任务设置取消标记"""
+        task.cancel_event.set()
+        with self._cond:
+            if task in self._queue:
+                self._queue.remove(task)
+                task.state = ScheduledTask.CANCELLED
+                task.done_event.set()
+        self._notify_change()
+
+    def cancel_all(self, device=None, include_running=False):
+        """取消所有（或指定设备的）任务"""
+        with self._cond:
+            tasks = [t for t in self._queue if device is None or t.device == device]
+            if include_running:
+                tasks += [t for t in self._running.values() if device is None or t.device == device]
+        for task in tasks:
+            self.cancel(task)
+        return len(tasks)
+
+    def queue_depth(self):
+        """返回排队和运行中的任务数量"""
+        with self._cond:
+            return {"queued": len(self._queue), "running": len(self._running)}
+
+    def running_tasks(self):
+        """返回运行中的任务列表"""
+        with self._cond:
+            return list(self._running.values())
+
+    def current_task(self):
+        """返回当前工作线程正在执行的任务（不在工作线程中时返回None）"""
+        return getattr(self._local, "task", None)
+
+    def shutdown(self):
+        """停止调度器"""
+        with self._cond:
+            self._stopped = True
+            for task in self._queue:
+                task.cancel_event.set()
+                task.state = ScheduledTask.CANCELLED
+                task.done_event.set()
+            self._queue = []
+            for task in self._running.values():
+                task.cancel_event.set()
+            self._cond.notify_all()
+
+    def _next_task(self):
+        """取出优先级最高且所属设备未达到并发上限的任务（需持有锁）"""
+        background_full = self._background_running >= max(1, self.max_workers - self.RESERVED_WORKERS)
+        for task in self._queue:
+            if background_full and task.priority > self.PRIORITY_INTERACTIVE:
+                continue
+            if task.device is None or self._device_running.get(task.device, 0) < self.per_device_limit:
+                self._queue.remove(task)
+                return task
+        return None
+
+    def _worker(self):
+        """工作线程主循环"""
+        while True:
+            with self._cond:
+                task = None
+                while not self._stopped:
+                    task = self._next_task()
+                    if task:
+                        break
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                task.state = ScheduledTask.RUNNING
+                self._running[task.seq] = task
+                if task.priority > self.PRIORITY_INTERACTIVE:
+                    self._background_running += 1
+                if task.device is not None:
+                    self._device_running[task.device] = self._device_running.get(task.device, 0) + 1
+            self._notify_change()
+
+            self._local.task = task
+            try:
+                task.result = task.func(*task.args, **task.kwargs)
+                task.state = ScheduledTask.CANCELLED if task.cancelled else ScheduledTask.DONE
+            except Exception as e:
+                task.error = e
+                task.state = ScheduledTask.FAILED
+            finally:
+                self._local.task = None
+
+            with self._cond:
+                self._running.pop(task.seq, None)
+                if task.priority > self.PRIORITY_INTERACTIVE:
+                    self._background_running -= 1
+                if task.device is not None:
+                    self._device_running[task.device] -= 1
+                    if not self._device_running[task.device]:
+                        del self._device_running[task.device]
+                # 设备并发名额释放后，可能有其他工作线程可以继续
+                self._cond.notify_all()
+            task.done_event.set()
+            self._notify_change()
+
+    def _notify_change(self):
+        """通知队列状态变化"""
+        if self.on_change:
+            try:
+                self.on_change(self.queue_depth())
+            except Exception:
+                pass
+
+
+class DeviceTracker:
+    """设备跟踪器
+
+    保持一个 host:track-devices 长连接，设备连接、断开或状态变化时立即回调
+    on_change(devices, events)，其中devices为 [(serial, state), ...]，
+    events为 [(event, serial, state), ...]。连接断开后自动重连。
+    """
+
+    def __init__(self, client, on_change, on_status=None, reconnect_delay=2):
+        self.client = client
+        self.on_change = on_change
+        self.on_status = on_status
+        self.reconnect_delay = reconnect_delay
+        self.connected = False
+        self._devices = {}
+        self._running = False
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        """启动跟踪线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止跟踪"""
+        self._running = False
+        sock = self._sock
+        if sock:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def diff_devices(old, new):
+        """比较两次设备列表，返回事件列表"""
+        events = []
+        for serial, state in new.items():
+            if serial not in old:
+                events.append(("connected", serial, state))
+            elif old[serial] != state:
+                events.append(("state", serial, state))
+        for serial, state in old.items():
+            if serial not in new:
+                events.append(("disconnected", serial, state))
+        return events
+
+    def _set_connected(self, connected):
+        """更新订阅状态"""
+        if self.connected != connected:
+            self.connected = connected
+            if self.on_status:
+                self.on_status(connected)
+
+    def _run(self):
+        """跟踪线程主循环"""
+        while self._running:
+            try:
+                self._sock = self.client.open_host_stream("host:track-devices")
+                self._sock.settimeout(1)
+                self._set_connected(True)
+                self._read_updates(self._sock)
+            except (ADBError, OSError):
+                pass
+            finally:
+                if self._sock:
+                    try:
+                        self._sock.close()
+                    except OSError:
+                        pass
+                    self._sock = None
+            self._set_connected(False)
+            
+            # 订阅断开，稍后重连
+            deadline = time.time() + self.reconnect_delay
+            while self._running and time.time() < deadline:
+                time.sleep(0.2)
+
+    def _read_updates(self, sock):
+        """读取长度前缀的设备列表更新"""
+        buffer = bytearray()
+        while self._running:
+            try:
+                chunk = sock.recv(4096)
+            except socket.timeout:
+                continue
+            if not chunk:
+                return
+            buffer += chunk
+            while len(buffer) >= 4:
+                length = int(buffer[:4], 16)
+                if len(buffer) < 4 + length:
+                    break
+                text = bytes(buffer[4:4 + length]).decode("utf-8", errors="ignore")
+                del buffer[:4 + length]
+                devices = ADBServerClient.parse_devices(text)
+                new = dict(devices)
+                events = self.diff_devices(self._devices, new)
+                self._devices = new
+                if events:
+                    self.on_change(devices, events)
+
+
+class OutputLineBatcher:
+    """将命令输出字节流切分为行，并按批次回调 on_lines(stream, lines)"""
+
+    def __init__(self, on_lines, max_lines=500, interval=0.1):
+        self.on_lines = on_lines
+        self.max_lines = max_lines
+        self.interval = interval
+        self._decoders = {}
+        self._partial = {}
+        self._pending = {}
+        self._last_flush = time.time()
+
+    def feed(self, stream, data):
+        """输入一段输出数据"""
+        decoder = self._decoders.get(stream)
+        if decoder is None:
+            decoder = self._decoders[stream] = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        text = self._partial.get(stream, "") + decoder.decode(data)
+        lines = text.split("\n")
+        self._partial[stream] = lines.pop()
+        if lines:
+            self._pending.setdefault(stream, []).extend(line.rstrip("\r") for line in lines)
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        """达到批量行数或时间间隔时回调"""
+        pending = sum(len(lines) for lines in self._pending.values())
+        if pending >= self.max_lines or (pending and time.time() - self._last_flush >= self.interval):
+            self.flush()
+
+    def flush(self, final=False):
+        """回调所有已完整的行；final为True时包括未以换行结尾的内容"""
+        if final:
+            for stream, partial in self._partial.items():
+                if partial:
+                    self._pending.setdefault(stream, []).append(partial.rstrip("\r"))
+            self._partial = {}
+        for stream, lines in self._pending.items():
+            if lines:
+                self.on_lines(stream, lines)
+        self._pending = {}
+        self._last_flush = time.time()
+
+
+# 程序数据目录（日志、缓存等）
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".yys_adb_toolbox")
+
+
+class ConsoleHistory:
+    """控制台历史日志
+
+    控制台控件只保留最近的日志行，被移出的旧日志按顺序写入磁盘上的滚动日志文件，
+    保存日志时再与控件内容合并输出。文件名带有进程号，启动时清理已退出进程遗留的日志文件；
+    dropped_bytes 记录滚动时被删除的最旧日志大小。
+    """
+
+    def __init__(self, directory, max_bytes=20 * 1024 * 1024, backup_count=10):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.base_path = os.path.join(directory, f"console_{os.getpid()}.log")
+        self._lock = threading.Lock()
+        self.dropped_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self.clear()
+        self.sweep_stale()
+
+    @staticmethod
+    def _pid_alive(pid):
+        """进程是否仍在运行"""
+        if platform.system() == "Windows":
+            kernel32 = ctypes.windll.kernel32
+            # PROCESS_QUERY_LIMITED_INFORMATION
+            handle = kernel32.OpenProcess(0x1000, False, pid)
+            if not handle:
+                return False
+            try:
+                exit_code = ctypes.c_ulong()
+                # STILL_ACTIVE = 259
+                return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == 259
+            finally:
+                kernel32.CloseHandle(handle)
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def sweep_stale(self):
+        """删除已退出（包括崩溃）的进程遗留的历史日志文件"""
+        for name in os.listdir(self.directory):
+            match = re.match(r"console_(\d+)\.log(\.\d+)?$", name)
+            if not match or int(match.group(1)) == os.getpid() or self._pid_alive(int(match.group(1))):
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _path(self, index):
+        """第index个备份文件的路径（0为当前文件）"""
+        return self.base_path if index == 0 else f"{self.base_path}.{index}"
+
+    def spill(self, text):
+        """追加被移出控件的日志文本"""
+        with self._lock:
+            with open(self.base_path, 'a', encoding='utf-8') as f:
+                f.write(text)
+                size = f.tell()
+            if size >= self.max_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        """滚动日志文件，超出数量的最旧文件被删除"""
+        oldest = self._path(self.backup_count)
+        if os.path.exists(oldest):
+            self.dropped_bytes += os.path.getsize(oldest)
+            os.remove(oldest)
+        for index in range(self.backup_count - 1, -1, -1):
+            path = self._path(index)
+            if os.path.exists(path):
+                os.replace(path, self._path(index + 1))
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        """按从旧到新的顺序分块读取全部历史日志"""
+        with self._lock:
+            paths = [self._path(i) for i in range(self.backup_count, -1, -1)]
+            paths = [path for path in paths if os.path.exists(path)]
+        for path in paths:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    def clear(self):
+        """删除全部历史日志文件"""
+        with self._lock:
+            self.dropped_bytes = 0
+            for index in range(self.backup_count + 1):
+                path = self._path(index)
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+# 设备信息面板显示的系统属性
+DEVICE_INFO_PROPS = [
+    ("ro.product.model", "设备型号"),
+    ("ro.build.version.release", "Android版本"),
+    ("ro.build.version.sdk", "API级别"),
+    ("ro.product.manufacturer", "制造商"),
+    ("ro.product.brand", "品牌"),
+    ("ro.build.display.id", "系统版本"),
+]
+
+DEVICE_INFO_SECTION = "@@YYS_SECTION@@"
+
+
+# 动态信息各部分对应的shell命令
+DEVICE_INFO_COMMANDS = {
+    "battery": "dumpsys battery 2>/dev/null",
+    "storage": "df /sdcard 2>/dev/null",
+    "memory": "cat /proc/meminfo 2>/dev/null",
+}
+
+
+def build_device_info_script(include_props=True, sections=("battery", "storage", "memory")):
+    """生成一次性收集设备信息的shell脚本（各部分之间用分隔标记隔开）
+    
+    include_props为False时只读取ro.build.fingerprint，sections指定需要的动态信息。
+    """
+    props = "ro.build.fingerprint"
+    if include_props:
+        props = " ".join(prop for prop, _ in DEVICE_INFO_PROPS) + " " + props
+    script = (
+        f"echo {DEVICE_INFO_SECTION}props; "
+        f"for p in {props}; do echo \"$p=$(getprop $p)\"; done"
+    )
+    for section in sections:
+        script += f"; echo {DEVICE_INFO_SECTION}{section}; {DEVICE_INFO_COMMANDS[section]}"
+    return script
+
+
+def parse_device_info(output):
+    """解析设备信息脚本的输出，返回结构化的设备信息字典"""
+    sections = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith(DEVICE_INFO_SECTION):
+            current = line[len(DEVICE_INFO_SECTION):].strip()
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+            
+    info = {"props": {}}
+    
+    for line in sections.get("props", []):
+        if "=" in line:
+            key, value = line.split("=", 1)
+            info["props"][key.strip()] = value.strip()
+            
+    # 未查询的部分不出现在结果中，查询了但解析失败的部分为None
+    if "battery" in sections:
+        info["battery_level"] = None
+        for line in sections["battery"]:
+            if 'level:' in line:
+                info["battery_level"] = line.split(':', 1)[1].strip()
+                break
+                
+    if "storage" in sections:
+        info["storage"] = None
+    storage_lines = [line for line in sections.get("storage", []) if line.strip()]
+    if len(storage_lines) > 1:
+        parts = storage_lines[-1].split()
+        if len(parts) >= 4 and parts[1].isdigit():
+            info["storage"] = {
+                "total": int(parts[1]) // 1024,  # KB to MB
+                "used": int(parts[2]) // 1024,
+                "free": int(parts[3]) // 1024,
+            }
+            
+    if "memory" in sections:
+        info["memory"] = None
+    total_mem = 0
+    free_mem = 0
+    for line in sections.get("memory", []):
+        if line.startswith('MemTotal:'):
+            total_mem = int(line.split()[1]) // 1024  # KB to MB
+        elif line.startswith('MemFree:'):
+            free_mem = int(line.split()[1]) // 1024
+    if total_mem > 0:
+        info["memory"] = {"total": total_mem, "used": total_mem - free_mem, "free": free_mem}
+        
+    return info
+
+
+class DeviceInfoCache:
+    """设备信息缓存
+
+    静态属性（型号、版本等）按 ro.build.fingerprint 缓存，系统未更新时无需重新获取，
+    并可持久化到磁盘；电量、存储、内存等动态信息按字段设置过期时间。
+    """
+
+    # 动态信息字段 -> (脚本中的部分名, 过期时间秒)
+    VOLATILE_FIELDS = {
+        "battery_level": ("battery", 60),
+        "storage": ("storage", 300),
+        "memory": ("memory", 30),
+    }
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fingerprints = {}   # serial -> fingerprint
+        self._static = {}         # fingerprint -> props
+        self._unpinned = {}       # serial -> props（没有fingerprint的设备，只在内存中保留，每次重新获取）
+        self._volatile = {}       # serial -> {field: (value, timestamp)}
+        self.load()
+
+    def load(self):
+        """从磁盘加载静态属性"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._fingerprints = data.get("fingerprints", {})
+            self._static = data.get("static", {})
+        except Exception as e:
+            print(f"加载设备信息缓存失败: {e}")
+
+    def save(self):
+        """保存静态属性到磁盘"""
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._lock:
+                data = {"fingerprints": dict(self._fingerprints), "static": dict(self._static)}
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"保存设备信息缓存失败: {e}")
+
+    def has_static(self, serial):
+        """是否已缓存该设备的静态属性"""
+        with self._lock:
+            return self._fingerprints.get(serial) in self._static
+
+    def fingerprint(self, serial):
+        """设备最近一次查询到的 ro.build.fingerprint，未知时返回None"""
+        with self._lock:
+            return self._fingerprints.get(serial)
+
+    def expired_sections(self, serial):
+        """返回已过期（或从未获取）的动态信息部分名列表"""
+        now = time.time()
+        with self._lock:
+            cached = self._volatile.get(serial, {})
+            return [section for field, (section, ttl) in self.VOLATILE_FIELDS.items()
+                    if field not in cached or now - cached[field][1] >= ttl]
+
+    def update(self, serial, info):
+        """写入一次查询结果，返回静态属性是否仍然有效（fingerprint变化时返回False）"""
+        now = time.time()
+        fingerprint = info["props"].get("ro.build.fingerprint", "")
+        changed = False
+        valid = True
+        with self._lock:
+            # 动态信息与静态属性无关，先保存，fingerprint变化时也不丢弃
+            cached = self._volatile.setdefault(serial, {})
+            for field in self.VOLATILE_FIELDS:
+                if field in info:
+                    cached[field] = (info[field], now)
+            if len(info["props"]) > 1 and not fingerprint:
+                # 没有fingerprint无法判断系统是否更新，不按fingerprint缓存（否则所有这类设备共用一份属性）
+                self._fingerprints.pop(serial, None)
+                self._unpinned[serial] = info["props"]
+            elif len(info["props"]) > 1:
+                changed = (self._fingerprints.get(serial) != fingerprint
+                           or self._static.get(fingerprint) != info["props"])
+                self._fingerprints[serial] = fingerprint
+                self._static[fingerprint] = info["props"]
+                self._unpinned.pop(serial, None)
+            elif fingerprint and self._fingerprints.get(serial) != fingerprint:
+                # 设备系统已更新，静态属性需要重新获取
+                self._fingerprints.pop(serial, None)
+                valid = False
+        if changed and self.path:
+            self.save()
+        return valid
+
+    def get(self, serial):
+        """返回合并后的设备信息字典（包括已过期的动态信息），没有缓存时返回None"""
+        with self._lock:
+            props = self._static.get(self._fingerprints.get(serial)) or self._unpinned.get(serial)
+            volatile = self._volatile.get(serial, {})
+            if props is None and not volatile:
+                return None
+            info = {"props": dict(props or {})}
+            for field, (value, _) in volatile.items():
+                info[field] = value
+            return info
+
+    def invalidate(self, serial):
+        """清除设备的动态信息"""
+        with self._lock:
+            self._volatile.pop(serial, None)
+
+
+# 应用目录中的一个应用
+PackageInfo = namedtuple("PackageInfo", ["package", "label", "apk_path", "version_name", "version_code",
+                                         "uid", "system", "last_update"])
+PackageInfo.__new__.__defaults__ = (None,) * 7
+
+
+def guess_package_label(package, apk_path=None):
+    """推测应用名称：系统应用取APK所在目录名（如 /system/app/Camera2/Camera2.apk），否则取包名最后一段
+
+    真正的应用名需要解析APK资源，逐个获取代价太高。
+    """
+    if apk_path:
+        parent = posixpath.basename(posixpath.dirname(apk_path))
+        if parent and parent not in ("app", "priv-app", "framework") and not parent.startswith(package) \
+                and "==" not in parent:
+            return parent
+    return package.split('.')[-1]
+
+
+def parse_package_list(text):
+    """解析 pm list packages -f [-U] [--show-versioncode] 的输出，返回 [PackageInfo, ...]"""
+    packages = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith("package:"):
+            continue
+        tokens = line[8:].split()
+        apk_path, _, package = tokens[0].rpartition("=")
+        if not package:
+            continue
+        extra = dict(token.split(":", 1) for token in tokens[1:] if ":" in token)
+        version_code = extra.get("versionCode")
+        uid = extra.get("uid", "").split(",")[0]
+        packages.append(PackageInfo(package, guess_package_label(package, apk_path), apk_path or None,
+                                    version_code=int(version_code) if version_code and version_code.isdigit() else None,
+                                    uid=int(uid) if uid.isdigit() else None))
+    return packages
+
+
+class PackageDumpParser:
+    """逐行解析 dumpsys package 输出中 "Packages:" 部分的每个应用块
+
+    feed() 在一个应用块结束时返回该应用的字段字典，其余情况返回None。
+    """
+
+    HEADER = re.compile(r"^\s+Package \[([^\]]+)\]")
+
+    def __init__(self):
+        self.section = None
+        self.fields = None
+
+    def _finish(self):
+        fields, self.fields = self.fields, None
+        return fields
+
+    def feed(self, line):
+        if line and not line[0].isspace():
+            # 新的顶层部分（Packages:、Hidden system packages: 等）
+            done = self._finish()
+            self.section = line.strip()
+            return done
+        match = self.HEADER.match(line)
+        if match:
+            done = self._finish()
+            if self.section == "Packages:":
+                self.fields = {"package": match.group(1)}
+            return done
+        if self.fields is None:
+            return None
+            
+        line = line.strip()
+        fields = self.fields
+        if line.startswith("userId=") and "uid" not in fields:
+            value = line[7:].split()[0]
+            if value.isdigit():
+                fields["uid"] = int(value)
+        elif line.startswith("versionCode=") and "version_code" not in fields:
+            value = line[12:].split()[0]
+            if value.isdigit():
+                fields["version_code"] = int(value)
+        elif line.startswith("versionName=") and "version_name" not in fields:
+            fields["version_name"] = line[12:]
+        elif line.startswith("flags=[") and "system" not in fields:
+            fields["system"] = "SYSTEM" in line[7:].strip(" []").split()
+        elif line.startswith("lastUpdateTime=") and "last_update" not in fields:
+            fields["last_update"] = line[15:]
+        elif line.startswith("codePath=") and "code_path" not in fields:
+            fields["code_path"] = line[9:]
+        return None
+
+    def finish(self):
+        """输出结束时返回最后一个应用块"""
+        return self._finish()
+
+
+class PackageCatalog:
+    """设备应用目录
+
+    用固定次数的设备调用获取全部应用：pm list packages 给出包名、APK路径、UID和版本号，
+    再用一次 dumpsys package packages 流式补充版本名、系统/用户标记和更新时间，
+    不再为每个应用单独执行dumpsys。
+
+    目录按设备保存到本地并记录 ro.build.fingerprint。再次刷新时只执行 pm list，
+    与缓存比较版本号和APK路径（应用更新或重装后都会变化），只对新增和变化的应用执行dumpsys；
+    系统更新（fingerprint变化）或变化太多时重新获取全部信息。
+    """
+
+    LIST_COMMAND = ("getprop ro.build.fingerprint; "
+                    "pm list packages -f -U --show-versioncode 2>/dev/null || pm list packages -f")
+    DUMP_COMMAND = "dumpsys package packages"
+    MAX_INCREMENTAL = 50
+
+    def __init__(self, path=None):
+        self.path = path
+        self.packages = {}
+        self.fingerprint = None
+        self.updated = None
+        self._listed = False
+        # 同一设备可能同时打开多个应用选择窗口，刷新必须依次进行
+        self._refresh_lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.packages = {package: PackageInfo(**fields) for package, fields in data.get("packages", {}).items()}
+            self.fingerprint = data.get("fingerprint")
+            self.updated = data.get("updated")
+        except (OSError, ValueError, TypeError):
+            self.packages = {}
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"fingerprint": self.fingerprint, "updated": self.updated,
+                           "packages": {package: info._asdict() for package, info in self.packages.items()}},
+                          f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def _merge(self, fields):
+        """把dumpsys解析出的字段合并到应用记录，返回更新后的记录"""
+        fields = dict(fields)
+        package = fields.pop("package")
+        code_path = fields.pop("code_path", None)
+        info = self.packages.get(package)
+        if info is None:
+            # pm list 没有列出的应用（例如只为其他用户安装）不加入目录
+            if self._listed:
+                return None
+            info = PackageInfo(package, guess_package_label(package, code_path), code_path)
+        info = info._replace(**{key: value for key, value in fields.items() if value is not None})
+        self.packages[package] = info
+        return info
+
+    def _dump(self, stream_shell, command, on_update):
+        """流式执行dumpsys并合并解析结果"""
+        parser = PackageDumpParser()
+        
+        def on_lines(stream, lines):
+            if stream != "stdout":
+                return
+            updated = []
+            for line in lines:
+                fields = parser.feed(line)
+                if fields:
+                    info = self._merge(fields)
+                    if info is not None:
+                        updated.append(info)
+            if updated and on_update:
+                on_update(updated)
+                
+        stream_shell(command, on_lines)
+        fields = parser.finish()
+        if fields:
+            info = self._merge(fields)
+            if info is not None and on_update:
+                on_update([info])
+
+    @staticmethod
+    def _unchanged(cached, info):
+        """比较缓存记录与 pm list 的结果
+
+        旧版本的 pm list 不支持 -U/--show-versioncode，列表中没有版本号和UID，
+        此时缓存中来自dumpsys的版本号不能参与比较，只比较APK路径。
+        """
+        if cached.apk_path != info.apk_path:
+            return False
+        if info.version_code is not None and cached.version_code != info.version_code:
+            return False
+        if info.uid is not None and cached.uid is not None and cached.uid != info.uid:
+            return False
+        return True
+
+    def refresh(self, run_shell, stream_shell, on_update=None, on_remove=None):
+        """建立或增量更新应用目录，返回 {"added", "removed", "changed", "full"}
+        
+        run_shell(命令) 返回 (返回码, 标准输出, 错误输出)；stream_shell(命令, on_lines) 流式执行命令。
+        on_update(记录列表) 在 pm list 完成后和dumpsys解析过程中分批回调；on_remove(包名列表) 回调已卸载的应用。
+        已有其他刷新在进行时等待其完成，之后的刷新只需比较一次 pm list。
+        """
+        with self._refresh_lock:
+            return self._refresh(run_shell, stream_shell, on_update, on_remove)
+
+    def _refresh(self, run_shell, stream_shell, on_update, on_remove):
+        returncode, stdout, stderr = run_shell(self.LIST_COMMAND)
+        listed = parse_package_list(stdout)
+        if returncode != 0 and not listed:
+            raise ADBError(stderr.strip() or f"返回码: {returncode}")
+        first_line = stdout.strip().split("\n", 1)[0].strip() if stdout.strip() else ""
+        fingerprint = first_line if first_line and not first_line.startswith("package:") else None
+        
+        full = not self.packages or fingerprint != self.fingerprint
+        old = {} if full else self.packages
+        listed_names = {info.package for info in listed}
+        removed = [package for package in self.packages if package not in listed_names]
+        added = []
+        changed = []
+        packages = {}
+        for info in listed:
+            cached = old.get(info.package)
+            if cached is None:
+                added.append(info.package)
+                packages[info.package] = info
+            elif not self._unchanged(cached, info):
+                changed.append(info.package)
+                packages[info.package] = info
+            else:
+                # 未变化的应用保留缓存中的详细信息
+                packages[info.package] = cached._replace(uid=info.uid if info.uid is not None else cached.uid)
+        self.packages = packages
+        self.fingerprint = fingerprint
+        self._listed = bool(listed)
+        if on_remove and removed:
+            on_remove(removed)
+        if on_update and packages:
+            on_update(list(packages.values()))
+            
+        queried = added + changed
+        if full or len(queried) > self.MAX_INCREMENTAL:
+            full = True
+            self._dump(stream_shell, self.DUMP_COMMAND, on_update)
+        elif queried:
+            packages_arg = " ".join(shlex.quote(package) for package in queried)
+            self._dump(stream_shell, f"for p in {packages_arg}; do dumpsys package \"$p\"; done", on_update)
+            
+        self.updated = time.time()
+        self.save()
+        return {"added": len(added), "removed": len(removed), "changed": len(changed), "full": full}
+
+
+def format_device_info(info):
+    """将设备信息字典格式化为信息面板文本"""
+    text = "设备信息:\n" + "="*30 + "\n"
+    if not info:
+        return text + "暂无设备信息\n"
+    for prop, desc in DEVICE_INFO_PROPS:
+        if prop in info["props"]:
+            text += f"{desc}: {info['props'][prop]}\n"
+    if info.get("battery_level") is not None:
+        text += f"电池电量: {info['battery_level']}%\n"
+    storage = info.get("storage")
+    if storage:
+        text += f"存储空间: 总计 {storage['total']}MB, 已用 {storage['used']}MB, 可用 {storage['free']}MB\n"
+    memory = info.get("memory")
+    if memory:
+        text += f"内存: 总计 {memory['total']}MB, 已用 {memory['used']}MB, 可用 {memory['free']}MB\n"
+    return text
+
+
+class FanOutResults:
+    """多设备执行的结果汇总（只在主线程中使用）
+
+    每台设备只记录第一次结果，success为None表示该设备已取消。
+    """
+
+    def __init__(self, devices):
+        self.devices = list(devices)
+        self.started = time.time()
+        self.results = {}
+        self.outputs = {}
+
+    def record(self, device, success, output):
+        """记录一台设备的结果，重复的结果被忽略；返回是否已记录"""
+        if device in self.results or device not in self.devices:
+            return False
+        self.results[device] = success
+        self.outputs[device] = output
+        return True
+
+    @property
+    def finished(self):
+        return len(self.results) == len(self.devices)
+
+    def counts(self):
+        """返回 (成功, 失败, 已取消, 未完成) 的设备数"""
+        results = list(self.results.values())
+        return (sum(1 for r in results if r), sum(1 for r in results if r is False),
+                sum(1 for r in results if r is None), len(self.devices) - len(results))
+
+    def summary(self):
+        success, failed, cancelled, pending = self.counts()
+        return (f"成功 {success} / 失败 {failed} / 已取消 {cancelled} / 未完成 {pending} | "
+                f"总耗时 {time.time() - self.started:.1f}s")
+
+    def completion_message(self):
+        """全部设备结束后的日志内容，返回 (消息, 级别)"""
+        success, _failed, cancelled, _pending = self.counts()
+        message = (f"多设备执行完成: 成功 {success}/{len(self.devices)}"
+                   f"{f'，已取消 {cancelled}' if cancelled else ''}，总耗时 {time.time() - self.started:.1f}s")
+        return message, "SUCCESS" if success == len(self.devices) else "WARNING"
+
+
 class ADBToolbox:
+    # 控制台日志刷新间隔（毫秒）与每次最多写入的日志条数
+    LOG_FLUSH_INTERVAL = 33
+    LOG_BATCH_SIZE = 2000
+    LOG_TAGS = {"ERROR": "error", "WARNING": "warning", "SUCCESS": "success"}
+    # 设备动态信息的后台刷新检查间隔（毫秒）
+    DEVICE_INFO_REFRESH_INTERVAL = 10000
+    
     def __init__(self):
         # 初始化主窗口
         if BOOTSTRAP_AVAILABLE:
@@ -146,6 +3691,7 @@ class ADBToolbox:
         self.current_device = tk.StringVar()
         self.connection_status = tk.StringVar(value="未连接")
         self.adb_path = "adb"
+        self.native_adb_retry_at = 0
         self.log_queue = queue.Queue()
         self.platform_tools_dir = None
         self.is_admin = self.check_admin()
@@ -153,11 +3699,39 @@ class ADBToolbox:
         self.auto_refresh = tk.BooleanVar(value=False)
         self.auto_refresh_thread = None
         self.auto_refresh_running = False
-        self.device_info_cache = {}
+        self.device_tracker = None
+        self.tracker_fallback_thread = None
+        self.device_info_cache = None
         self.last_command = None
         self.command_history = []
         self.history_index = 0
         self.settings = self.load_settings()
+        self.adb_client = ADBServerClient(max_connections=self.adb_pool_size())
+        self.task_status = tk.StringVar(value="空闲")
+        self.transfer_tracker = TransferTracker(os.path.join(APP_DATA_DIR, "transfer_history.json"))
+        self.file_cache = LRUFileCache(os.path.join(APP_DATA_DIR, "file_cache"),
+                                       self.settings.get("file_cache_mb", 1024) * 1024 * 1024)
+        self.thumbnail_cache = LRUFileCache(os.path.join(APP_DATA_DIR, "thumbnails"),
+                                            self.settings.get("thumbnail_cache_mb", 256) * 1024 * 1024)
+        self.dir_cache = DirectoryCache()
+        self.search_indexes = {}
+        self.package_catalogs = {}
+        self.file_browser_target = None
+        self.file_browser_path = None
+        self.file_entries = []
+        self.console_history = ConsoleHistory(os.path.join(APP_DATA_DIR, "logs"))
+        self.device_info_cache = DeviceInfoCache(
+            os.path.join(APP_DATA_DIR, "device_info.json") if self.settings.get("persist_device_info", True) else None
+        )
+        self.scheduler = CommandScheduler(
+            max_workers=self.settings.get("max_workers", 4),
+            per_device_limit=self.settings.get("max_tasks_per_device", 2),
+            on_change=self.on_scheduler_changed
+        )
+        
+    def adb_pool_size(self):
+        """根据并发设置计算ADB连接池大小：每个任务至少一个连接，另留出多路传输和界面操作所需的连接"""
+        return max(8, self.settings.get("max_workers", 4) + 2 * self.settings.get("transfer_streams", 4) + 2)
         
     def check_admin(self):
         """检查是否以管理员权限运行"""
@@ -178,6 +3752,14 @@ class ADBToolbox:
             "theme": "cosmo" if BOOTSTRAP_AVAILABLE else "arc" if THEMED_TK_AVAILABLE else "default",
             "auto_check_update": True,
             "auto_connect": True,
+            "use_native_adb": True,
+            "max_workers": 4,
+            "max_tasks_per_device": 2,
+            "transfer_streams": 4,
+            "file_cache_mb": 1024,
+            "thumbnail_cache_mb": 256,
+            "console_max_lines": 5000,
+            "persist_device_info": True,
             "last_wifi_ip": "192.168.1.100",
             "last_wifi_port": "5555",
             "recent_devices": [],
@@ -241,6 +3823,9 @@ class ADBToolbox:
         # 绑定关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
+        # 定期刷新设备动态信息
+        self.root.after(self.DEVICE_INFO_REFRESH_INTERVAL, self.refresh_device_info_periodically)
+        
     def on_close(self):
         """关闭窗口时的处理"""
         # 停止自动刷新线程
@@ -248,6 +3833,19 @@ class ADBToolbox:
         if self.auto_refresh_thread and self.auto_refresh_thread.is_alive():
             self.auto_refresh_thread.join(1)
             
+        # 停止设备跟踪、命令调度器并关闭ADB连接池
+        self.stop_device_tracker()
+        self.scheduler.shutdown()
+        self.adb_client.close()
+        self.file_cache.flush()
+        self.thumbnail_cache.flush()
+        
+        # 删除本次会话的历史日志
+        try:
+            self.console_history.clear()
+        except OSError:
+            pass
+            
         # 保存设置
         self.save_settings()
         
@@ -441,7 +4039,9 @@ class ADBToolbox:
     def auto_refresh_task(self):
         """自动刷新任务"""
         while self.auto_refresh_running:
-            self.refresh_devices()
+            # 设备跟踪订阅正常时无需轮询，仅在订阅断开时作为后备
+            if not (self.device_tracker and self.device_tracker.connected):
+                self.refresh_devices(background=True)
             time.sleep(5)  # 每5秒刷新一次
         
     def setup_right_panel(self, parent):
@@ -468,6 +4068,11 @@ class ADBToolbox:
         notebook.add(file_frame, text="文件管理")
         self.setup_file_tools(file_frame)
         
+        # 传输选项卡
+        transfer_frame = ttk.Frame(notebook)
+        notebook.add(transfer_frame, text="传输")
+        self.setup_transfer_panel(transfer_frame)
+        
         # 系统工具选项卡
         system_frame = ttk.Frame(notebook)
         notebook.add(system_frame, text="系统工具")
@@ -667,8 +4272,7 @@ class ADBToolbox:
             
         # 获取设备IP地址
         self.log_message("正在获取设备IP地址...")
-        result = subprocess.run([self.adb_path, 'shell', 'ip', 'addr', 'show', 'wlan0'], 
-                              capture_output=True, text=True, encoding='utf-8', errors='ignore')
+        result = self.run_adb(['shell', 'ip', 'addr', 'show', 'wlan0'])
         
         if result.returncode == 0:
             # 使用正则表达式提取IP地址
@@ -753,8 +4357,7 @@ class ADBToolbox:
             # 执行配对命令
             try:
                 self.log_message(f"正在配对设备: {ip}:{port} 配对码: {code}")
-                result = subprocess.run([self.adb_path, 'pair', f"{ip}:{port}", code], 
-                                      capture_output=True, text=True, encoding='utf-8', errors='ignore')
+                result = self.run_adb(['pair', f"{ip}:{port}", code])
                 
                 if "Successfully paired" in result.stdout:
                     self.log_message("设备配对成功", "SUCCESS")
@@ -814,8 +4417,16 @@ class ADBToolbox:
         if BOOTSTRAP_AVAILABLE:
             ttk.Button(push_frame, text="推送文件到设备", bootstyle="success", 
                      command=self.push_file).pack(fill=tk.X)
+            ttk.Button(push_frame, text="推送到多台设备", bootstyle="success-outline", 
+                     command=lambda: self.push_file(multi_device=True)).pack(fill=tk.X, pady=(5, 0))
+            ttk.Button(push_frame, text="批量推送文件夹（并行）", bootstyle="success-outline", 
+                     command=self.bulk_push).pack(fill=tk.X, pady=(5, 0))
         else:
             ttk.Button(push_frame, text="推送文件到设备", command=self.push_file).pack(fill=tk.X)
+            ttk.Button(push_frame, text="推送到多台设备", 
+                     command=lambda: self.push_file(multi_device=True)).pack(fill=tk.X, pady=(5, 0))
+            ttk.Button(push_frame, text="批量推送文件夹（并行）", 
+                     command=self.bulk_push).pack(fill=tk.X, pady=(5, 0))
         
         # 拉取文件
         pull_frame = ttk.Frame(transfer_frame)
@@ -837,8 +4448,29 @@ class ADBToolbox:
         if BOOTSTRAP_AVAILABLE:
             ttk.Button(pull_frame, text="从设备拉取文件", bootstyle="info", 
                      command=self.pull_file).pack(fill=tk.X)
+            ttk.Button(pull_frame, text="批量拉取文件夹（并行）", bootstyle="info-outline", 
+                     command=self.bulk_pull).pack(fill=tk.X, pady=(5, 0))
+            ttk.Button(pull_frame, text="断点续传拉取（大文件）", bootstyle="info-outline", 
+                     command=self.resumable_pull_file).pack(fill=tk.X, pady=(5, 0))
         else:
             ttk.Button(pull_frame, text="从设备拉取文件", command=self.pull_file).pack(fill=tk.X)
+            ttk.Button(pull_frame, text="批量拉取文件夹（并行）", 
+                     command=self.bulk_pull).pack(fill=tk.X, pady=(5, 0))
+            ttk.Button(pull_frame, text="断点续传拉取（大文件）", 
+                     command=self.resumable_pull_file).pack(fill=tk.X, pady=(5, 0))
+        
+        # 增量同步
+        sync_frame = ttk.Frame(transfer_frame)
+        sync_frame.pack(fill=tk.X, pady=(10, 0))
+        if BOOTSTRAP_AVAILABLE:
+            ttk.Button(sync_frame, text="文件夹增量同步...", bootstyle="warning-outline", 
+                     command=self.open_folder_sync_dialog).pack(fill=tk.X)
+            ttk.Button(sync_frame, text="存储空间分析...", bootstyle="warning-outline", 
+                     command=self.open_disk_usage_dialog).pack(fill=tk.X, pady=(5, 0))
+        else:
+            ttk.Button(sync_frame, text="文件夹增量同步...", command=self.open_folder_sync_dialog).pack(fill=tk.X)
+            ttk.Button(sync_frame, text="存储空间分析...", 
+                     command=self.open_disk_usage_dialog).pack(fill=tk.X, pady=(5, 0))
         
         # 文件浏览区域
         browser_frame = ttk.LabelFrame(parent, text="文件浏览器", padding=10)
@@ -854,9 +4486,12 @@ class ADBToolbox:
         self.current_path_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 5))
         
         if BOOTSTRAP_AVAILABLE:
+            ttk.Button(path_frame, text="搜索", bootstyle="secondary-outline", 
+                     command=self.open_search_dialog).pack(side=tk.RIGHT, padx=(5, 0))
             ttk.Button(path_frame, text="浏览", bootstyle="info-outline", 
                      command=self.browse_device_path).pack(side=tk.RIGHT)
         else:
+            ttk.Button(path_frame, text="搜索", command=self.open_search_dialog).pack(side=tk.RIGHT, padx=(5, 0))
             ttk.Button(path_frame, text="浏览", command=self.browse_device_path).pack(side=tk.RIGHT)
         
         # 文件列表
@@ -874,14 +4509,20 @@ class ADBToolbox:
         self.file_tree.column("date", width=150)
         self.file_tree.column("permissions", width=100)
         
-        file_scrollbar_y = ttk.Scrollbar(file_frame, orient=tk.VERTICAL, command=self.file_tree.yview)
+        # 纵向滚动由虚拟列表控制，Treeview中只保留可见的行
+        file_scrollbar_y = ttk.Scrollbar(file_frame, orient=tk.VERTICAL)
         file_scrollbar_x = ttk.Scrollbar(file_frame, orient=tk.HORIZONTAL, command=self.file_tree.xview)
-        self.file_tree.configure(yscrollcommand=file_scrollbar_y.set, xscrollcommand=file_scrollbar_x.set)
+        self.file_tree.configure(xscrollcommand=file_scrollbar_x.set)
         
         self.file_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         file_scrollbar_y.pack(side=tk.RIGHT, fill=tk.Y)
         file_scrollbar_x.pack(side=tk.BOTTOM, fill=tk.X)
         
+        self.file_model = FileListModel()
+        self.file_list = VirtualFileList(self.file_tree, file_scrollbar_y, self.file_model)
+        for column, key in (("#0", "name"), ("size", "size"), ("date", "mtime")):
+            self.file_tree.heading(column, command=partial(self.sort_file_list, key))
+        
         # 文件操作按钮
         file_buttons = ttk.Frame(browser_frame)
         file_buttons.pack(fill=tk.X, pady=(10, 0))
@@ -894,12 +4535,18 @@ class ADBToolbox:
             ttk.Button(file_buttons, text="删除", bootstyle="danger-outline", 
                      command=self.delete_file).pack(side=tk.LEFT, padx=(0, 5))
             ttk.Button(file_buttons, text="重命名", bootstyle="warning-outline", 
-                     command=self.rename_file).pack(side=tk.LEFT)
+                     command=self.rename_file).pack(side=tk.LEFT, padx=(0, 5))
+            ttk.Button(file_buttons, text="预览", bootstyle="secondary-outline", 
+                     command=self.preview_file).pack(side=tk.LEFT, padx=(0, 5))
+            ttk.Button(file_buttons, text="缩略图", bootstyle="secondary-outline", 
+                     command=self.open_thumbnail_view).pack(side=tk.LEFT)
         else:
             ttk.Button(file_buttons, text="刷新", command=self.refresh_file_list).pack(side=tk.LEFT, padx=(0, 5))
             ttk.Button(file_buttons, text="新建文件夹", command=self.create_folder).pack(side=tk.LEFT, padx=(0, 5))
             ttk.Button(file_buttons, text="删除", command=self.delete_file).pack(side=tk.LEFT, padx=(0, 5))
-            ttk.Button(file_buttons, text="重命名", command=self.rename_file).pack(side=tk.LEFT)
+            ttk.Button(file_buttons, text="重命名", command=self.rename_file).pack(side=tk.LEFT, padx=(0, 5))
+            ttk.Button(file_buttons, text="预览", command=self.preview_file).pack(side=tk.LEFT, padx=(0, 5))
+            ttk.Button(file_buttons, text="缩略图", command=self.open_thumbnail_view).pack(side=tk.LEFT)
         
         # 绑定双击事件
         self.file_tree.bind("<Double-1>", self.on_file_double_click)
@@ -911,9 +4558,14 @@ class ADBToolbox:
         """创建文件右键菜单"""
         self.file_menu = tk.Menu(self.root, tearoff=0)
         self.file_menu.add_command(label="打开", command=self.open_file)
+        self.file_menu.add_command(label="预览", command=self.preview_file)
         self.file_menu.add_command(label="下载", command=self.download_file)
+        self.file_menu.add_command(label="下载（断点续传）", command=lambda: self.download_file(resumable=True))
         self.file_menu.add_command(label="删除", command=self.delete_file)
         self.file_menu.add_command(label="重命名", command=self.rename_file)
+        self.file_menu.add_command(label="复制到...", command=partial(self.transfer_selected_files, "copy"))
+        self.file_menu.add_command(label="移动到...", command=partial(self.transfer_selected_files, "move"))
+        self.file_menu.add_command(label="修改权限...", command=self.chmod_selected_files)
         self.file_menu.add_separator()
         self.file_menu.add_command(label="属性", command=self.show_file_properties)
         
@@ -923,7 +4575,9 @@ class ADBToolbox:
         """显示文件右键菜单"""
         item = self.file_tree.identify_row(event.y)
         if item:
-            self.file_tree.selection_set(item)
+            # 在已选中的行上右键时保留多选
+            if item not in self.file_tree.selection():
+                self.file_tree.selection_set(item)
             self.file_menu.post(event.x_root, event.y_root)
             
     def on_file_double_click(self, event):
@@ -942,9 +4596,18 @@ class ADBToolbox:
             # 如果是文件，则显示文件属性
             self.show_file_properties()
             
+    def sort_file_list(self, key):
+        """按列排序文件列表，重复点击同一列切换升序/降序"""
+        reverse = not self.file_model.reverse if self.file_model.sort_key == key else False
+        self.file_model.sort(key, reverse)
+        arrow = " ▼" if reverse else " ▲"
+        for column, column_key, text in (("#0", "name", "文件名"), ("size", "size", "大小"), ("date", "mtime", "修改时间")):
+            self.file_tree.heading(column, text=text + (arrow if column_key == key else ""))
+        self.file_list.reset()
+        
     def refresh_file_list(self):
-        """刷新文件列表"""
-        self.browse_device_path()
+        """刷新文件列表（忽略缓存重新列出）"""
+        self.browse_device_path(force=True)
         
     def create_folder(self):
         """创建文件夹"""
@@ -969,27 +4632,142 @@ class ADBToolbox:
             messagebox.showwarning("警告", "请先连接设备")
             return
             
-        # 获取选中的文件
-        selected = self.file_tree.selection()
-        if not selected:
-            messagebox.showwarning("警告", "请先选择要删除的文件或文件夹")
+        # 获取选中的文件
+        entries = self.get_selected_files()
+        if not entries:
+            messagebox.showwarning("警告", "请先选择要删除的文件或文件夹")
+            return
+            
+        # 确认删除
+        if len(entries) == 1:
+            prompt = f"确定要删除 {entries[0].name} 吗？"
+        else:
+            prompt = f"确定要删除选中的 {len(entries)} 项吗？"
+        if not messagebox.askyesno("确认删除", prompt):
+            return
+            
+        self.run_batch_file_operation("delete", entries)
+        
+    def get_selected_files(self):
+        """文件浏览器中选中的条目（不含 "../"），返回 [SyncEntry, ...]"""
+        entries = []
+        for position in self.file_list.selected_positions():
+            if position < len(self.file_model):
+                entry = self.file_model.entry(position)
+                if entry is not None:
+                    entries.append(entry)
+        return entries
+        
+    def transfer_selected_files(self, operation):
+        """把选中的文件复制或移动到设备上的另一个文件夹"""
+        if not self.current_device.get():
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        entries = self.get_selected_files()
+        if not entries or self.file_browser_path is None:
+            messagebox.showwarning("警告", "请先选择文件或文件夹")
+            return
+            
+        directory = self.file_browser_path[1]
+        label = "复制" if operation == "copy" else "移动"
+        target = tk.simpledialog.askstring(f"{label}到", f"将 {len(entries)} 项{label}到设备文件夹:",
+                                           initialvalue=directory)
+        if not target or not target.strip():
+            return
+        target = normalize_device_path(target)
+        if target == directory:
+            messagebox.showwarning("警告", "目标文件夹与当前文件夹相同")
+            return
+        self.run_batch_file_operation(operation, entries, target=target)
+        
+    def chmod_selected_files(self):
+        """修改选中文件的权限"""
+        if not self.current_device.get():
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        entries = self.get_selected_files()
+        if not entries:
+            messagebox.showwarning("警告", "请先选择文件或文件夹")
+            return
+            
+        mode = tk.simpledialog.askstring("修改权限", "新权限（如 644、755 或 u+x）:",
+                                         initialvalue=f"{entries[0].mode & 0o7777:o}")
+        if not mode or not mode.strip():
+            return
+        recursive = False
+        if any(stat.S_ISDIR(entry.mode) for entry in entries):
+            recursive = messagebox.askyesno("修改权限", "是否同时修改文件夹内的所有文件？")
+        self.run_batch_file_operation("chmod", entries, mode=mode.strip(), recursive=recursive)
+        
+    def run_batch_file_operation(self, operation, entries, target=None, mode=None, recursive=False):
+        """对当前目录中的多个条目执行批量操作，所有条目只需一次设备调用"""
+        if self.file_browser_path is None:
+            return
+        device_id, directory = self.file_browser_path
+        prefix = directory.rstrip("/") + "/"
+        try:
+            batch = BatchFileOperation(operation, [prefix + entry.name for entry in entries], target, mode, recursive)
+        except ValueError as e:
+            messagebox.showwarning("警告", str(e))
             return
             
-        item_text = self.file_tree.item(selected[0], "text")
-        current_path = self.current_path_entry.get().strip()
-        file_path = os.path.join(current_path, item_text).replace("\\", "/")
+        label = {"delete": "删除", "move": "移动", "copy": "复制", "chmod": "修改权限", "stat": "获取属性"}[operation]
+        self.log_message(f"正在{label}: {len(entries)} 项")
+        
+        def run_shell(script):
+            # 大量文件的删除/复制可能持续很久，流式读取标记行，不设总超时，可随任务取消
+            output = {"stdout": [], "stderr": []}
+            task = self.scheduler.current_task()
+            returncode = self.stream_adb((['-s', device_id] if device_id else []) + ['shell', script],
+                                         lambda stream, lines: output[stream].extend(lines),
+                                         cancel_event=task.cancel_event if task else None)
+            if returncode is None:
+                raise ADBError("操作已取消")
+            return returncode, "\n".join(output["stdout"]), "\n".join(output["stderr"])
+            
+        def job():
+            try:
+                results = batch.run(run_shell)
+            except Exception as e:
+                self.log_message(f"{label}失败: {str(e)}", "ERROR")
+                return
+            failed = [(path, message) for path, ok, message in results if not ok]
+            level = "ERROR" if failed and len(failed) == len(results) else ("WARNING" if failed else "SUCCESS")
+            self.log_message(f"{label}完成: 成功 {len(results) - len(failed)} 项，失败 {len(failed)} 项", level)
+            for path, message in failed[:20]:
+                self.log_message(f"  {path}: {message or '失败'}", "ERROR")
+            if len(failed) > 20:
+                self.log_message(f"  ……另有 {len(failed) - 20} 项失败", "ERROR")
+            self.root.after(0, self.apply_batch_results, device_id, directory, batch, entries, results)
+            
+        self.scheduler.submit(job, device=device_id, description=f"批量{label}: {len(entries)} 项")
         
-        # 确认删除
-        if not messagebox.askyesno("确认删除", f"确定要删除 {item_text} 吗？"):
+    def apply_batch_results(self, device_id, directory, batch, entries, results):
+        """根据批量操作的结果只更新受影响的行，不重新列出目录"""
+        if batch.operation == "stat":
+            self.show_batch_properties(entries, results)
             return
+        if batch.operation in ("move", "copy"):
+            self.dir_cache.invalidate(device_id, batch.target)
+            if batch.operation == "copy":
+                return
+                
+        outcome = {entry.name: (ok, message) for entry, (_path, ok, message) in zip(entries, results)}
+        updated = []
+        for entry in self.file_entries:
+            ok, message = outcome.get(entry.name, (False, ""))
+            if ok and batch.operation in ("delete", "move"):
+                continue
+            if ok and batch.operation == "chmod" and message:
+                try:
+                    entry = entry._replace(mode=int(message.split()[-1], 16))
+                except ValueError:
+                    pass
+            updated.append(entry)
             
-        # 执行删除命令
-        if item_text.endswith("/"):
-            self.execute_command(f"adb shell rm -rf \"{file_path}\"", f"删除文件夹: {item_text}")
-        else:
-            self.execute_command(f"adb shell rm -f \"{file_path}\"", f"删除文件: {item_text}")
-            
-        self.refresh_file_list()
+        # 目录已被修改，下次浏览时重新列出
+        self.dir_cache.invalidate(device_id, directory)
+        self.show_file_listing(device_id, directory, updated)
         
     def rename_file(self):
         """重命名文件"""
@@ -1040,7 +4818,7 @@ class ADBToolbox:
             # 如果是文件，则下载并打开
             self.download_and_open_file()
             
-    def download_file(self):
+    def download_file(self, resumable=False):
         """下载文件"""
         # 检查设备连接
         if not self.current_device.get():
@@ -1068,7 +4846,10 @@ class ADBToolbox:
         if save_path:
             current_path = self.current_path_entry.get().strip()
             file_path = os.path.join(current_path, item_text).replace("\\", "/")
-            self.execute_command(f"adb pull \"{file_path}\" \"{save_path}\"", f"下载文件: {item_text}")
+            if resumable:
+                self.run_resumable_pull(file_path, save_path)
+            else:
+                self.run_file_transfer("pull", file_path, save_path)
             
     def download_and_open_file(self):
         """下载并打开文件"""
@@ -1088,31 +4869,51 @@ class ADBToolbox:
             messagebox.showwarning("警告", "不能打开文件夹")
             return
             
-        # 创建临时目录
-        temp_dir = tempfile.gettempdir()
-        temp_file = os.path.join(temp_dir, item_text)
-        
-        # 下载文件
         current_path = self.current_path_entry.get().strip()
         file_path = os.path.join(current_path, item_text).replace("\\", "/")
+        self.open_device_file(self.current_device.get(), file_path)
         
-        self.log_message(f"正在下载文件到临时目录: {temp_file}")
-        result = subprocess.run([self.adb_path, 'pull', file_path, temp_file], 
-                              capture_output=True, text=True, encoding='utf-8', errors='ignore')
+    def open_device_file(self, device_id, file_path):
+        """打开设备文件：本地缓存中有未变化的副本时直接打开，否则下载到缓存后打开"""
+        item_text = posixpath.basename(file_path)
         
-        if result.returncode == 0:
-            self.log_message("文件下载成功，正在打开...", "SUCCESS")
-            try:
-                if platform.system() == "Windows":
-                    os.startfile(temp_file)
-                elif platform.system() == "Darwin":  # macOS
-                    subprocess.run(['open', temp_file])
-                else:  # Linux
-                    subprocess.run(['xdg-open', temp_file])
-            except Exception as e:
-                self.log_message(f"打开文件失败: {str(e)}", "ERROR")
-        else:
-            self.log_message("文件下载失败", "ERROR")
+        def lookup():
+            # 以设备、路径、大小和修改时间作为缓存键，文件未变化时直接打开缓存
+            entry = self.stat_device_path(file_path, device_id)
+            if entry is None:
+                self.log_message(f"文件不存在: {file_path}", "ERROR")
+                return
+            key = LRUFileCache.make_key(device_id, file_path, entry.size, entry.mtime)
+            cached = self.file_cache.get(key)
+            if cached:
+                self.log_message(f"缓存命中: {file_path}")
+                self.root.after(0, self.open_local_file, cached)
+                return
+                
+            self.log_message(f"缓存未命中，正在下载: {file_path} ({format_size(entry.size)})")
+            cache_path = self.file_cache.path_for(key, item_text)
+            
+            def on_done(path):
+                self.file_cache.put(key, path, {"device": device_id, "path": file_path})
+                self.open_local_file(path)
+                
+            self.run_file_transfer("pull", file_path, cache_path, on_done=on_done, device_id=device_id,
+                                   on_failed=lambda: self.file_cache.discard(key))
+            
+        self.scheduler.submit(lookup, device=device_id, description=f"打开文件: {item_text}")
+        
+    def open_local_file(self, path):
+        """用系统默认程序打开本地文件"""
+        self.log_message(f"正在打开: {path}", "SUCCESS")
+        try:
+            if platform.system() == "Windows":
+                os.startfile(path)
+            elif platform.system() == "Darwin":  # macOS
+                subprocess.run(['open', path])
+            else:  # Linux
+                subprocess.run(['xdg-open', path])
+        except Exception as e:
+            self.log_message(f"打开文件失败: {str(e)}", "ERROR")
             
     def show_file_properties(self):
         """显示文件属性"""
@@ -1127,16 +4928,25 @@ class ADBToolbox:
             messagebox.showwarning("警告", "请先选择文件或文件夹")
             return
             
+        # 多选时一次获取全部条目的属性
+        entries = self.get_selected_files()
+        if len(entries) > 1:
+            self.run_batch_file_operation("stat", entries)
+            return
+            
         item_text = self.file_tree.item(selected[0], "text")
         current_path = self.current_path_entry.get().strip()
         file_path = os.path.join(current_path, item_text).replace("\\", "/")
         
         # 获取文件属性
         self.log_message(f"正在获取文件属性: {file_path}")
-        result = subprocess.run([self.adb_path, 'shell', 'ls', '-la', file_path], 
-                              capture_output=True, text=True, encoding='utf-8', errors='ignore')
-        
-        if result.returncode == 0: 
+        try:
+            entry = self.stat_device_path(file_path, self.current_device.get() or None)
+        except Exception as e:
+            self.log_message(f"获取文件属性失败: {str(e)}", "ERROR")
+            return
+            
+        if entry is not None:
             # 创建属性对话框
             prop_dialog = tk.Toplevel(self.root)
             prop_dialog.title(f"文件属性: {item_text}")
@@ -1156,35 +4966,554 @@ class ADBToolbox:
             ttk.Label(info_frame, text=file_path).grid(row=1, column=1, sticky=tk.W, pady=5)
             
             ttk.Label(info_frame, text="类型:").grid(row=2, column=0, sticky=tk.W, pady=5)
-            file_type = "文件夹" if item_text.endswith("/") else "文件"
+            file_type = "文件夹" if stat.S_ISDIR(entry.mode) else "文件"
             ttk.Label(info_frame, text=file_type).grid(row=2, column=1, sticky=tk.W, pady=5)
             
-            # 解析ls -la输出
-            lines = result.stdout.strip().split('\n')
-            if len(lines) > 0:
-                parts = lines[0].split()
-                if len(parts) >= 5:
-                    permissions = parts[0]
-                    owner = parts[2]
-                    size = parts[3]
-                    date = ' '.join(parts[4:7])
-                    
-                    ttk.Label(info_frame, text="权限:").grid(row=3, column=0, sticky=tk.W, pady=5)
-                    ttk.Label(info_frame, text=permissions).grid(row=3, column=1, sticky=tk.W, pady=5)
-                    
-                    ttk.Label(info_frame, text="所有者:").grid(row=4, column=0, sticky=tk.W, pady=5)
-                    ttk.Label(info_frame, text=owner).grid(row=4, column=1, sticky=tk.W, pady=5)
-                    
-                    ttk.Label(info_frame, text="大小:").grid(row=5, column=0, sticky=tk.W, pady=5)
-                    ttk.Label(info_frame, text=size).grid(row=5, column=1, sticky=tk.W, pady=5)
-                    
-                    ttk.Label(info_frame, text="修改时间:").grid(row=6, column=0, sticky=tk.W, pady=5)
-                    ttk.Label(info_frame, text=date).grid(row=6, column=1, sticky=tk.W, pady=5)
+            ttk.Label(info_frame, text="权限:").grid(row=3, column=0, sticky=tk.W, pady=5)
+            ttk.Label(info_frame, text=stat.filemode(entry.mode)).grid(row=3, column=1, sticky=tk.W, pady=5)
+            
+            ttk.Label(info_frame, text="所有者:").grid(row=4, column=0, sticky=tk.W, pady=5)
+            owner = f"{entry.uid}:{entry.gid}" if entry.uid is not None else "未知"
+            ttk.Label(info_frame, text=owner).grid(row=4, column=1, sticky=tk.W, pady=5)
+            
+            ttk.Label(info_frame, text="大小:").grid(row=5, column=0, sticky=tk.W, pady=5)
+            ttk.Label(info_frame, text=f"{entry.size} 字节").grid(row=5, column=1, sticky=tk.W, pady=5)
+            
+            ttk.Label(info_frame, text="修改时间:").grid(row=6, column=0, sticky=tk.W, pady=5)
+            date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.mtime)) if entry.mtime else "未知"
+            ttk.Label(info_frame, text=date).grid(row=6, column=1, sticky=tk.W, pady=5)
             
             # 关闭按钮
             ttk.Button(prop_dialog, text="关闭", command=prop_dialog.destroy).pack(pady=10)
         else:
-            self.log_message("获取文件属性失败", "ERROR")
+            self.log_message("获取文件属性失败: 文件不存在", "ERROR")
+        
+    def show_batch_properties(self, entries, results):
+        """显示多个条目的属性和总大小"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"属性: {len(entries)} 项")
+        dialog.geometry("720x420")
+        dialog.transient(self.root)
+        
+        summary_var = tk.StringVar()
+        ttk.Label(dialog, textvariable=summary_var, padding=10).pack(anchor=tk.W)
+        
+        tree_frame = ttk.Frame(dialog)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        columns = ("type", "size", "permissions", "owner", "date")
+        tree = ttk.Treeview(tree_frame, columns=columns, show="tree headings")
+        tree.heading("#0", text="名称")
+        tree.heading("type", text="类型")
+        tree.heading("size", text="占用空间")
+        tree.heading("permissions", text="权限")
+        tree.heading("owner", text="所有者")
+        tree.heading("date", text="修改时间")
+        tree.column("#0", width=220)
+        tree.column("type", width=60)
+        tree.column("size", width=90)
+        tree.column("permissions", width=100)
+        tree.column("owner", width=110)
+        tree.column("date", width=130)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        files = dirs = failed = 0
+        total = 0
+        for entry, (_path, ok, message) in zip(entries, results):
+            lines = message.splitlines()
+            fields = lines[0].split("|") if ok and lines else []
+            if len(fields) != 5:
+                failed += 1
+                tree.insert("", tk.END, text=entry.name, values=("错误", "", "", "", message))
+                continue
+            mode = int(fields[0], 16)
+            is_dir = stat.S_ISDIR(mode)
+            # 文件夹使用 du 统计的占用空间，文件使用实际大小
+            size = int(lines[1]) * 1024 if is_dir and len(lines) > 1 and lines[1].isdigit() else int(fields[1])
+            total += size
+            if is_dir:
+                dirs += 1
+            else:
+                files += 1
+            date = time.strftime("%Y-%m-%d %H:%M", time.localtime(int(fields[2])))
+            tree.insert("", tk.END, text=entry.name + ("/" if is_dir else ""),
+                        values=("文件夹" if is_dir else "文件", format_size(size), stat.filemode(mode),
+                                f"{fields[3]}:{fields[4]}", date))
+                                
+        summary = f"共 {len(entries)} 项：{files} 个文件，{dirs} 个文件夹，总大小 {format_size(total)}"
+        if failed:
+            summary += f"，{failed} 项获取失败"
+        summary_var.set(summary)
+        ttk.Button(dialog, text="关闭", command=dialog.destroy).pack(pady=10)
+        
+    THUMBNAIL_SIZE = 128
+    THUMBNAIL_CELL = (150, 170)
+    THUMBNAIL_MAX_IMAGES = 400
+    
+    def open_thumbnail_view(self):
+        """以缩略图网格显示当前文件夹中的图片
+        
+        只为可见的格子创建图片；缓存中已有的缩略图直接显示，其余在后台并行获取后逐个出现。
+        """
+        if not PIL_AVAILABLE:
+            messagebox.showwarning("警告", "缩略图需要安装Pillow (pip install pillow)")
+            return
+        if not self.settings.get("use_native_adb", True) or time.time() < self.native_adb_retry_at:
+            messagebox.showwarning("警告", "缩略图需要直接连接adb server，请在设置中启用")
+            return
+        if self.file_browser_path is None:
+            messagebox.showwarning("警告", "请先浏览设备文件夹")
+            return
+            
+        device_id, directory = self.file_browser_path
+        prefix = directory.rstrip("/") + "/"
+        images = sorted((entry for entry in self.file_entries
+                         if stat.S_ISREG(entry.mode) and entry.name.lower().endswith(IMAGE_EXTENSIONS)),
+                        key=lambda entry: entry.name.lower())
+        if not images:
+            messagebox.showinfo("提示", "当前文件夹中没有图片")
+            return
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"缩略图: {directory}")
+        dialog.geometry("820x620")
+        dialog.transient(self.root)
+        
+        status_var = tk.StringVar()
+        ttk.Label(dialog, textvariable=status_var, padding=(10, 10, 10, 5)).pack(anchor=tk.W)
+        
+        grid_frame = ttk.Frame(dialog)
+        grid_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        canvas = tk.Canvas(grid_frame, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(grid_frame, orient=tk.VERTICAL)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        loader = ThumbnailLoader(self.adb_client, device_id, self.thumbnail_cache,
+                                 [(prefix + entry.name, entry.size, entry.mtime) for entry in images],
+                                 self.THUMBNAIL_SIZE, self.settings.get("transfer_streams", 4))
+        cell_width, cell_height = self.THUMBNAIL_CELL
+        # drawn: 位置 -> 画布上的图形；photos: 位置 -> PhotoImage（按最近使用保留有限数量）
+        view = {"columns": 1, "drawn": {}, "photos": OrderedDict(), "cached": 0}
+        
+        def cell_origin(position):
+            row, column = divmod(position, view["columns"])
+            return column * cell_width + 5, row * cell_height + 5
+            
+        def draw_image(position):
+            thumbnail_path = loader.cached(position)
+            if thumbnail_path is None or position not in view["drawn"]:
+                return
+            photo = view["photos"].get(position)
+            if photo is None:
+                try:
+                    photo = ImageTk.PhotoImage(Image.open(thumbnail_path), master=canvas)
+                except Exception:
+                    return
+                view["photos"][position] = photo
+                while len(view["photos"]) > self.THUMBNAIL_MAX_IMAGES:
+                    view["photos"].popitem(last=False)
+            view["photos"].move_to_end(position)
+            x, y = cell_origin(position)
+            items = view["drawn"][position]
+            if len(items) == 2:
+                items.append(canvas.create_image(x + (cell_width - 10) // 2, y + self.THUMBNAIL_SIZE // 2 + 4,
+                                                 image=photo))
+                
+        def render(event=None):
+            if not canvas.winfo_exists():
+                return
+            columns = max(1, canvas.winfo_width() // cell_width)
+            if columns != view["columns"]:
+                view["columns"] = columns
+                canvas.delete("all")
+                view["drawn"].clear()
+            rows = (len(images) + columns - 1) // columns
+            canvas.configure(scrollregion=(0, 0, columns * cell_width, rows * cell_height))
+            
+            top = canvas.canvasy(0)
+            first = max(0, int(top // cell_height) - 1) * columns
+            last = min(len(images), (int((top + canvas.winfo_height()) // cell_height) + 2) * columns)
+            loader.set_visible(first, last)
+            
+            for position in [position for position in view["drawn"] if not first <= position < last]:
+                for item in view["drawn"].pop(position):
+                    canvas.delete(item)
+            for position in range(first, last):
+                if position not in view["drawn"]:
+                    x, y = cell_origin(position)
+                    name = images[position].name
+                    label = name if len(name) <= 20 else name[:17] + "..."
+                    view["drawn"][position] = [
+                        canvas.create_rectangle(x, y, x + cell_width - 10, y + self.THUMBNAIL_SIZE + 8, outline="#cccccc"),
+                        canvas.create_text(x + (cell_width - 10) // 2, y + self.THUMBNAIL_SIZE + 22, text=label),
+                    ]
+                draw_image(position)
+                
+        def on_yview(*args):
+            canvas.yview(*args)
+            render()
+            
+        def on_mousewheel(event):
+            if platform.system() == "Darwin":
+                canvas.yview_scroll(-event.delta, "units")
+            else:
+                canvas.yview_scroll(-int(event.delta / 120), "units")
+            render()
+            
+        def on_ready(position):
+            self.root.after(0, lambda: canvas.winfo_exists() and draw_image(position))
+            
+        def position_at(event):
+            column = int(canvas.canvasx(event.x) // cell_width)
+            row = int(canvas.canvasy(event.y) // cell_height)
+            position = row * view["columns"] + column
+            if column < view["columns"] and 0 <= position < len(images):
+                return position
+            return None
+            
+        def on_double_click(event):
+            position = position_at(event)
+            if position is not None:
+                self.open_device_file(device_id, prefix + images[position].name)
+                
+        def update_status():
+            if not dialog.winfo_exists():
+                return
+            status_var.set(f"共 {len(images)} 张图片：缓存命中 {view['cached']}，已生成 {loader.fetched}，"
+                           f"失败 {loader.failed}（双击打开原图）")
+            dialog.after(500, update_status)
+            
+        def job():
+            task = self.scheduler.current_task()
+            if task:
+                loader.cancel_event = task.cancel_event
+            start = time.time()
+            try:
+                fetched = loader.run()
+            except TransferCancelled:
+                return
+            except Exception as e:
+                self.log_message(f"获取缩略图失败: {str(e)}", "ERROR")
+                return
+            if fetched:
+                self.log_message(f"缩略图: {directory} 新生成 {fetched} 张，用时 {format_duration(time.time() - start)}")
+                
+        canvas.configure(yscrollcommand=scrollbar.set, yscrollincrement=20)
+        scrollbar.configure(command=on_yview)
+        canvas.bind("<Configure>", render)
+        canvas.bind("<MouseWheel>", on_mousewheel)
+        canvas.bind("<Button-4>", lambda event: (canvas.yview_scroll(-3, "units"), render()))
+        canvas.bind("<Button-5>", lambda event: (canvas.yview_scroll(3, "units"), render()))
+        canvas.bind("<Double-1>", on_double_click)
+        loader.on_ready = on_ready
+        
+        view["cached"] = sum(1 for position in range(len(images)) if loader.cached(position) is not None)
+        if view["cached"] < len(images):
+            task = self.scheduler.submit(job, device=device_id, description=f"获取缩略图: {directory}")
+            dialog.bind("<Destroy>", lambda event: event.widget is dialog and self.scheduler.cancel(task))
+        update_status()
+        
+    PREVIEW_BLOCK = 32 * 1024
+    PREVIEW_WINDOW = 256 * 1024
+    
+    def preview_file(self):
+        """预览设备文件，只读取正在查看的字节范围"""
+        device_id = self.current_device.get()
+        if not device_id:
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        if not self.settings.get("use_native_adb", True) or time.time() < self.native_adb_retry_at:
+            messagebox.showwarning("警告", "文件预览需要直接连接adb server，请在设置中启用")
+            return
+            
+        selected = self.file_tree.selection()
+        if not selected:
+            messagebox.showwarning("警告", "请先选择要预览的文件")
+            return
+        item_text = self.file_tree.item(selected[0], "text")
+        if item_text.endswith("/"):
+            messagebox.showwarning("警告", "不能预览文件夹")
+            return
+            
+        current_path = self.current_path_entry.get().strip()
+        file_path = os.path.join(current_path, item_text).replace("\\", "/")
+        
+        def lookup():
+            entry = self.stat_device_path(file_path, device_id)
+            if entry is None:
+                self.log_message(f"文件不存在: {file_path}", "ERROR")
+                return
+            self.root.after(0, self.open_preview_window, device_id, file_path, entry.size)
+            
+        self.scheduler.submit(lookup, device=device_id, description=f"预览文件: {item_text}")
+        
+    def open_preview_window(self, device_id, path, size):
+        """文件预览窗口：开头/结尾/任意偏移，滚动到边缘时继续读取相邻的范围
+        
+        窗口中最多保留 PREVIEW_WINDOW 字节，超出时丢弃另一端的数据。
+        """
+        reader = RemoteFileReader(self.adb_client, device_id, path, size)
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"预览: {path}")
+        dialog.geometry("820x600")
+        dialog.transient(self.root)
+        
+        toolbar = ttk.Frame(dialog, padding=(10, 10, 10, 5))
+        toolbar.pack(fill=tk.X)
+        
+        mode_var = tk.StringVar(value="text")
+        ttk.Radiobutton(toolbar, text="文本", variable=mode_var, value="text").pack(side=tk.LEFT)
+        ttk.Radiobutton(toolbar, text="十六进制", variable=mode_var, value="hex").pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Button(toolbar, text="开头", command=lambda: jump("head")).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(toolbar, text="结尾", command=lambda: jump("tail")).pack(side=tk.LEFT, padx=(0, 15))
+        ttk.Label(toolbar, text="偏移:").pack(side=tk.LEFT)
+        offset_entry = ttk.Entry(toolbar, width=14)
+        offset_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="跳转", command=lambda: jump("offset")).pack(side=tk.LEFT)
+        
+        status_var = tk.StringVar(value="正在读取...")
+        ttk.Label(dialog, textvariable=status_var).pack(anchor=tk.W, padx=10)
+        
+        text_frame = ttk.Frame(dialog)
+        text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 10))
+        text = tk.Text(text_frame, wrap=tk.NONE, font=("Consolas", 10), state=tk.DISABLED)
+        y_scrollbar = ttk.Scrollbar(text_frame, orient=tk.VERTICAL, command=text.yview)
+        x_scrollbar = ttk.Scrollbar(text_frame, orient=tk.HORIZONTAL, command=text.xview)
+        text.configure(xscrollcommand=x_scrollbar.set)
+        y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        x_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        # start/data 为当前窗口中的字节范围，lead 为文本模式下跳过的不完整UTF-8字节数
+        view = {"start": 0, "data": b"", "lead": 0, "mode": None, "loading": False}
+        
+        def top_offset():
+            """当前显示在最上面一行对应的文件偏移"""
+            line = int(text.index("@0,0").split(".")[0])
+            if view["mode"] == "hex":
+                return view["start"] + (line - 1) * 16
+            pos = view["lead"]
+            for _ in range(line - 1):
+                pos = view["data"].find(b"\n", pos) + 1
+                if pos == 0:
+                    break
+            return view["start"] + pos
+            
+        def render(anchor=None):
+            data = view["data"]
+            if view["mode"] == "hex":
+                view["lead"] = 0
+                content = format_hex_dump(data, view["start"])
+            else:
+                lead = 0
+                if view["start"] > 0:
+                    while lead < min(3, len(data)) and 0x80 <= data[lead] < 0xC0:
+                        lead += 1
+                view["lead"] = lead
+                content = data[lead:].decode("utf-8", errors="replace")
+                
+            text.configure(state=tk.NORMAL)
+            text.delete("1.0", tk.END)
+            text.insert("1.0", content)
+            text.configure(state=tk.DISABLED)
+            
+            if anchor == "end":
+                text.see(tk.END)
+            elif anchor is not None:
+                relative = max(0, anchor - view["start"])
+                if view["mode"] == "hex":
+                    line = relative // 16 + 1
+                else:
+                    line = data.count(b"\n", 0, relative) + 1
+                text.yview(f"{line}.0")
+                
+            end = view["start"] + len(data)
+            status_var.set(f"大小 {format_size(size)}，显示 0x{view['start']:x} - 0x{end:x}，"
+                           f"已传输 {format_size(reader.bytes_fetched)}")
+            
+        def apply(offset, data, how, anchor):
+            try:
+                if view["mode"] is None:
+                    view["mode"] = "text" if looks_like_text(data) else "hex"
+                    mode_var.set(view["mode"])
+                if how in ("append", "prepend"):
+                    anchor = top_offset()
+                if how == "append":
+                    view["data"] += data
+                    excess = len(view["data"]) - self.PREVIEW_WINDOW
+                    if excess > 0:
+                        excess += -excess % RemoteFileReader.PAGE_SIZE
+                        view["start"] += excess
+                        view["data"] = view["data"][excess:]
+                elif how == "prepend":
+                    view["data"] = (data + view["data"])[:self.PREVIEW_WINDOW]
+                    view["start"] = offset
+                else:
+                    view["start"] = offset
+                    view["data"] = data
+                render(anchor)
+            except tk.TclError:
+                # 窗口已关闭
+                pass
+            finally:
+                view["loading"] = False
+                
+        def load(offset, length, how, anchor=None):
+            if view["loading"]:
+                return
+            view["loading"] = True
+            
+            def job():
+                try:
+                    data = reader.read(offset, length)
+                except Exception as e:
+                    self.log_message(f"读取文件失败: {str(e)}", "ERROR")
+                    view["loading"] = False
+                    return
+                self.root.after(0, apply, offset, data, how, anchor)
+                
+            self.scheduler.submit(job, device=device_id, description=f"预览: {os.path.basename(path)}")
+            
+        def jump(where):
+            page = RemoteFileReader.PAGE_SIZE
+            if where == "head":
+                load(0, self.PREVIEW_BLOCK, "replace", 0)
+            elif where == "tail":
+                offset = max(0, size - self.PREVIEW_BLOCK)
+                load(offset - offset % page, self.PREVIEW_BLOCK + page, "replace", "end")
+            else:
+                try:
+                    offset = int(offset_entry.get().strip(), 0)
+                except ValueError:
+                    messagebox.showwarning("警告", "请输入有效的偏移（十进制或0x开头的十六进制）", parent=dialog)
+                    return
+                offset = min(max(offset, 0), max(size - 1, 0))
+                load(offset - offset % page, self.PREVIEW_BLOCK, "replace", offset)
+                
+        def on_scroll(first, last):
+            y_scrollbar.set(first, last)
+            if view["loading"] or view["mode"] is None:
+                return
+            end = view["start"] + len(view["data"])
+            if float(last) >= 0.999 and end < size:
+                load(end, self.PREVIEW_BLOCK, "append")
+            elif float(first) <= 0.0 and view["start"] > 0:
+                offset = max(0, view["start"] - self.PREVIEW_BLOCK)
+                load(offset, view["start"] - offset, "prepend")
+                
+        def on_mode_change(*args):
+            if view["mode"] is None or mode_var.get() == view["mode"]:
+                return
+            anchor = top_offset()
+            view["mode"] = mode_var.get()
+            render(anchor)
+            
+        text.configure(yscrollcommand=on_scroll)
+        mode_var.trace_add("write", on_mode_change)
+        jump("head")
+        
+    TRANSFER_REFRESH_INTERVAL = 500
+    
+    def setup_transfer_panel(self, parent):
+        """设置传输面板：进行中的传输和历史记录"""
+        active_frame = ttk.LabelFrame(parent, text="进行中的传输", padding=10)
+        active_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        
+        columns = ("device", "progress", "speed", "average", "eta")
+        self.transfer_tree = ttk.Treeview(active_frame, columns=columns, show="tree headings", height=6)
+        self.transfer_tree.heading("#0", text="传输")
+        self.transfer_tree.heading("device", text="设备")
+        self.transfer_tree.heading("progress", text="进度")
+        self.transfer_tree.heading("speed", text="当前速度")
+        self.transfer_tree.heading("average", text="平均速度")
+        self.transfer_tree.heading("eta", text="剩余时间")
+        self.transfer_tree.column("#0", width=220)
+        self.transfer_tree.column("device", width=120)
+        self.transfer_tree.column("progress", width=170)
+        self.transfer_tree.column("speed", width=90)
+        self.transfer_tree.column("average", width=90)
+        self.transfer_tree.column("eta", width=80)
+        self.transfer_tree.pack(fill=tk.BOTH, expand=True)
+        
+        history_frame = ttk.LabelFrame(parent, text="传输历史", padding=10)
+        history_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("device", "size", "elapsed", "rate", "status")
+        tree_frame = ttk.Frame(history_frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        self.transfer_history_tree = ttk.Treeview(tree_frame, columns=columns, show="tree headings")
+        self.transfer_history_tree.heading("#0", text="传输")
+        self.transfer_history_tree.heading("device", text="设备")
+        self.transfer_history_tree.heading("size", text="大小")
+        self.transfer_history_tree.heading("elapsed", text="用时")
+        self.transfer_history_tree.heading("rate", text="平均速度")
+        self.transfer_history_tree.heading("status", text="结果")
+        self.transfer_history_tree.column("#0", width=260)
+        self.transfer_history_tree.column("device", width=120)
+        self.transfer_history_tree.column("size", width=90)
+        self.transfer_history_tree.column("elapsed", width=70)
+        self.transfer_history_tree.column("rate", width=90)
+        self.transfer_history_tree.column("status", width=70)
+        history_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.transfer_history_tree.yview)
+        self.transfer_history_tree.configure(yscrollcommand=history_scrollbar.set)
+        self.transfer_history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        history_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        history_buttons = ttk.Frame(history_frame)
+        history_buttons.pack(fill=tk.X, pady=(10, 0))
+        if BOOTSTRAP_AVAILABLE:
+            ttk.Button(history_buttons, text="清空历史", bootstyle="danger-outline", 
+                     command=self.clear_transfer_history).pack(side=tk.LEFT)
+        else:
+            ttk.Button(history_buttons, text="清空历史", command=self.clear_transfer_history).pack(side=tk.LEFT)
+        
+        self.transfer_history_version = -1
+        self.refresh_transfer_panel()
+        
+    def refresh_transfer_panel(self):
+        """定时刷新传输面板"""
+        try:
+            active = self.transfer_tracker.active()
+            active_ids = {str(record.id) for record in active}
+            for item in self.transfer_tree.get_children():
+                if item not in active_ids:
+                    self.transfer_tree.delete(item)
+            for record in active:
+                if record.total_bytes:
+                    percent = record.done_bytes * 100 / record.total_bytes
+                    progress = f"{percent:.1f}% ({format_size(record.done_bytes)}/{format_size(record.total_bytes)})"
+                else:
+                    progress = format_size(record.done_bytes)
+                eta = record.eta
+                values = (record.device or "", progress, f"{format_size(record.instant_rate)}/s",
+                          f"{format_size(record.average_rate)}/s", format_duration(eta) if eta is not None else "")
+                if self.transfer_tree.exists(str(record.id)):
+                    self.transfer_tree.item(str(record.id), values=values)
+                else:
+                    self.transfer_tree.insert("", tk.END, iid=str(record.id), text=record.description, values=values)
+                    
+            # 历史记录变化时才重建列表
+            history = self.transfer_tracker.history
+            if self.transfer_tracker.version != self.transfer_history_version:
+                self.transfer_history_version = self.transfer_tracker.version
+                self.transfer_history_tree.delete(*self.transfer_history_tree.get_children())
+                for entry in reversed(history):
+                    self.transfer_history_tree.insert("", tk.END, text=f"{entry['time']}  {entry['description']}", values=(
+                        entry["device"] or "", format_size(entry["bytes"]), format_duration(entry["elapsed"]),
+                        f"{format_size(entry['rate'])}/s", entry["status"]))
+                    
+            self.root.after(self.TRANSFER_REFRESH_INTERVAL, self.refresh_transfer_panel)
+        except tk.TclError:
+            # 窗口已关闭
+            pass
+            
+    def clear_transfer_history(self):
+        """清空传输历史"""
+        self.transfer_tracker.clear_history()
         
     def setup_system_tools(self, parent):
         """设置系统工具"""
@@ -1214,7 +5543,8 @@ class ADBToolbox:
             ("启动应用", self.start_app),
             ("停止应用", self.stop_app),
             ("清除数据", self.clear_app_data),
-            ("应用信息", self.get_app_info)
+            ("应用信息", self.get_app_info),
+            ("多设备安装", lambda: self.install_apk(multi_device=True))
         ]
         
         for i, (text, command) in enumerate(buttons):
@@ -1502,6 +5832,12 @@ class ADBToolbox:
         )
         self.console_text.pack(fill=tk.BOTH, expand=True)
         
+        # 预先配置日志颜色标签，并启动日志队列消费
+        self.console_text.tag_config("error", foreground="red")
+        self.console_text.tag_config("warning", foreground="yellow")
+        self.console_text.tag_config("success", foreground="lightgreen")
+        self.root.after(self.LOG_FLUSH_INTERVAL, self.process_log_queue)
+        
         # 控制台按钮
         console_buttons = ttk.Frame(parent)
         console_buttons.pack(fill=tk.X, pady=(10, 0))
@@ -1515,6 +5851,12 @@ class ADBToolbox:
                      command=self.export_log).pack(side=tk.LEFT, padx=(5, 0))
             ttk.Button(console_buttons, text="重复上次命令", bootstyle="warning", 
                      command=self.repeat_last_command).pack(side=tk.LEFT, padx=(5, 0))
+            ttk.Button(console_buttons, text="多设备执行", bootstyle="info-outline", 
+                     command=self.execute_custom_command_on_devices).pack(side=tk.LEFT, padx=(5, 0))
+            ttk.Button(console_buttons, text="取消当前命令", bootstyle="danger", 
+                     command=self.cancel_running_commands).pack(side=tk.LEFT, padx=(5, 0))
+            ttk.Button(console_buttons, text="取消排队任务", bootstyle="danger-outline", 
+                     command=self.cancel_pending_tasks).pack(side=tk.LEFT, padx=(5, 0))
         else:
             ttk.Button(console_buttons, text="清空控制台", 
                      command=self.clear_console).pack(side=tk.LEFT)
@@ -1524,6 +5866,12 @@ class ADBToolbox:
                      command=self.export_log).pack(side=tk.LEFT, padx=(5, 0))
             ttk.Button(console_buttons, text="重复上次命令", 
                      command=self.repeat_last_command).pack(side=tk.LEFT, padx=(5, 0))
+            ttk.Button(console_buttons, text="多设备执行", 
+                     command=self.execute_custom_command_on_devices).pack(side=tk.LEFT, padx=(5, 0))
+            ttk.Button(console_buttons, text="取消当前命令", 
+                     command=self.cancel_running_commands).pack(side=tk.LEFT, padx=(5, 0))
+            ttk.Button(console_buttons, text="取消排队任务", 
+                     command=self.cancel_pending_tasks).pack(side=tk.LEFT, padx=(5, 0))
         
     def show_previous_command(self, event):
         """显示上一条命令"""
@@ -1544,6 +5892,30 @@ class ADBToolbox:
             self.command_entry.delete(0, tk.END)
         return "break"
         
+    def cancel_running_commands(self):
+        """取消正在执行的命令"""
+        tasks = self.scheduler.running_tasks()
+        for task in tasks:
+            self.scheduler.cancel(task)
+        if not tasks:
+            self.log_message("没有正在执行的命令", "INFO")
+        
+    def cancel_pending_tasks(self):
+        """取消所有排队中的任务"""
+        count = self.scheduler.cancel_all()
+        self.log_message(f"已取消 {count} 个排队任务", "WARNING" if count else "INFO")
+        
+    def on_scheduler_changed(self, depth):
+        """调度器队列变化时更新状态栏"""
+        if depth["queued"] or depth["running"]:
+            text = f"运行 {depth['running']} / 排队 {depth['queued']}"
+        else:
+            text = "空闲"
+        try:
+            self.root.after(0, self.task_status.set, text)
+        except (RuntimeError, tk.TclError):
+            pass
+        
     def repeat_last_command(self):
         """重复上次命令"""
         if self.last_command:
@@ -1586,7 +5958,9 @@ class ADBToolbox:
             ttk.Button(buttons_frame, text="删除命令", bootstyle="danger", 
                      command=self.delete_quick_command).pack(side=tk.LEFT, padx=(0, 5))
             ttk.Button(buttons_frame, text="执行命令", bootstyle="warning", 
-                     command=self.run_quick_command).pack(side=tk.LEFT)
+                     command=self.run_quick_command).pack(side=tk.LEFT, padx=(0, 5))
+            ttk.Button(buttons_frame, text="多设备执行", bootstyle="info-outline", 
+                     command=lambda: self.run_quick_command(multi_device=True)).pack(side=tk.LEFT)
         else:
             ttk.Button(buttons_frame, text="添加命令", 
                      command=self.add_quick_command).pack(side=tk.LEFT, padx=(0, 5))
@@ -1595,7 +5969,9 @@ class ADBToolbox:
             ttk.Button(buttons_frame, text="删除命令", 
                      command=self.delete_quick_command).pack(side=tk.LEFT, padx=(0, 5))
             ttk.Button(buttons_frame, text="执行命令", 
-                     command=self.run_quick_command).pack(side=tk.LEFT)
+                     command=self.run_quick_command).pack(side=tk.LEFT, padx=(0, 5))
+            ttk.Button(buttons_frame, text="多设备执行", 
+                     command=lambda: self.run_quick_command(multi_device=True)).pack(side=tk.LEFT)
         
         # 绑定双击事件
         self.commands_tree.bind("<Double-1>", lambda e: self.run_quick_command())
@@ -1788,7 +6164,7 @@ class ADBToolbox:
                 self.settings["custom_commands"] = commands
                 self.save_settings()
                 
-    def run_quick_command(self):
+    def run_quick_command(self, multi_device=False):
         """运行快捷命令"""
         # 获取选中的命令
         selected = self.commands_tree.selection()
@@ -1802,7 +6178,10 @@ class ADBToolbox:
         command = values[1]
         description = values[2]
         
-        self.execute_command(command, description)
+        if multi_device:
+            self.execute_command_on_devices(command, description)
+        else:
+            self.execute_command(command, description)
         
     def create_status_bar(self, parent):
         """创建状态栏"""
@@ -1819,6 +6198,10 @@ class ADBToolbox:
         self.device_label = ttk.Label(status_frame, textvariable=self.current_device)
         self.device_label.pack(side=tk.LEFT, padx=(5, 20))
         
+        # 任务队列状态
+        ttk.Label(status_frame, text="任务:").pack(side=tk.LEFT)
+        ttk.Label(status_frame, textvariable=self.task_status).pack(side=tk.LEFT, padx=(5, 20))
+        
         # 管理员状态
         admin_text = "管理员模式" if self.is_admin else "普通模式"
         admin_color = "green" if self.is_admin else "red"
@@ -1847,24 +6230,52 @@ class ADBToolbox:
         widget.bind("<Leave>", on_leave)
         
     def log_message(self, message, level="INFO"):
-        """记录日志消息"""
+        """记录日志消息（线程安全，由主线程批量写入控制台）"""
         timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] [{level}] {message}\n"
-        
-        self.console_text.insert(tk.END, log_entry)
-        self.console_text.see(tk.END)
-        
-        # 根据日志级别设置颜色
-        if level == "ERROR":
-            self.console_text.tag_add("error", "end-2l", "end-1l")
-            self.console_text.tag_config("error", foreground="red")
-        elif level == "WARNING":
-            self.console_text.tag_add("warning", "end-2l", "end-1l")
-            self.console_text.tag_config("warning", foreground="yellow")
-        elif level == "SUCCESS":
-            self.console_text.tag_add("success", "end-2l", "end-1l")
-            self.console_text.tag_config("success", foreground="lightgreen")
+        self.log_queue.put((f"[{timestamp}] [{level}] {message}\n", self.LOG_TAGS.get(level, ())))
+        
+    def process_log_queue(self):
+        """在主线程中批量取出日志并写入控制台"""
+        runs = []
+        try:
+            for _ in range(self.LOG_BATCH_SIZE):
+                entry, tag = self.log_queue.get_nowait()
+                # 合并相同级别的连续日志，减少控件调用次数
+                if runs and runs[-1][1] == tag:
+                    runs[-1][0].append(entry)
+                else:
+                    runs.append(([entry], tag))
+        except queue.Empty:
+            pass
+            
+        try:
+            if runs:
+                args = []
+                for entries, tag in runs:
+                    args.extend(("".join(entries), tag))
+                self.console_text.insert(tk.END, *args)
+                self.trim_console()
+                self.console_text.see(tk.END)
+            self.root.after(self.LOG_FLUSH_INTERVAL, self.process_log_queue)
+        except tk.TclError:
+            # 窗口已关闭
+            pass
+            
+    def trim_console(self):
+        """控制台超过最大行数时，将最旧的日志移出控件并写入历史日志文件"""
+        max_lines = self.settings.get("console_max_lines", 5000)
+        line_count = int(self.console_text.index("end-1c").split(".")[0])
+        # 多留一部分余量，避免每帧都裁剪
+        if line_count <= max_lines + max_lines // 10:
+            return
             
+        cut_index = f"{line_count - max_lines + 1}.0"
+        try:
+            self.console_history.spill(self.console_text.get("1.0", cut_index))
+        except OSError as e:
+            print(f"写入历史日志失败: {e}")
+        self.console_text.delete("1.0", cut_index)
+        
     def check_environment(self):
         """检查ADB环境"""
         def check():
@@ -1973,10 +6384,13 @@ class ADBToolbox:
             # 如果设置了自动连接，则尝试连接设备
             if self.settings.get("auto_connect", True):
                 self.refresh_devices()
+                
+            # 启动设备实时跟踪
+            self.start_device_tracker()
             
         threading.Thread(target=check, daemon=True).start()
         
-    def connect_device(self):
+    def connect_device(self, background=False):
         """连接设备"""
         def connect():
             try:
@@ -1997,8 +6411,7 @@ class ADBToolbox:
                     
                     # 执行连接命令
                     self.log_message(f"正在连接到 {ip}:{port}...")
-                    result = subprocess.run([self.adb_path, 'connect', f"{ip}:{port}"], 
-                                          capture_output=True, text=True, timeout=10)
+                    result = self.run_adb(['connect', f"{ip}:{port}"], timeout=10)
                     
                     if "connected" in result.stdout.lower():
                         self.log_message(f"WiFi连接成功: {ip}:{port}", "SUCCESS")
@@ -2006,8 +6419,7 @@ class ADBToolbox:
                         self.log_message(f"WiFi连接失败: {result.stdout}", "ERROR")
                 
                 # 获取设备列表
-                result = subprocess.run([self.adb_path, 'devices'], 
-                                      capture_output=True, text=True, timeout=10)
+                result = self.run_adb(['devices'], timeout=10)
                 
                 if result.returncode == 0:
                     devices = []
@@ -2020,25 +6432,14 @@ class ADBToolbox:
                                 devices.append(device_id)
                             else:
                                 self.log_message(f"设备 {device_id} 状态: {status}", "WARNING")
-                            
+                                
+                    changed = self.update_device_list(devices)
                     if devices:
-                        self.connected_devices = devices
-                        self.device_combo['values'] = devices
-                        
-                        # 如果当前没有选择设备，则选择第一个
-                        if not self.current_device.get() or self.current_device.get() not in devices:
-                            self.current_device.set(devices[0])
-                            
-                        self.connection_status.set("已连接")
-                        self.status_label.config(foreground="green")
-                        self.log_message(f"设备连接成功: {self.current_device.get()}", "SUCCESS")
-                        self.get_device_info()
+                        # 后台刷新仅在当前设备变化时提示
+                        if changed or not background:
+                            self.log_message(f"设备连接成功: {self.current_device.get()}", "SUCCESS")
+                            self.get_device_info()
                     else:
-                        self.connected_devices = []
-                        self.device_combo['values'] = []
-                        self.current_device.set("")
-                        self.connection_status.set("未找到设备")
-                        self.status_label.config(foreground="red")
                         self.log_message("未找到设备，请检查连接", "WARNING")
                 else:
                     self.log_message("设备连接失败", "ERROR")
@@ -2046,105 +6447,453 @@ class ADBToolbox:
             except Exception as e:
                 self.log_message(f"连接错误: {str(e)}", "ERROR")
                 
-        threading.Thread(target=connect, daemon=True).start()
+        priority = CommandScheduler.PRIORITY_BACKGROUND if background else CommandScheduler.PRIORITY_INTERACTIVE
+        self.scheduler.submit(connect, priority=priority, key="connect_device", description="扫描设备")
+        
+    def update_device_list(self, devices):
+        """更新设备列表和连接状态，当前选择的设备发生变化时返回True"""
+        previous = self.current_device.get()
+        self.connected_devices = devices
+        self.device_combo['values'] = devices
+        
+        if devices:
+            # 如果当前没有选择设备，则选择第一个
+            if not previous or previous not in devices:
+                self.current_device.set(devices[0])
+            self.connection_status.set("已连接")
+            self.status_label.config(foreground="green")
+        else:
+            self.current_device.set("")
+            self.connection_status.set("未找到设备")
+            self.status_label.config(foreground="red")
+            
+        return bool(devices) and self.current_device.get() != previous
+        
+    def start_device_tracker(self):
+        """启动基于host:track-devices的设备跟踪"""
+        if not self.settings.get("use_native_adb", True):
+            return
+        if self.device_tracker is None:
+            self.device_tracker = DeviceTracker(
+                self.adb_client,
+                on_change=lambda devices, events: self.root.after(0, self.on_devices_changed, devices, events),
+                on_status=self.on_device_tracker_status
+            )
+        self.device_tracker.start()
+        # 订阅未能建立时同样需要轮询
+        self.start_tracker_fallback()
+        
+    def stop_device_tracker(self):
+        """停止设备跟踪（禁用直接连接adb server时）"""
+        tracker, self.device_tracker = self.device_tracker, None
+        if tracker:
+            tracker.stop()
+            
+    def start_tracker_fallback(self):
+        """启动后备轮询线程：设备跟踪断开期间，即使没有开启自动刷新也定期刷新设备列表"""
+        if self.tracker_fallback_thread and self.tracker_fallback_thread.is_alive():
+            return
+        self.tracker_fallback_thread = threading.Thread(target=self.tracker_fallback_task, daemon=True)
+        self.tracker_fallback_thread.start()
+        
+    def tracker_fallback_task(self):
+        """后备轮询任务，跟踪恢复或被停止后退出"""
+        while True:
+            time.sleep(5)
+            tracker = self.device_tracker
+            if tracker is None or tracker.connected:
+                return
+            # 自动刷新已在轮询时不重复刷新
+            if not self.auto_refresh_running:
+                self.refresh_devices(background=True)
+        
+    def on_device_tracker_status(self, connected):
+        """设备跟踪订阅状态变化"""
+        if self.device_tracker is None:
+            return
+        if connected:
+            self.log_message("设备跟踪已启动，设备变化将实时更新", "INFO")
+        else:
+            self.log_message("设备跟踪连接已断开，正在重连，期间每5秒轮询设备列表", "WARNING")
+            self.start_tracker_fallback()
+            
+    def on_devices_changed(self, devices, events):
+        """设备跟踪器回调（主线程）：设备连接、断开或状态变化"""
+        for event, serial, state in events:
+            if event == "connected":
+                self.log_message(f"设备已接入: {serial} ({state})", "SUCCESS" if state == "device" else "WARNING")
+            elif event == "disconnected":
+                self.log_message(f"设备已断开: {serial}", "WARNING")
+            else:
+                self.log_message(f"设备 {serial} 状态: {state}", "SUCCESS" if state == "device" else "WARNING")
+                
+        ready = [serial for serial, state in devices if state == "device"]
+        if self.update_device_list(ready):
+            self.get_device_info()
         
-    def refresh_devices(self):
+    def refresh_devices(self, background=False):
         """刷新设备列表"""
-        self.connect_device()
+        self.connect_device(background)
         
-    def get_device_info(self):
-        """获取设备信息"""
+    def get_device_info(self, background=False):
+        """获取设备信息
+        
+        先显示缓存中的信息，再只查询缺失的静态属性和已过期的动态信息；
+        每次都会重新读取 ro.build.fingerprint（很快），设备刷机后不会继续显示旧的属性。
+        """
+        device_id = self.current_device.get()
+        if not device_id:
+            return
+            
+        cached = self.device_info_cache.get(device_id)
+        if cached and not background:
+            self.show_device_info(format_device_info(cached))
+            
         def get_info():
             try:
-                device_id = self.current_device.get()
-                if not device_id:
+                include_props = not self.device_info_cache.has_static(device_id)
+                sections = self.device_info_cache.expired_sections(device_id)
+                
+                # 一次shell调用收集需要的信息
+                result = self.run_adb(['-s', device_id, 'shell', build_device_info_script(include_props, sections)], timeout=10)
+                if result.returncode != 0 and not result.stdout:
+                    self.log_message(f"获取设备信息失败: {result.stderr.strip()}", "ERROR")
                     return
                     
-                # 检查缓存
-                if device_id in self.device_info_cache:
-                    # 更新设备信息显示
-                    self.device_info_text.config(state=tk.NORMAL)
-                    self.device_info_text.delete(1.0, tk.END)
-                    self.device_info_text.insert(1.0, self.device_info_cache[device_id])
-                    self.device_info_text.config(state=tk.DISABLED)
-                    return
+                info = parse_device_info(result.stdout)
+                if not self.device_info_cache.update(device_id, info):
+                    # 设备系统版本已变化，重新获取静态属性
+                    result = self.run_adb(['-s', device_id, 'shell', build_device_info_script(True, ())], timeout=10)
+                    self.device_info_cache.update(device_id, parse_device_info(result.stdout))
                 
-                info_commands = [
-                    ("ro.product.model", "设备型号"),
-                    ("ro.build.version.release", "Android版本"),
-                    ("ro.build.version.sdk", "API级别"),
-                    ("ro.product.manufacturer", "制造商"),
-                    ("ro.product.brand", "品牌"),
-                    ("ro.build.display.id", "系统版本"),
-                ]
+                if self.current_device.get() == device_id:
+                    self.root.after(0, self.show_device_info, format_device_info(self.device_info_cache.get(device_id)))
+                
+            except Exception as e:
+                self.log_message(f"获取设备信息失败: {str(e)}", "ERROR")
                 
-                device_info = "设备信息:\n" + "="*30 + "\n"
+        priority = CommandScheduler.PRIORITY_BACKGROUND if background else CommandScheduler.PRIORITY_INTERACTIVE
+        self.scheduler.submit(get_info, priority=priority, device=device_id, key=f"device_info:{device_id}",
+                              description="获取设备信息")
+        
+    def show_device_info(self, text):
+        """更新设备信息显示"""
+        self.device_info_text.config(state=tk.NORMAL)
+        self.device_info_text.delete(1.0, tk.END)
+        self.device_info_text.insert(1.0, text)
+        self.device_info_text.config(state=tk.DISABLED)
+        
+    def refresh_device_info_periodically(self):
+        """定期在后台刷新当前设备已过期的动态信息"""
+        try:
+            if self.current_device.get():
+                self.get_device_info(background=True)
+            self.root.after(self.DEVICE_INFO_REFRESH_INTERVAL, self.refresh_device_info_periodically)
+        except tk.TclError:
+            # 窗口已关闭
+            pass
+        
+    def run_adb(self, args, timeout=None):
+        """执行ADB命令，返回subprocess.CompletedProcess
+        
+        优先通过原生协议客户端与adb server通信，server不可达时回退到adb程序。
+        """
+        if self.settings.get("use_native_adb", True) and time.time() >= self.native_adb_retry_at:
+            try:
+                result = self.run_adb_native(args, timeout)
+                if result is not None:
+                    return result
+            except ADBServerUnavailable:
+                # adb server未运行，回退到adb程序（adb程序会自动启动server），稍后再尝试原生协议
+                self.native_adb_retry_at = time.time() + 10
+            except socket.timeout:
+                raise subprocess.TimeoutExpired(args, timeout)
+            except (ADBError, OSError) as e:
+                return subprocess.CompletedProcess(args, 1, "", f"error: {e}\n")
                 
-                for prop, desc in info_commands:
-                    result = subprocess.run([self.adb_path, '-s', device_id, 'shell', 'getprop', prop],
-                                          capture_output=True, text=True, timeout=5, encoding='utf-8', errors='ignore')
-                    if result.returncode == 0:
-                        value = result.stdout.strip()
-                        device_info += f"{desc}: {value}\n"
+        return subprocess.run([self.adb_path] + list(args), capture_output=True, text=True,
+                              timeout=timeout, encoding='utf-8', errors='ignore')
+        
+    def stream_adb(self, args, on_lines, timeout=None, cancel_event=None):
+        """流式执行ADB命令，输出按行分批回调 on_lines(stream, lines)
+        
+        返回退出码；被取消时返回None；超时抛出subprocess.TimeoutExpired。
+        """
+        batcher = OutputLineBatcher(on_lines)
+        try:
+            if self.settings.get("use_native_adb", True) and time.time() >= self.native_adb_retry_at:
+                serial, rest = None, list(args)
+                if len(rest) >= 2 and rest[0] == '-s':
+                    serial, rest = rest[1], rest[2:]
+                if len(rest) >= 2 and rest[0] == 'shell' and not rest[1].startswith('-'):
+                    try:
+                        return self.adb_client.shell_stream(serial, " ".join(rest[1:]), batcher.feed,
+                                                            cancel_event, timeout, on_idle=batcher.flush_if_due)
+                    except ADBServerUnavailable:
+                        self.native_adb_retry_at = time.time() + 10
+                    except socket.timeout:
+                        raise subprocess.TimeoutExpired(args, timeout)
+                    except (ADBError, OSError) as e:
+                        batcher.feed("stderr", f"error: {e}\n".encode("utf-8"))
+                        return 1
                         
-                # 获取电池信息
-                battery_result = subprocess.run([self.adb_path, '-s', device_id, 'shell', 'dumpsys', 'battery'],
-                                              capture_output=True, text=True, timeout=5, encoding='utf-8', errors='ignore')
-                if battery_result.returncode == 0:
-                    battery_lines = battery_result.stdout.split('\n')
-                    for line in battery_lines:
-                        if 'level:' in line:
-                            level = line.split(':')[1].strip()
-                            device_info += f"电池电量: {level}%\n"
-                            break
-                            
-                # 获取存储信息
-                storage_result = subprocess.run([self.adb_path, '-s', device_id, 'shell', 'df', '/sdcard'],
-                                              capture_output=True, text=True, timeout=5, encoding='utf-8', errors='ignore')
-                if storage_result.returncode == 0:
-                    storage_lines = storage_result.stdout.split('\n')
-                    if len(storage_lines) > 1:
-                        parts = storage_lines[1].split()
-                        if len(parts) >= 4:
-                            total = int(parts[1]) // 1024  # KB to MB
-                            used = int(parts[2]) // 1024   # KB to MB
-                            free = int(parts[3]) // 1024   # KB to MB
-                            device_info += f"存储空间: 总计 {total}MB, 已用 {used}MB, 可用 {free}MB\n"
-                
-                # 获取内存信息
-                mem_result = subprocess.run([self.adb_path, '-s', device_id, 'shell', 'cat', '/proc/meminfo'],
-                                          capture_output=True, text=True, timeout=5, encoding='utf-8', errors='ignore')
-                if mem_result.returncode == 0:
-                    mem_lines = mem_result.stdout.split('\n')
-                    total_mem = 0
-                    free_mem = 0
-                    
-                    for line in mem_lines:
-                        if 'MemTotal:' in line:
-                            total_mem = int(line.split()[1]) // 1024  # KB to MB
-                        elif 'MemFree:' in line:
-                            free_mem = int(line.split()[1]) // 1024   # KB to MB
-                            
-                    if total_mem > 0:
-                        used_mem = total_mem - free_mem
-                        device_info += f"内存: 总计 {total_mem}MB, 已用 {used_mem}MB, 可用 {free_mem}MB\n"
+            return self._stream_adb_process(args, batcher, timeout, cancel_event)
+        finally:
+            batcher.flush(final=True)
+            
+    def _stream_adb_process(self, args, batcher, timeout, cancel_event):
+        """通过adb程序流式执行命令"""
+        process = subprocess.Popen([self.adb_path] + list(args), stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+        output_queue = queue.Queue()
+        
+        def reader(stream_name, pipe):
+            for line in iter(pipe.readline, b""):
+                output_queue.put((stream_name, line))
+            pipe.close()
+            output_queue.put((stream_name, None))
+            
+        for stream_name, pipe in (("stdout", process.stdout), ("stderr", process.stderr)):
+            threading.Thread(target=reader, args=(stream_name, pipe), daemon=True).start()
+            
+        deadline = time.time() + timeout if timeout else None
+        open_streams = 2
+        try:
+            while open_streams:
+                if cancel_event is not None and cancel_event.is_set():
+                    process.kill()
+                    return None
+                if deadline is not None and time.time() > deadline:
+                    process.kill()
+                    raise subprocess.TimeoutExpired(args, timeout)
+                try:
+                    stream_name, line = output_queue.get(timeout=0.1)
+                except queue.Empty:
+                    batcher.flush_if_due()
+                    continue
+                if line is None:
+                    open_streams -= 1
+                else:
+                    batcher.feed(stream_name, line)
+            return process.wait(timeout=max(deadline - time.time(), 0.1) if deadline else None)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            raise
+            
+    def run_adb_native(self, args, timeout=None):
+        """通过原生协议执行ADB命令，不支持的命令返回None"""
+        args = list(args)
+        serial = None
+        if len(args) >= 2 and args[0] == '-s':
+            serial = args[1]
+            args = args[2:]
+        if not args:
+            return None
+            
+        command, rest = args[0], args[1:]
+        if command == 'devices' and not rest:
+            devices = self.adb_client.devices()
+            stdout = "List of devices attached\n" + "".join(f"{d}\t{state}\n" for d, state in devices)
+            return subprocess.CompletedProcess(args, 0, stdout, "")
+        elif command in ('connect', 'disconnect') and len(rest) <= 1:
+            address = rest[0] if rest else ""
+            if command == 'connect' and ':' not in address:
+                address += ":5555"
+            message = self.adb_client.host_request(f"host:{command}:{address}")
+            return subprocess.CompletedProcess(args, 0, message + "\n", "")
+        elif command == 'shell' and rest and not rest[0].startswith('-'):
+            returncode, stdout, stderr = self.adb_client.shell(serial, " ".join(rest), timeout)
+        elif command == 'exec-out' and rest:
+            returncode, stdout, stderr = 0, self.adb_client.exec_out(serial, " ".join(rest), timeout), b""
+        elif command == 'reboot' and len(rest) <= 1:
+            returncode, stdout, stderr = 0, self.adb_client.reboot(serial, rest[0] if rest else ""), b""
+        else:
+            return None
+            
+        def decode(data):
+            return data.decode('utf-8', errors='ignore').replace('\r\n', '\n')
+            
+        return subprocess.CompletedProcess(args, returncode, decode(stdout), decode(stderr))
+        
+    def build_adb_args(self, command, device_id=None):
+        """将命令字符串转换为adb参数列表（第一项为adb路径）"""
+        # 分割命令并处理路径
+        cmd_parts = command.split()
+        # 本地文件类命令需要去掉路径两侧的引号（shell命令的引号交给设备端解析）
+        if {'push', 'pull', 'install'} & set(cmd_parts[:2]):
+            # Windows路径中的反斜杠不是转义符，不能按POSIX规则解析，只去掉两侧的引号
+            if platform.system() == "Windows":
+                cmd_parts = [part[1:-1] if len(part) >= 2 and part[0] == part[-1] and part[0] in "\"'" else part
+                             for part in shlex.split(command, posix=False)]
+            else:
+                cmd_parts = shlex.split(command)
+        if cmd_parts[0] != 'adb':
+            cmd_parts = [self.adb_path] + cmd_parts
+        else:
+            cmd_parts[0] = self.adb_path
+            
+        # 如果有选择设备且命令不包含 -s 参数，则添加设备参数
+        if device_id and '-s' not in cmd_parts and cmd_parts[1] != 'connect' and cmd_parts[1] != 'disconnect':
+            cmd_parts.insert(1, '-s')
+            cmd_parts.insert(2, device_id)
+        return cmd_parts
+        
+    def select_devices(self, title="选择设备"):
+        """选择多台设备的对话框，返回选中的设备列表（取消时返回空列表）"""
+        if not self.connected_devices:
+            messagebox.showwarning("警告", "没有已连接的设备")
+            return []
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title(title)
+        dialog.geometry("400x400")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        ttk.Label(dialog, text=f"已连接 {len(self.connected_devices)} 台设备，请选择目标设备:").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        device_list = tk.Listbox(list_frame, selectmode=tk.MULTIPLE)
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=device_list.yview)
+        device_list.configure(yscrollcommand=scrollbar.set)
+        device_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        for device in self.connected_devices:
+            device_list.insert(tk.END, device)
+        device_list.select_set(0, tk.END)
+        
+        selected = []
+        
+        def confirm():
+            selected.extend(device_list.get(i) for i in device_list.curselection())
+            dialog.destroy()
+            
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="全选", command=lambda: device_list.select_set(0, tk.END)).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="全不选", command=lambda: device_list.select_clear(0, tk.END)).pack(side=tk.LEFT, padx=(0, 15))
+        if BOOTSTRAP_AVAILABLE:
+            ttk.Button(button_frame, text="执行", bootstyle="success", command=confirm).pack(side=tk.LEFT, padx=(0, 10))
+            ttk.Button(button_frame, text="取消", bootstyle="secondary", command=dialog.destroy).pack(side=tk.LEFT)
+        else:
+            ttk.Button(button_frame, text="执行", command=confirm).pack(side=tk.LEFT, padx=(0, 10))
+            ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT)
+            
+        self.root.wait_window(dialog)
+        return selected
+        
+    def execute_command_on_devices(self, command, description=""):
+        """在多台设备上并发执行命令，并汇总每台设备的结果"""
+        devices = self.select_devices(f"多设备执行: {description or command}")
+        if not devices:
+            return
+            
+        self.log_message(f"多设备执行: {command} ({len(devices)} 台设备)")
+        
+        # 结果汇总窗口
+        summary = tk.Toplevel(self.root)
+        summary.title(f"多设备执行结果: {description or command}")
+        summary.geometry("700x450")
+        summary.transient(self.root)
+        
+        summary_var = tk.StringVar(value=f"等待执行: {len(devices)} 台设备")
+        ttk.Label(summary, textvariable=summary_var).pack(anchor=tk.W, padx=10, pady=(10, 5))
+        
+        tree_frame = ttk.Frame(summary)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        result_tree = ttk.Treeview(tree_frame, columns=("status", "latency", "output"), show="tree headings")
+        result_tree.heading("#0", text="设备")
+        result_tree.heading("status", text="结果")
+        result_tree.heading("latency", text="耗时")
+        result_tree.heading("output", text="输出")
+        result_tree.column("#0", width=160)
+        result_tree.column("status", width=80)
+        result_tree.column("latency", width=80)
+        result_tree.column("output", width=340)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=result_tree.yview)
+        result_tree.configure(yscrollcommand=scrollbar.set)
+        result_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        for device in devices:
+            result_tree.insert("", tk.END, iid=device, text=device, values=("排队中", "", ""))
+            
+        results = FanOutResults(devices)
+        tasks = []
+        
+        def show_output(event=None):
+            selected = result_tree.selection()
+            if selected:
+                output_window = tk.Toplevel(summary)
+                output_window.title(f"输出: {selected[0]}")
+                output_window.geometry("600x400")
+                output_text = scrolledtext.ScrolledText(output_window, wrap=tk.WORD, font=('Consolas', 10))
+                output_text.pack(fill=tk.BOTH, expand=True)
+                output_text.insert(tk.END, results.outputs.get(selected[0], ""))
+                output_text.config(state=tk.DISABLED)
                 
-                # 缓存设备信息
-                self.device_info_cache[device_id] = device_info
-                            
-                # 更新设备信息显示
-                self.device_info_text.config(state=tk.NORMAL)
-                self.device_info_text.delete(1.0, tk.END)
-                self.device_info_text.insert(1.0, device_info)
-                self.device_info_text.config(state=tk.DISABLED)
+        result_tree.bind("<Double-1>", show_output)
+        
+        def update_row(device, status, latency, output):
+            try:
+                first_line = output.strip().split('\n')[0] if output.strip() else ""
+                result_tree.item(device, values=(status, f"{latency:.2f}s" if latency is not None else "", first_line))
+                summary_var.set(results.summary())
+            except tk.TclError:
+                # 汇总窗口已关闭
+                pass
+                
+        def record_result(device, success, latency, output):
+            """在主线程记录一台设备的结果（success为None表示已取消），全部结束时汇总一次"""
+            if not results.record(device, success, output):
+                return
+            update_row(device, "已取消" if success is None else ("成功" if success else "失败"), latency, output)
+            if results.finished:
+                self.log_message(*results.completion_message())
                 
+        def run_on_device(device):
+            self.root.after(0, update_row, device, "执行中", None, "")
+            started = time.time()
+            task = self.scheduler.current_task()
+            if task and task.cancelled:
+                self.root.after(0, record_result, device, None, None, "")
+                return
+            try:
+                cmd_parts = self.build_adb_args(command, device)
+                result = self.run_adb(cmd_parts[1:], timeout=self.settings.get("timeout", 30) or None)
+                success = result.returncode == 0
+                output = result.stdout + result.stderr
+            except subprocess.TimeoutExpired:
+                success, output = False, "命令执行超时"
             except Exception as e:
-                self.log_message(f"获取设备信息失败: {str(e)}", "ERROR")
+                success, output = False, f"命令执行错误: {str(e)}"
+            latency = time.time() - started
+            
+            self.log_message(f"[{device}] {'成功' if success else '失败'} ({latency:.2f}s)", "SUCCESS" if success else "ERROR")
+            # 结果统一在主线程记录，避免与界面刷新同时修改
+            self.root.after(0, record_result, device, success, latency, output)
                 
-        threading.Thread(target=get_info, daemon=True).start()
+        def cancel_all():
+            for device, task in zip(devices, tasks):
+                if task.state == ScheduledTask.QUEUED:
+                    self.scheduler.cancel(task)
+                    record_result(device, None, None, "")
+                
+        ttk.Button(summary, text="取消未完成的设备", command=cancel_all).pack(side=tk.LEFT, padx=10, pady=10)
+        ttk.Button(summary, text="关闭", command=summary.destroy).pack(side=tk.RIGHT, padx=10, pady=10)
+        
+        # 每台设备一个任务，由调度器限制并发数（连接池按并发任务数分配，见 adb_pool_size）；
+        # 以后台优先级提交，设备很多时也会为交互操作留出工作线程
+        for device in devices:
+            tasks.append(self.scheduler.submit(run_on_device, device, priority=CommandScheduler.PRIORITY_BACKGROUND,
+                                               device=device, description=f"{description or command} @ {device}"))
         
     def execute_command(self, command, description=""):
         """执行ADB命令"""
+        device_id = self.current_device.get()
+        
         def execute():
             try:
                 self.log_message(f"执行命令: {command}")
@@ -2159,46 +6908,40 @@ class ADBToolbox:
                     self.command_history.append(command)
                     self.history_index = len(self.command_history)
                 
-                # 分割命令并处理路径
-                cmd_parts = command.split()
-                if cmd_parts[0] != 'adb':
-                    cmd_parts = [self.adb_path] + cmd_parts
-                else:
-                    cmd_parts[0] = self.adb_path
-                
-                # 如果有选择设备且命令不包含 -s 参数，则添加设备参数
-                device_id = self.current_device.get()
-                if device_id and '-s' not in cmd_parts and cmd_parts[1] != 'connect' and cmd_parts[1] != 'disconnect':
-                    cmd_parts.insert(1, '-s')
-                    cmd_parts.insert(2, device_id)
-                
-                # 修复编码问题
-                result = subprocess.run(
-                    cmd_parts, 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=30,
-                    encoding='utf-8',
-                    errors='ignore'  # 忽略编码错误
-                )
+                cmd_parts = self.build_adb_args(command, device_id)
+                
+                # 流式执行，输出按批次实时显示到控制台
+                def on_lines(stream, lines):
+                    self.log_message("\n".join(lines), "ERROR" if stream == "stderr" else "INFO")
+                    
+                task = self.scheduler.current_task()
+                timeout = self.settings.get("timeout", 30) or None
+                returncode = self.stream_adb(cmd_parts[1:], on_lines, timeout=timeout,
+                                             cancel_event=task.cancel_event if task else None)
             
-                if result.returncode == 0:
-                    if result.stdout:
-                        self.log_message("命令执行成功:", "SUCCESS")
-                        self.log_message(result.stdout)
-                    else:
-                        self.log_message("命令执行成功", "SUCCESS")
+                if returncode is None:
+                    self.log_message("命令已取消", "WARNING")
+                elif returncode == 0:
+                    self.log_message("命令执行成功", "SUCCESS")
                 else:
-                    self.log_message("命令执行失败:", "ERROR")
-                    if result.stderr:
-                        self.log_message(result.stderr, "ERROR")
+                    self.log_message(f"命令执行失败 (返回码: {returncode})", "ERROR")
                     
             except subprocess.TimeoutExpired:
                 self.log_message("命令执行超时", "ERROR")
             except Exception as e:
                 self.log_message(f"命令执行错误: {str(e)}", "ERROR")
             
-        threading.Thread(target=execute, daemon=True).start()
+        self.scheduler.submit(execute, device=device_id or None, description=description or command)
+        
+    def execute_custom_command_on_devices(self):
+        """在多台设备上执行自定义命令"""
+        command = self.command_entry.get().strip()
+        if not command:
+            self.log_message("请输入要执行的命令", "WARNING")
+            return
+        if not command.startswith('adb'):
+            command = f"adb {command}"
+        self.execute_command_on_devices(command, "自定义命令")
         
     def execute_custom_command(self):
         """执行自定义命令"""
@@ -2244,7 +6987,7 @@ class ADBToolbox:
             self.save_path_entry.delete(0, tk.END)
             self.save_path_entry.insert(0, filename)
             
-    def push_file(self):
+    def push_file(self, multi_device=False):
         """推送文件到设备"""
         local_file = self.local_file_entry.get().strip()
         device_path = self.device_path_entry.get().strip()
@@ -2252,7 +6995,12 @@ class ADBToolbox:
         if local_file and device_path:
             if os.path.exists(local_file):
                 command = f"adb push \"{local_file}\" \"{device_path}\""
-                self.execute_command(command, f"推送文件: {os.path.basename(local_file)}")
+                if multi_device:
+                    self.execute_command_on_devices(command, f"推送文件: {os.path.basename(local_file)}")
+                elif os.path.isdir(local_file):
+                    self.run_bulk_transfer("push", local_file, device_path)
+                else:
+                    self.run_file_transfer("push", local_file, device_path)
             else:
                 self.log_message("本地文件不存在", "ERROR")
         else:
@@ -2263,60 +7011,972 @@ class ADBToolbox:
         remote_file = self.remote_file_entry.get().strip()
         save_path = self.save_path_entry.get().strip()
         
+        if not (remote_file and save_path):
+            self.log_message("请填写完整的文件路径", "WARNING")
+            return
+        device_id = self.current_device.get()
+        if not device_id or not self.settings.get("use_native_adb", True) or time.time() < self.native_adb_retry_at:
+            # adb pull 本身支持目录
+            self.run_file_transfer("pull", remote_file, save_path)
+            return
+
+        def check_source():
+            # 与push_file相同，目录交给批量传输
+            try:
+                remote_stat = self.adb_client.stat_path(device_id, remote_file)
+            except (ADBError, OSError) as e:
+                self.log_message(f"拉取失败: {str(e)}", "ERROR")
+                return
+            if remote_stat is not None and stat.S_ISDIR(remote_stat.mode):
+                self.root.after(0, self.run_bulk_transfer, "pull", remote_file, save_path)
+            else:
+                self.root.after(0, self.run_file_transfer, "pull", remote_file, save_path, None, device_id)
+
+        self.scheduler.submit(check_source, device=device_id, description=f"检查设备路径: {remote_file}")
+            
+    PREFETCH_DIR_LIMIT = 16
+    DIR_CACHE_TRUST = 30
+    SYNC_PLAN_TRUST = 60
+    
+    @staticmethod
+    def _list_dir_sync(sync, path):
+        """在sync会话中列出目录，返回 (目录修改时间, 列表)"""
+        dir_stat = sync.stat(path)
+        if dir_stat is None:
+            raise ADBError(f"{path}: 路径不存在")
+        entries = sync.list(path)
+        # 指向目录的符号链接按目录处理，所有链接合并为一次批量STAT
+        links = [i for i, entry in enumerate(entries) if stat.S_ISLNK(entry.mode)]
+        if links:
+            targets = sync.stat_many([path.rstrip("/") + "/" + entries[i].name for i in links])
+            for i, target in zip(links, targets):
+                if target is not None and stat.S_ISDIR(target.mode):
+                    entries[i] = entries[i]._replace(mode=target.mode)
+        return dir_stat.mtime, entries
+        
+    def list_device_dir(self, path, device_id=None):
+        """列出设备目录，返回 (目录修改时间, [SyncEntry, ...])，结果写入目录缓存
+        
+        优先使用sync协议（LIST/LIS2）直接获取二进制目录项，adb server不可用时回退到 ls -la。
+        """
+        if self.settings.get("use_native_adb", True) and time.time() >= self.native_adb_retry_at:
+            try:
+                with self.adb_client.open_sync(device_id) as sync:
+                    mtime, entries = self._list_dir_sync(sync, path)
+                self.dir_cache.put(device_id, path, mtime, entries)
+                return mtime, entries
+            except ADBServerUnavailable:
+                self.native_adb_retry_at = time.time() + 10
+                
+        dir_stat = self.stat_device_path(path, device_id)
+        if dir_stat is None:
+            raise ADBError(f"{path}: 路径不存在")
+        args = (['-s', device_id] if device_id else []) + ['shell', 'ls', '-la', shlex.quote(path)]
+        result = self.run_adb(args)
+        if result.returncode != 0:
+            raise ADBError(result.stderr.strip() or f"返回码: {result.returncode}")
+        entries = parse_ls_output(result.stdout)
+        self.dir_cache.put(device_id, path, dir_stat.mtime, entries)
+        return dir_stat.mtime, entries
+        
+    def get_device_dir(self, path, device_id=None, force=False):
+        """获取目录列表，缓存中的目录修改时间未变化时直接复用缓存
+        
+        原地修改文件不会改变目录的修改时间，因此只在列出后 DIR_CACHE_TRUST 秒内按修改时间复用，
+        更早的缓存重新列出（界面仍先显示缓存，再只更新变化的条目）。返回 (列表, 是否来自缓存)。
+        """
+        cached = None if force else self.dir_cache.get(device_id, path)
+        if cached is not None and time.time() - cached[2] < self.DIR_CACHE_TRUST:
+            dir_stat = self.stat_device_path(path, device_id)
+            if dir_stat is not None and dir_stat.mtime == cached[0]:
+                return cached[1], True
+        return self.list_device_dir(path, device_id)[1], False
+        
+    def prefetch_child_dirs(self, device_id, path, entries):
+        """在后台预取当前目录下的子目录列表"""
+        if not self.settings.get("use_native_adb", True) or time.time() < self.native_adb_retry_at:
+            return
+        children = [path.rstrip("/") + "/" + entry.name for entry in entries if stat.S_ISDIR(entry.mode)]
+        children = [child for child in children if self.dir_cache.get(device_id, child) is None]
+        children = children[:self.PREFETCH_DIR_LIMIT]
+        if not children:
+            return
+            
+        def prefetch():
+            task = self.scheduler.current_task()
+            try:
+                # 同一个sync会话中依次列出，避免每个目录单独建立连接
+                with self.adb_client.open_sync(device_id) as sync:
+                    for child in children:
+                        if (task and task.cancelled) or self.file_browser_target != (device_id, path):
+                            break
+                        try:
+                            mtime, child_entries = self._list_dir_sync(sync, child)
+                        except ADBError:
+                            continue
+                        self.dir_cache.put(device_id, child, mtime, child_entries)
+            except (ADBError, OSError):
+                pass
+                
+        self.scheduler.submit(prefetch, priority=CommandScheduler.PRIORITY_BACKGROUND, device=device_id,
+                              key=f"prefetch:{device_id}:{path}", description=f"预取目录: {path}")
+        
+    def stat_device_path(self, path, device_id=None):
+        """获取设备文件状态（STAT/STA2），文件不存在时返回None"""
+        if self.settings.get("use_native_adb", True) and time.time() >= self.native_adb_retry_at:
+            try:
+                return self.adb_client.stat_path(device_id, path)
+            except ADBServerUnavailable:
+                self.native_adb_retry_at = time.time() + 10
+                
+        args = (['-s', device_id] if device_id else []) + ['shell', 'ls', '-ld', shlex.quote(path)]
+        result = self.run_adb(args)
+        if result.returncode != 0:
+            return None
+        entries = parse_ls_output(result.stdout)
+        return entries[0]._replace(name=path.rstrip("/").rsplit("/", 1)[-1] or "/") if entries else None
+        
+    def open_folder_sync_dialog(self):
+        """文件夹增量同步对话框：先预览差异，再只传输新增和变化的文件"""
+        device_id = self.current_device.get()
+        if not device_id:
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        if not self.settings.get("use_native_adb", True) or time.time() < self.native_adb_retry_at:
+            messagebox.showwarning("警告", "增量同步需要直接连接adb server，请在设置中启用")
+            return
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"文件夹增量同步 - {device_id}")
+        dialog.geometry("700x550")
+        dialog.transient(self.root)
+        
+        options_frame = ttk.Frame(dialog, padding=10)
+        options_frame.pack(fill=tk.X)
+        options_frame.columnconfigure(1, weight=1)
+        
+        direction_var = tk.StringVar(value="push")
+        ttk.Label(options_frame, text="方向:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        direction_frame = ttk.Frame(options_frame)
+        direction_frame.grid(row=0, column=1, sticky=tk.W, pady=5)
+        ttk.Radiobutton(direction_frame, text="本地 → 设备", variable=direction_var, value="push").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Radiobutton(direction_frame, text="设备 → 本地", variable=direction_var, value="pull").pack(side=tk.LEFT)
+        
+        ttk.Label(options_frame, text="本地文件夹:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        local_entry = ttk.Entry(options_frame)
+        local_path = self.local_file_entry.get().strip()
+        if os.path.isdir(local_path):
+            local_entry.insert(0, local_path)
+        local_entry.grid(row=1, column=1, sticky=tk.EW, pady=5, padx=(0, 5))
+        
+        def browse_local():
+            path = filedialog.askdirectory(title="选择本地文件夹", parent=dialog)
+            if path:
+                local_entry.delete(0, tk.END)
+                local_entry.insert(0, path)
+                
+        ttk.Button(options_frame, text="浏览", command=browse_local).grid(row=1, column=2, pady=5)
+        
+        ttk.Label(options_frame, text="设备文件夹:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        remote_entry = ttk.Entry(options_frame)
+        remote_entry.insert(0, self.device_path_entry.get().strip() or "/sdcard/")
+        remote_entry.grid(row=2, column=1, sticky=tk.EW, pady=5, padx=(0, 5))
+        
+        delete_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="删除目标端多余的文件", variable=delete_var).grid(
+            row=3, column=0, columnspan=2, sticky=tk.W, pady=5)
+        
+        summary_var = tk.StringVar(value="点击“预览”比较两侧的文件")
+        ttk.Label(dialog, textvariable=summary_var, wraplength=660).pack(anchor=tk.W, padx=10)
+        
+        tree_frame = ttk.Frame(dialog)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        report_tree = ttk.Treeview(tree_frame, columns=("action", "size"), show="tree headings")
+        report_tree.heading("#0", text="文件")
+        report_tree.heading("action", text="操作")
+        report_tree.heading("size", text="大小")
+        report_tree.column("#0", width=450)
+        report_tree.column("action", width=80)
+        report_tree.column("size", width=100)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=report_tree.yview)
+        report_tree.configure(yscrollcommand=scrollbar.set)
+        report_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        last_plan = {}
+        
+        def make_sync():
+            local_root = local_entry.get().strip()
+            remote_root = remote_entry.get().strip()
+            if not local_root or not remote_root:
+                messagebox.showwarning("警告", "请填写本地文件夹和设备文件夹", parent=dialog)
+                return None
+            if direction_var.get() == "push" and not os.path.isdir(local_root):
+                messagebox.showwarning("警告", "本地文件夹不存在", parent=dialog)
+                return None
+            return FolderSync(self.adb_client, device_id, local_root, remote_root, direction_var.get(),
+                              delete_var.get(), self.settings.get("transfer_streams", 4))
+            
+        def show_plan(plan):
+            try:
+                report_tree.delete(*report_tree.get_children())
+                rows = [(relative, "新增") for relative in plan["new"]] + \
+                       [(relative, "更新") for relative in plan["changed"]] + \
+                       [(relative, "删除") for relative in plan["deleted"]]
+                for relative, action in rows[:5000]:
+                    size = plan["source"][relative][0] if relative in plan["source"] else ""
+                    report_tree.insert("", tk.END, text=relative, values=(action, format_size(size) if size != "" else ""))
+                summary = (f"新增 {len(plan['new'])}，更新 {len(plan['changed'])}，删除 {len(plan['deleted'])}，"
+                           f"未变化 {plan['unchanged']}（其中 {plan['hashed']} 个经哈希比较），"
+                           f"需传输 {format_size(plan['transfer_bytes'])}")
+                if len(rows) > 5000:
+                    summary += f"（仅显示前 5000 项，共 {len(rows)} 项）"
+                summary_var.set(summary)
+            except tk.TclError:
+                # 对话框已关闭
+                pass
+                
+        def run(execute):
+            folder_sync = make_sync()
+            if folder_sync is None:
+                return
+            params = (folder_sync.local_root, folder_sync.remote_root, folder_sync.direction, folder_sync.delete_extra)
+            summary_var.set("正在比较文件...")
+            
+            def job():
+                task = self.scheduler.current_task()
+                if task:
+                    folder_sync.cancel_event = task.cancel_event
+                record = None
+                try:
+                    # 预览结果只在 SYNC_PLAN_TRUST 秒内复用，之后两侧的文件可能已经变化，需要重新比较
+                    cached = last_plan.get(params) if execute else None
+                    plan = cached[1] if cached and time.time() - cached[0] < self.SYNC_PLAN_TRUST else None
+                    if plan is None:
+                        plan = folder_sync.plan()
+                        last_plan.clear()
+                        last_plan[params] = (time.time(), plan)
+                        self.root.after(0, show_plan, plan)
+                        self.log_message(f"同步预览: 新增 {len(plan['new'])}，更新 {len(plan['changed'])}，"
+                                         f"删除 {len(plan['deleted'])}，需传输 {format_size(plan['transfer_bytes'])}")
+                    if not execute:
+                        return
+                    record = self.transfer_tracker.start(
+                        f"增量同步: {os.path.basename(folder_sync.local_root)}", device_id, folder_sync.direction,
+                        plan["transfer_bytes"])
+                    folder_sync.on_progress = lambda stats: record.update(stats["done_bytes"], stats["total_bytes"])
+                    result = folder_sync.execute(plan)
+                    last_plan.clear()
+                except TransferCancelled:
+                    if record:
+                        self.transfer_tracker.finish(record, "已取消")
+                    self.log_message("同步已取消", "WARNING")
+                    return
+                except Exception as e:
+                    if record:
+                        self.transfer_tracker.finish(record, "失败", str(e))
+                    self.log_message(f"同步失败: {str(e)}", "ERROR")
+                    return
+                    
+                record.update(result["done_bytes"], result["total_bytes"])
+                self.transfer_tracker.finish(record, "已取消" if result["cancelled"] else
+                                             "部分失败" if result["failed"] else "完成")
+
+                summary = (f"传输 {result['done_files']}/{result['total_files']} 个文件 "
+                           f"({format_size(result['done_bytes'])}，{format_size(result['rate'])}/s)，"
+                           f"删除 {result['deleted']} 个文件")
+                if result["failed"]:
+                    self.log_message(f"同步完成，{len(result['failed'])} 个文件失败 - {summary}", "WARNING")
+                    for path, error in result["failed"][:20]:
+                        self.log_message(f"  {path}: {error}", "ERROR")
+                else:
+                    self.log_message(f"同步完成 - {summary}", "SUCCESS" if not result["cancelled"] else "WARNING")
+                self.dir_cache.invalidate(device_id)
+                
+            self.scheduler.submit(job, device=device_id, description="文件夹增量同步")
+            
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+        if BOOTSTRAP_AVAILABLE:
+            ttk.Button(button_frame, text="预览", bootstyle="info", command=lambda: run(False)).pack(side=tk.LEFT, padx=(0, 10))
+            ttk.Button(button_frame, text="开始同步", bootstyle="success", command=lambda: run(True)).pack(side=tk.LEFT, padx=(0, 10))
+            ttk.Button(button_frame, text="关闭", bootstyle="secondary", command=dialog.destroy).pack(side=tk.LEFT)
+        else:
+            ttk.Button(button_frame, text="预览", command=lambda: run(False)).pack(side=tk.LEFT, padx=(0, 10))
+            ttk.Button(button_frame, text="开始同步", command=lambda: run(True)).pack(side=tk.LEFT, padx=(0, 10))
+            ttk.Button(button_frame, text="关闭", command=dialog.destroy).pack(side=tk.LEFT)
+            
+    def run_file_transfer(self, direction, source, target, on_done=None, device_id=None, on_failed=None):
+        """在后台通过sync协议推送/拉取单个文件，进度显示在传输面板中
+        
+        与adb push/pull相同，目标为已存在的目录时传输到其中；完成后在主线程回调 on_done(本地路径)，
+        失败或取消时在后台线程回调 on_failed()。
+        """
+        device_id = device_id or self.current_device.get()
+        if not device_id:
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        name = os.path.basename(source) if direction == "push" else posixpath.basename(source)
+        description = f"{'推送' if direction == 'push' else '拉取'}: {name}"
+        
+        def transfer():
+            task = self.scheduler.current_task()
+            record = self.transfer_tracker.start(description, device_id, direction)
+            
+            def on_data(num_bytes):
+                record.add(num_bytes)
+                if task and task.cancelled:
+                    raise TransferCancelled()
+                    
+            local_path = None
+            try:
+                if self.settings.get("use_native_adb", True) and time.time() >= self.native_adb_retry_at:
+                    with self.adb_client.open_sync(device_id) as sync:
+                        if direction == "push":
+                            st = os.stat(source)
+                            record.total_bytes = st.st_size
+                            remote_path = target
+                            remote_stat = sync.stat(target)
+                            if target.endswith("/") or (remote_stat is not None and stat.S_ISDIR(remote_stat.mode)):
+                                remote_path = f"{target.rstrip('/')}/{name}"
+                            with open(source, "rb") as f:
+                                sync.send(f, remote_path, stat.S_IFREG | (st.st_mode & 0o777), st.st_mtime, on_data)
+                        else:
+                            remote_stat = sync.stat(source)
+                            if remote_stat is None:
+                                raise ADBError(f"{source}: 文件不存在")
+                            if stat.S_ISDIR(remote_stat.mode):
+                                raise ADBError(f"{source}: 是文件夹，请使用批量拉取")
+                            record.total_bytes = remote_stat.size
+                            local_path = os.path.join(target, name) if os.path.isdir(target) else target
+                            try:
+                                with open(local_path, "wb") as f:
+                                    sync.recv(source, f, on_data)
+                            except BaseException:
+                                # 删除不完整的文件
+                                try:
+                                    os.remove(local_path)
+                                except OSError:
+                                    pass
+                                raise
+                            if remote_stat.mtime:
+                                os.utime(local_path, (remote_stat.mtime, remote_stat.mtime))
+                else:
+                    # 无法直接连接adb server时使用adb程序（无进度）
+                    result = self.run_adb(['-s', device_id, direction, source, target])
+                    if result.returncode != 0:
+                        raise ADBError(result.stderr.strip() or f"返回码: {result.returncode}")
+                    if direction == "pull":
+                        local_path = os.path.join(target, name) if os.path.isdir(target) else target
+                        record.update(os.path.getsize(local_path))
+            except TransferCancelled:
+                self.transfer_tracker.finish(record, "已取消")
+                self.log_message(f"传输已取消: {name}", "WARNING")
+                if on_failed:
+                    on_failed()
+                return
+            except Exception as e:
+                self.transfer_tracker.finish(record, "失败", str(e))
+                self.log_message(f"{description} 失败: {str(e)}", "ERROR")
+                if on_failed:
+                    on_failed()
+                return
+                
+            self.transfer_tracker.finish(record)
+            self.log_message(f"{description} 完成 ({format_size(record.done_bytes)}，用时 {record.elapsed:.1f}s，"
+                             f"{format_size(record.average_rate)}/s)", "SUCCESS")
+            if direction == "push":
+                self.dir_cache.invalidate(device_id)
+            if on_done and local_path:
+                self.root.after(0, on_done, local_path)
+                
+        self.scheduler.submit(transfer, device=device_id, description=description)
+        
+    def resumable_pull_file(self):
+        """以断点续传模式拉取设备文件"""
+        remote_file = self.remote_file_entry.get().strip()
+        save_path = self.save_path_entry.get().strip()
         if remote_file and save_path:
-            command = f"adb pull \"{remote_file}\" \"{save_path}\""
-            self.execute_command(command, f"拉取文件: {os.path.basename(remote_file)}")
+            if os.path.isdir(save_path):
+                save_path = os.path.join(save_path, posixpath.basename(remote_file.rstrip("/")))
+            self.run_resumable_pull(remote_file, save_path)
         else:
             self.log_message("请填写完整的文件路径", "WARNING")
             
-    def browse_device_path(self):
-        """浏览设备路径"""
-        path = self.current_path_entry.get().strip()
-        if path:
-            # 清空文件列表
-            for item in self.file_tree.get_children():
-                self.file_tree.delete(item)
-                
-            # 获取文件列表
-            self.log_message(f"正在浏览路径: {path}")
-            result = subprocess.run([self.adb_path, 'shell', 'ls', '-la', path], 
-                                  capture_output=True, text=True, encoding='utf-8', errors='ignore')
+    def run_resumable_pull(self, remote_path, local_path):
+        """在后台分块拉取文件，日志保存在数据目录中，再次拉取同一文件时自动续传"""
+        device_id = self.current_device.get()
+        if not device_id:
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        if not self.settings.get("use_native_adb", True) or time.time() < self.native_adb_retry_at:
+            self.log_message("adb server不可直接连接，无法使用断点续传，改用普通拉取", "WARNING")
+            self.execute_command(f"adb pull \"{remote_path}\" \"{local_path}\"", f"拉取文件: {os.path.basename(local_path)}")
+            return
             
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
+        name = posixpath.basename(remote_path)
+        
+        def transfer():
+            task = self.scheduler.current_task()
+            record = self.transfer_tracker.start(f"断点续传拉取: {name}", device_id, "pull")
+            resumable = ResumableTransfer(self.adb_client, device_id, remote_path, local_path,
+                                         os.path.join(APP_DATA_DIR, "transfers"),
+                                         lambda stats: record.update(stats["done_bytes"], stats["total_bytes"]),
+                                         task.cancel_event if task else None)
+            self.log_message(f"开始断点续传拉取: {remote_path}")
+            try:
+                result = resumable.pull()
+            except TransferCancelled:
+                self.transfer_tracker.finish(record, "已暂停")
+                self.log_message(f"传输已暂停: {name}，再次拉取同一文件时将从断点继续", "WARNING")
+                return
+            except Exception as e:
+                self.transfer_tracker.finish(record, "失败", str(e))
+                self.log_message(f"传输失败: {str(e)}，再次拉取同一文件时将从断点继续", "ERROR")
+                return
                 
-                # 添加返回上级目录
-                if path != "/" and path != "/sdcard":
-                    self.file_tree.insert("", tk.END, text="../", values=("", "", ""))
+            record.update(result["size"], result["size"])
+            self.transfer_tracker.finish(record)
+
+            if result["resumed_bytes"]:
+                self.log_message(f"已从断点续传，跳过 {format_size(result['resumed_bytes'])}")
+            if result["repaired_chunks"]:
+                self.log_message(f"校验发现 {result['repaired_chunks']} 个数据块不一致，已重新传输", "WARNING")
+            self.log_message(f"拉取完成并已校验: {local_path} ({format_size(result['size'])}，"
+                             f"{format_size(result['rate'])}/s，SHA-256 {result['sha256'][:16]}…)", "SUCCESS")
                 
-                # 解析文件列表
-                for line in lines:
-                    if line.startswith('total') or not line.strip():
-                        continue
-                        
-                    parts = line.split()
-                    if len(parts) >= 8:
-                        permissions = parts[0]
-                        size = parts[4]
-                        date = ' '.join(parts[5:8])
-                        name = ' '.join(parts[8:])
-                        
-                        # 处理目录和文件
-                        if permissions.startswith('d'):
-                            self.file_tree.insert("", tk.END, text=f"{name}/", values=(size, date, permissions))
+        self.scheduler.submit(transfer, device=device_id, description=f"断点续传拉取: {name}")
+        
+    def bulk_push(self):
+        """通过多个并行sync连接推送文件夹"""
+        local_path = self.local_file_entry.get().strip()
+        if not local_path or not os.path.isdir(local_path):
+            local_path = filedialog.askdirectory(title="选择要推送的文件夹")
+            if not local_path:
+                return
+            self.local_file_entry.delete(0, tk.END)
+            self.local_file_entry.insert(0, local_path)
+        device_path = self.device_path_entry.get().strip()
+        if not device_path:
+            self.log_message("请填写设备路径", "WARNING")
+            return
+        self.run_bulk_transfer("push", local_path, device_path)
+        
+    def bulk_pull(self):
+        """通过多个并行sync连接拉取设备文件夹"""
+        remote_path = self.remote_file_entry.get().strip()
+        if not remote_path:
+            self.log_message("请填写设备文件路径", "WARNING")
+            return
+        save_path = self.save_path_entry.get().strip()
+        if not save_path or not os.path.isdir(save_path):
+            save_path = filedialog.askdirectory(title="选择保存位置")
+            if not save_path:
+                return
+            self.save_path_entry.delete(0, tk.END)
+            self.save_path_entry.insert(0, save_path)
+        self.run_bulk_transfer("pull", remote_path, save_path)
+        
+    def run_bulk_transfer(self, direction, source, target):
+        """在后台执行批量传输；与adb push/pull相同，目标为已存在的目录时传输到其中"""
+        device_id = self.current_device.get()
+        if not device_id:
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        if not self.settings.get("use_native_adb", True) or time.time() < self.native_adb_retry_at:
+            # 无法直接连接adb server时使用单连接的adb push/pull
+            self.log_message("adb server不可直接连接，使用单连接传输", "WARNING")
+            self.execute_command(f"adb {direction} \"{source}\" \"{target}\"", f"{'推送' if direction == 'push' else '拉取'}: {source}")
+            return
+            
+        streams = self.settings.get("transfer_streams", 4)
+        name = os.path.basename(source.rstrip("/\\")) or source
+        
+        def transfer():
+            task = self.scheduler.current_task()
+            record = self.transfer_tracker.start(f"批量{'推送' if direction == 'push' else '拉取'}: {name}", device_id, direction)
+            
+            def on_progress(stats):
+                record.update(stats["done_bytes"], stats["total_bytes"])
+                
+            engine = BulkTransfer(self.adb_client, device_id, streams, on_progress,
+                                  task.cancel_event if task else None)
+            try:
+                if direction == "push":
+                    remote_target = target
+                    remote_stat = self.adb_client.stat_path(device_id, target)
+                    if remote_stat is not None and stat.S_ISDIR(remote_stat.mode):
+                        remote_target = f"{target.rstrip('/')}/{name}"
+                    items, dirs = engine.plan_push(source, remote_target)
+                else:
+                    local_target = os.path.join(target, posixpath.basename(source.rstrip("/"))) if os.path.isdir(target) else target
+                    items, dirs = engine.plan_pull(source, local_target)
+                    
+                result = None
+                is_dir = os.path.isdir(source) if direction == "push" else bool(dirs)
+                if is_dir and ArchiveTransfer.should_use(items):
+                    # 大量小文件：使用tar流，网络连接的设备启用压缩
+                    compress = ":" in device_id
+                    self.log_message(f"开始{'推送' if direction == 'push' else '拉取'}: {name}，共 {len(items)} 个小文件 "
+                                     f"({format_size(sum(item.size for item in items))})，使用tar流传输"
+                                     f"{'（gzip压缩）' if compress else ''}")
+                    archive = ArchiveTransfer(self.adb_client, device_id, compress, on_progress,
+                                              task.cancel_event if task else None)
+                    try:
+                        if direction == "push":
+                            result = archive.push(source, remote_target)
                         else:
-                            self.file_tree.insert("", tk.END, text=name, values=(size, date, permissions))
+                            result = archive.pull(source, local_target, items)
+                    except TransferCancelled:
+                        raise
+                    except Exception as e:
+                        self.log_message(f"tar流传输失败，改用并行sync传输: {str(e)}", "WARNING")
+                        
+                if result is None:
+                    self.log_message(f"开始{'推送' if direction == 'push' else '拉取'}: {name}，共 {len(items)} 个文件 "
+                                     f"({format_size(sum(item.size for item in items))})，{streams} 个并行连接")
+                    result = engine.push(items, dirs) if direction == "push" else engine.pull(items, dirs)
+            except TransferCancelled:
+                self.transfer_tracker.finish(record, "已取消")
+                self.log_message(f"传输已取消: {name}", "WARNING")
+                return
+            except Exception as e:
+                self.transfer_tracker.finish(record, "失败", str(e))
+                self.log_message(f"传输失败: {str(e)}", "ERROR")
+                return
+                
+            record.update(result["done_bytes"], result["total_bytes"])
+            if result["cancelled"]:
+                self.transfer_tracker.finish(record, "已取消")
+            elif result["failed"]:
+                self.transfer_tracker.finish(record, "部分失败", f"{len(result['failed'])} 个文件失败")
             else:
-                self.log_message(f"浏览路径失败: {result.stderr}", "ERROR")
-        else:
+                self.transfer_tracker.finish(record)
+
+            summary = (f"{name}: {result['done_files']}/{result['total_files']} 个文件，"
+                       f"{format_size(result['done_bytes'])}，用时 {result['elapsed']:.1f}s，"
+                       f"平均 {format_size(result['rate'])}/s")
+            if result["cancelled"]:
+                self.log_message(f"传输已取消 - {summary}", "WARNING")
+            elif result["failed"]:
+                self.log_message(f"传输完成，{len(result['failed'])} 个文件失败 - {summary}", "WARNING")
+                for path, error in result["failed"][:20]:
+                    self.log_message(f"  {path}: {error}", "ERROR")
+            else:
+                self.log_message(f"传输完成 - {summary}", "SUCCESS")
+            if direction == "push":
+                self.dir_cache.invalidate(device_id)
+                
+        self.scheduler.submit(transfer, device=device_id, description=f"批量{'推送' if direction == 'push' else '拉取'}: {name}")
+        
+    def browse_device_path(self, force=False):
+        """浏览设备路径
+        
+        已缓存的目录立即显示，再在后台校验目录修改时间；force为True时忽略缓存重新列出。
+        """
+        raw_path = self.current_path_entry.get().strip()
+        if not raw_path:
             self.log_message("请输入有效的路径", "WARNING")
+            return
+            
+        path = normalize_device_path(raw_path)
+        self.current_path_entry.delete(0, tk.END)
+        self.current_path_entry.insert(0, path if path == "/" else path + "/")
+        device_id = self.current_device.get() or None
+        self.file_browser_target = (device_id, path)
+        
+        cached = None if force else self.dir_cache.get(device_id, path)
+        if cached is not None:
+            self.show_file_listing(device_id, path, cached[1])
+        else:
+            self.log_message(f"正在浏览路径: {path}")
+            
+        def load():
+            if self.file_browser_target != (device_id, path):
+                return
+            try:
+                entries, from_cache = self.get_device_dir(path, device_id, force)
+            except Exception as e:
+                self.log_message(f"浏览路径失败: {str(e)}", "ERROR")
+                return
+            if not from_cache:
+                self.root.after(0, self.show_file_listing, device_id, path, entries)
+            self.prefetch_child_dirs(device_id, path, entries)
+            
+        self.scheduler.submit(load, device=device_id, description=f"浏览路径: {path}")
+        
+    def show_file_listing(self, device_id, path, entries):
+        """显示目录列表（主线程）；刷新同一目录时只更新变化的条目并保留滚动位置和选中"""
+        if self.file_browser_target != (device_id, path):
+            return
+            
+        if self.file_browser_path == (device_id, path):
+            added, removed, changed = DirectoryCache.diff(self.file_entries, entries)
+            self.file_entries = entries
+            if added or removed or changed:
+                names = self.file_list.selected_names()
+                self.file_model.set_entries(entries, has_parent=path != "/" and path != "/sdcard")
+                self.file_list.keep_selection(names)
+                self.log_message(f"目录已更新: 新增 {len(added)}，删除 {len(removed)}，变化 {len(changed)}")
+            return
+            
+        # 只更新模型，界面上仅刷新可见的行（有上级目录时第一行为 "../"）
+        self.file_browser_path = (device_id, path)
+        self.file_entries = entries
+        self.file_model.set_entries(entries, has_parent=path != "/" and path != "/sdcard")
+        self.file_list.reset()
+        self.log_message(f"{path}: 共 {len(entries)} 项")
+        
+    def get_search_index(self, device_id, root):
+        """获取设备的搜索索引（每个设备和搜索根目录一个索引文件）"""
+        root = normalize_device_path(root)
+        index = self.search_indexes.get((device_id, root))
+        if index is None:
+            name = hashlib.sha1(f"{device_id}|{root}".encode("utf-8")).hexdigest()
+            index = DeviceFileIndex(os.path.join(APP_DATA_DIR, "search_index", f"{name}.json"), device_id, root)
+            self.search_indexes[(device_id, root)] = index
+        return index
+        
+    def open_search_dialog(self):
+        """文件搜索对话框：在本地索引中按名称和大小搜索，索引在后台增量更新"""
+        device_id = self.current_device.get()
+        if not device_id:
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        if not self.settings.get("use_native_adb", True) or time.time() < self.native_adb_retry_at:
+            messagebox.showwarning("警告", "文件搜索需要直接连接adb server，请在设置中启用")
+            return
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"搜索文件 - {device_id}")
+        dialog.geometry("760x520")
+        dialog.transient(self.root)
+        
+        options_frame = ttk.Frame(dialog, padding=10)
+        options_frame.pack(fill=tk.X)
+        options_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(options_frame, text="搜索范围:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        root_entry = ttk.Entry(options_frame)
+        root_entry.insert(0, "/sdcard")
+        root_entry.grid(row=0, column=1, sticky=tk.EW, pady=5, padx=(0, 5))
+        
+        ttk.Label(options_frame, text="名称:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        query_entry = ttk.Entry(options_frame)
+        query_entry.grid(row=1, column=1, sticky=tk.EW, pady=5, padx=(0, 5))
+        
+        size_frame = ttk.Frame(options_frame)
+        size_frame.grid(row=2, column=1, sticky=tk.W, pady=5)
+        ttk.Label(options_frame, text="大小(MB):").grid(row=2, column=0, sticky=tk.W, pady=5)
+        min_size_entry = ttk.Entry(size_frame, width=10)
+        min_size_entry.pack(side=tk.LEFT)
+        ttk.Label(size_frame, text=" 至 ").pack(side=tk.LEFT)
+        max_size_entry = ttk.Entry(size_frame, width=10)
+        max_size_entry.pack(side=tk.LEFT)
+        
+        status_var = tk.StringVar(value="名称支持子串或通配符（如 *.jpg），不区分大小写")
+        ttk.Label(dialog, textvariable=status_var).pack(anchor=tk.W, padx=10)
+        
+        tree_frame = ttk.Frame(dialog)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        result_tree = ttk.Treeview(tree_frame, columns=("size", "date"), show="tree headings")
+        result_tree.heading("#0", text="路径")
+        result_tree.heading("size", text="大小")
+        result_tree.heading("date", text="修改时间")
+        result_tree.column("#0", width=480)
+        result_tree.column("size", width=90)
+        result_tree.column("date", width=140)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=result_tree.yview)
+        result_tree.configure(yscrollcommand=scrollbar.set)
+        result_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        def parse_size(entry):
+            text = entry.get().strip()
+            return int(float(text) * 1024 * 1024) if text else None
+            
+        def run_search(event=None):
+            index = self.get_search_index(device_id, root_entry.get().strip() or "/")
+            if index.built is None:
+                return
+            try:
+                min_size, max_size = parse_size(min_size_entry), parse_size(max_size_entry)
+            except ValueError:
+                status_var.set("大小必须是数字")
+                return
+            start = time.perf_counter()
+            results, total = index.search(query_entry.get(), min_size, max_size)
+            elapsed = (time.perf_counter() - start) * 1000
+            
+            result_tree.delete(*result_tree.get_children())
+            for path, size, mtime, is_dir in results:
+                date = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime)) if mtime else ""
+                result_tree.insert("", tk.END, text=path + ("/" if is_dir else ""),
+                                   values=("" if is_dir else format_size(size), date))
+            built = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(index.built))
+            summary = f"找到 {total} 项（{elapsed:.1f} 毫秒，索引共 {index.file_count} 项，大小和时间为 {built} 更新时的值）"
+            if total > len(results):
+                summary += f"，仅显示前 {len(results)} 项"
+            status_var.set(summary)
+            
+        def update_index(force=False):
+            index = self.get_search_index(device_id, root_entry.get().strip() or "/")
+            first_build = index.built is None or force
+            status_var.set("正在建立索引..." if first_build else "正在后台更新索引...")
+            
+            def on_progress(dirs, entries):
+                self.root.after(0, lambda: dialog.winfo_exists() and status_var.set(
+                    f"正在建立索引: 已扫描 {dirs} 个目录，{entries} 项"))
+                
+            def job():
+                task = self.scheduler.current_task()
+                try:
+                    listed, reused = index.refresh(self.adb_client, on_progress if first_build else None,
+                                                   task.cancel_event if task else None, force=force)
+                except TransferCancelled:
+                    self.log_message("索引更新已取消", "WARNING")
+                    return
+                except Exception as e:
+                    self.log_message(f"索引更新失败: {str(e)}", "ERROR")
+                    return
+                self.log_message(f"索引已更新: {index.root}，重新列出 {listed} 个目录，复用 {reused} 个目录")
+                self.root.after(0, lambda: dialog.winfo_exists() and run_search())
+                
+            self.scheduler.submit(job, device=device_id, description=f"更新文件索引: {index.root}",
+                                  key=f"search-index:{device_id}:{index.root}:{force}")
+            
+        def open_result(event=None):
+            selected = result_tree.selection()
+            if not selected:
+                return
+            path = result_tree.item(selected[0], "text").rstrip("/")
+            parent = posixpath.dirname(path) or "/"
+            self.current_path_entry.delete(0, tk.END)
+            self.current_path_entry.insert(0, parent)
+            self.browse_device_path()
+            
+        button_frame = ttk.Frame(dialog, padding=(10, 0, 10, 10))
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="搜索", command=run_search).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="更新索引", command=update_index).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="重建索引", command=lambda: update_index(force=True)).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="打开所在文件夹", command=open_result).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="关闭", command=dialog.destroy).pack(side=tk.RIGHT)
+        
+        # 输入时直接搜索（索引在内存中，无需等待设备）
+        pending = {"id": None}
+        
+        def schedule_search(event=None):
+            if pending["id"]:
+                dialog.after_cancel(pending["id"])
+            pending["id"] = dialog.after(150, run_search)
+            
+        for entry in (query_entry, min_size_entry, max_size_entry):
+            entry.bind("<KeyRelease>", schedule_search)
+        root_entry.bind("<Return>", lambda event: (run_search(), update_index()))
+        result_tree.bind("<Double-1>", open_result)
+        query_entry.focus_set()
+        
+        # 已有索引时立即可以搜索，同时在后台按目录修改时间增量更新
+        run_search()
+        update_index()
+        
+    DISK_USAGE_CHILD_LIMIT = 200
+    
+    def open_disk_usage_dialog(self):
+        """存储空间分析：递归统计目录占用空间，按大小从大到小逐层展开
+        
+        统计结果来自文件索引（与文件搜索共用），再次打开时立即显示缓存结果，
+        只重新列出修改时间变化的目录。
+        """
+        device_id = self.current_device.get()
+        if not device_id:
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        if not self.settings.get("use_native_adb", True) or time.time() < self.native_adb_retry_at:
+            messagebox.showwarning("警告", "存储空间分析需要直接连接adb server，请在设置中启用")
+            return
+            
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"存储空间分析 - {device_id}")
+        dialog.geometry("760x560")
+        dialog.transient(self.root)
+        
+        path_frame = ttk.Frame(dialog, padding=10)
+        path_frame.pack(fill=tk.X)
+        ttk.Label(path_frame, text="分析路径:").pack(side=tk.LEFT)
+        path_entry = ttk.Entry(path_frame)
+        path_entry.insert(0, "/sdcard")
+        path_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Button(path_frame, text="分析", command=lambda: analyze(False)).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(path_frame, text="完全重新扫描", command=lambda: analyze(True)).pack(side=tk.LEFT)
+        
+        status_var = tk.StringVar(value="点击“分析”开始统计")
+        ttk.Label(dialog, textvariable=status_var).pack(anchor=tk.W, padx=10)
+        
+        tree_frame = ttk.Frame(dialog)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        usage_tree = ttk.Treeview(tree_frame, columns=("size", "percent", "files"), show="tree headings")
+        usage_tree.heading("#0", text="名称")
+        usage_tree.heading("size", text="大小")
+        usage_tree.heading("percent", text="占上级比例")
+        usage_tree.heading("files", text="文件数")
+        usage_tree.column("#0", width=400)
+        usage_tree.column("size", width=100)
+        usage_tree.column("percent", width=90)
+        usage_tree.column("files", width=80)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=usage_tree.yview)
+        usage_tree.configure(yscrollcommand=scrollbar.set)
+        usage_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # tree 为当前显示的统计，scan 为正在进行的扫描；节点的iid为设备路径
+        state = {"tree": None, "scan": None, "rendered": (None, None), "opened": set()}
+        
+        def render_children(data, parent):
+            rows = data.children(parent)
+            parent_total = data.total(parent)[0] or 1
+            wanted = []
+            for name, path, size, count, is_dir in rows[:self.DISK_USAGE_CHILD_LIMIT]:
+                values = (format_size(size), f"{size * 100 / parent_total:.1f}%", count if is_dir else "")
+                text = name + "/" if is_dir else name
+                if usage_tree.exists(path):
+                    usage_tree.item(path, text=text, values=values)
+                else:
+                    usage_tree.insert(parent, tk.END, iid=path, text=text, values=values)
+                    if is_dir:
+                        # 占位子项，展开时再填充
+                        usage_tree.insert(path, tk.END, iid="placeholder:" + path, text="...")
+                wanted.append(path)
+            rest = rows[self.DISK_USAGE_CHILD_LIMIT:]
+            if rest:
+                rest_size = sum(row[2] for row in rest)
+                values = (format_size(rest_size), f"{rest_size * 100 / parent_total:.1f}%", "")
+                more = "more:" + parent
+                if usage_tree.exists(more):
+                    usage_tree.item(more, text=f"其余 {len(rest)} 项", values=values)
+                else:
+                    usage_tree.insert(parent, tk.END, iid=more, text=f"其余 {len(rest)} 项", values=values)
+                wanted.append(more)
+                
+            keep = set(wanted)
+            for item in usage_tree.get_children(parent):
+                if item not in keep:
+                    usage_tree.delete(item)
+            for position, item in enumerate(wanted):
+                usage_tree.move(item, parent, position)
+                
+        def render():
+            data = state["tree"]
+            total, count = data.total(data.root)
+            values = (format_size(total), "100%", count)
+            if usage_tree.exists(data.root):
+                usage_tree.item(data.root, values=values)
+            else:
+                usage_tree.delete(*usage_tree.get_children())
+                usage_tree.insert("", tk.END, iid=data.root, text=data.root, values=values, open=True)
+            render_children(data, data.root)
+            for path in list(state["opened"]):
+                if usage_tree.exists(path):
+                    render_children(data, path)
+            state["rendered"] = (data, data.version)
+            
+        def poll():
+            if not dialog.winfo_exists():
+                return
+            data = state["tree"]
+            if data is not None and state["rendered"] != (data, data.version):
+                render()
+            scan = state["scan"]
+            if scan is not None:
+                total, count = scan.total(scan.root)
+                status_var.set(f"正在扫描: 已处理 {len(scan.files)} 个目录，{count} 个文件，{format_size(total)}")
+            dialog.after(500, poll)
+            
+        def on_open(event=None):
+            path = usage_tree.focus()
+            if path.startswith("/") and state["tree"] is not None:
+                state["opened"].add(path)
+                render_children(state["tree"], path)
+                
+        def on_close(event=None):
+            state["opened"].discard(usage_tree.focus())
+            
+        def analyze(force):
+            root = normalize_device_path(path_entry.get().strip() or "/sdcard")
+            index = self.get_search_index(device_id, root)
+            if state["tree"] is not None and state["tree"].root != root:
+                usage_tree.delete(*usage_tree.get_children())
+                state["opened"].clear()
+                state["tree"] = None
+                
+            scan = DiskUsageTree(root)
+            if index.built is not None and not force:
+                # 先显示上次的结果，扫描只重新列出变化的目录
+                state["tree"] = DiskUsageTree.from_index(index)
+            else:
+                state["tree"] = scan
+            state["scan"] = scan
+            
+            def job():
+                task = self.scheduler.current_task()
+                start = time.time()
+                try:
+                    listed, reused = index.refresh(self.adb_client, cancel_event=task.cancel_event if task else None,
+                                                   on_dir=scan.add_dir, force=force)
+                except Exception as e:
+                    cancelled = isinstance(e, TransferCancelled)
+                    message = "扫描已取消" if cancelled else f"扫描失败: {str(e)}"
+                    self.log_message(message, "WARNING" if cancelled else "ERROR")
+                    
+                    def failed():
+                        if dialog.winfo_exists() and state["scan"] is scan:
+                            state["scan"] = None
+                            status_var.set(message)
+                    self.root.after(0, failed)
+                    return
+                    
+                total, count = scan.total(root)
+                summary = (f"{root}: {format_size(total)}，{count} 个文件；重新列出 {listed} 个目录，"
+                           f"复用 {reused} 个目录，用时 {format_duration(time.time() - start)}")
+                self.log_message(f"存储空间分析完成: {summary}", "SUCCESS")
+                
+                def done():
+                    if dialog.winfo_exists() and state["scan"] is scan:
+                        state["tree"] = scan
+                        state["scan"] = None
+                        status_var.set(summary)
+                self.root.after(0, done)
+                
+            self.scheduler.submit(job, device=device_id, description=f"存储空间分析: {root}",
+                                  key=f"disk-usage:{device_id}:{root}")
+            
+        def open_in_browser(event=None):
+            item = usage_tree.focus()
+            if not item.startswith("/"):
+                return
+            path = item if usage_tree.item(item, "text").endswith("/") or item == state["tree"].root else posixpath.dirname(item)
+            self.current_path_entry.delete(0, tk.END)
+            self.current_path_entry.insert(0, path)
+            self.browse_device_path()
             
+        button_frame = ttk.Frame(dialog, padding=(10, 0, 10, 10))
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="在文件管理中打开", command=open_in_browser).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="关闭", command=dialog.destroy).pack(side=tk.RIGHT)
+        
+        usage_tree.bind("<<TreeviewOpen>>", on_open)
+        usage_tree.bind("<<TreeviewClose>>", on_close)
+        usage_tree.bind("<Double-1>", open_in_browser)
+        path_entry.bind("<Return>", lambda event: analyze(False))
+        poll()
+        
     def get_package_name(self):
         """获取包名列表"""
         # 创建包名选择对话框
         package_dialog = tk.Toplevel(self.root)
         package_dialog.title("应用包名列表")
-        package_dialog.geometry("600x400")
+        package_dialog.geometry("700x450")
         package_dialog.transient(self.root)
         package_dialog.grab_set()
         
@@ -2332,13 +7992,17 @@ class ADBToolbox:
         list_frame = ttk.Frame(package_dialog)
         list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
         
-        columns = ("package", "app")
+        columns = ("package", "app", "version", "type")
         package_tree = ttk.Treeview(list_frame, columns=columns, show="headings")
         package_tree.heading("package", text="包名")
         package_tree.heading("app", text="应用名")
+        package_tree.heading("version", text="版本")
+        package_tree.heading("type", text="类型")
         
-        package_tree.column("package", width=300)
-        package_tree.column("app", width=200)
+        package_tree.column("package", width=280)
+        package_tree.column("app", width=140)
+        package_tree.column("version", width=100)
+        package_tree.column("type", width=50)
         
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=package_tree.yview)
         package_tree.configure(yscrollcommand=scrollbar.set)
@@ -2346,10 +8010,18 @@ class ADBToolbox:
         package_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        status_var = tk.StringVar(value="正在获取应用列表...")
+        ttk.Label(package_dialog, textvariable=status_var, padding=(10, 0)).pack(anchor=tk.W)
+        
         # 按钮
         button_frame = ttk.Frame(package_dialog, padding=10)
         button_frame.pack(fill=tk.X)
         
+        # 包名 -> PackageInfo，随解析进度逐步补全
+        packages = {}
+        device_id = self.current_device.get() or None
+        catalog = self.get_package_catalog(device_id)
+        
         def select_package():
             selected = package_tree.selection()
             if selected:
@@ -2358,14 +8030,41 @@ class ADBToolbox:
                 self.package_entry.insert(0, package)
                 package_dialog.destroy()
                 
-        def filter_packages(event=None):
+        def row_values(info):
+            version = info.version_name or (str(info.version_code) if info.version_code is not None else "")
+            kind = "" if info.system is None else ("系统" if info.system else "用户")
+            return (info.package, info.label, version, kind)
+            
+        def matches(info):
             search_text = search_entry.get().lower()
-            for item in package_tree.get_children():
-                package_tree.delete(item)
-                
-            for package, app in packages:
-                if search_text in package.lower() or search_text in app.lower():
-                    package_tree.insert("", tk.END, values=(package, app))
+            return search_text in info.package.lower() or search_text in info.label.lower()
+            
+        def show_records(records):
+            """插入或更新应用行（主线程）"""
+            if not package_dialog.winfo_exists():
+                return
+            for info in records:
+                packages[info.package] = info
+                if not matches(info):
+                    continue
+                if package_tree.exists(info.package):
+                    package_tree.item(info.package, values=row_values(info))
+                else:
+                    package_tree.insert("", tk.END, iid=info.package, values=row_values(info))
+                    
+        def remove_records(names):
+            if not package_dialog.winfo_exists():
+                return
+            for package in names:
+                packages.pop(package, None)
+                if package_tree.exists(package):
+                    package_tree.delete(package)
+                    
+        def filter_packages(event=None):
+            package_tree.delete(*package_tree.get_children())
+            for info in packages.values():
+                if matches(info):
+                    package_tree.insert("", tk.END, iid=info.package, values=row_values(info))
         
         if BOOTSTRAP_AVAILABLE:
             ttk.Button(button_frame, text="选择", bootstyle="success", 
@@ -2384,54 +8083,56 @@ class ADBToolbox:
         # 绑定搜索事件
         search_entry.bind("<KeyRelease>", filter_packages)
         
-        # 获取包名列表
+        # 先显示缓存的应用目录（系统已更新时不显示），再在后台与设备核对
+        known_fingerprint = self.device_info_cache.fingerprint(device_id) if device_id else None
+        if catalog.packages and not (known_fingerprint and catalog.fingerprint
+                                     and known_fingerprint != catalog.fingerprint):
+            show_records(sorted(catalog.packages.values(), key=lambda info: info.package))
+            updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(catalog.updated)) if catalog.updated else "未知"
+            status_var.set(f"共 {len(catalog.packages)} 个应用（缓存于 {updated}），正在后台核对...")
+            
         self.log_message("正在获取应用包名列表...")
-        packages = []
+        serial_args = ['-s', device_id] if device_id else []
         
+        def run_shell(command):
+            result = self.run_adb(serial_args + ['shell', command])
+            return result.returncode, result.stdout, result.stderr
+            
+        def stream_shell(command, on_lines):
+            return self.stream_adb(serial_args + ['shell', command], on_lines)
+            
         def get_packages():
+            start = time.time()
             try:
-                # 获取包名列表
-                result = subprocess.run([self.adb_path, 'shell', 'pm', 'list', 'packages', '-f'], 
-                                      capture_output=True, text=True, encoding='utf-8', errors='ignore')
-                
-                if result.returncode == 0:
-                    lines = result.stdout.strip().split('\n')
-                    
-                    for line in lines:
-                        if line.startswith('package:'):
-                            # 解析包名和APK路径
-                            parts = line[8:].split('=')
-                            if len(parts) == 2:
-                                apk_path = parts[0]
-                                package = parts[1]
-                                
-                                # 获取应用名称
-                                app_name = package.split('.')[-1]  # 默认使用包名最后一部分
-                                
-                                # 尝试获取应用标签
-                                try:
-                                    label_result = subprocess.run([self.adb_path, 'shell', 'dumpsys', 'package', package, '|', 'grep', 'labelRes'], 
-                                                               capture_output=True, text=True, encoding='utf-8', errors='ignore')
-                                    if "labelRes" in label_result.stdout:
-                                        app_name = label_result.stdout.strip().split('=')[1]
-                                except:
-                                    pass
-                                
-                                packages.append((package, app_name))
-                    
-                    # 更新列表
-                    for package, app in packages:
-                        package_tree.insert("", tk.END, values=(package, app))
-                        
-                    self.log_message(f"找到 {len(packages)} 个应用", "SUCCESS")
-                else:
-                    self.log_message("获取包名列表失败", "ERROR")
+                changes = catalog.refresh(run_shell, stream_shell,
+                                          lambda records: self.root.after(0, show_records, records),
+                                          lambda names: self.root.after(0, remove_records, names))
             except Exception as e:
                 self.log_message(f"获取包名列表错误: {str(e)}", "ERROR")
+                self.root.after(0, lambda: package_dialog.winfo_exists() and status_var.set("获取应用列表失败"))
+                return
                 
-        threading.Thread(target=get_packages, daemon=True).start()
-        
-    def install_apk(self):
+            total = len(catalog.packages)
+            system = sum(1 for info in catalog.packages.values() if info.system)
+            summary = f"共 {total} 个应用（系统 {system}，用户 {total - system}），用时 {time.time() - start:.1f} 秒"
+            if not changes["full"]:
+                summary += f"；新增 {changes['added']}，更新 {changes['changed']}，卸载 {changes['removed']}"
+            self.log_message(f"找到 {total} 个应用", "SUCCESS")
+            self.root.after(0, lambda: package_dialog.winfo_exists() and status_var.set(summary))
+                
+        self.scheduler.submit(get_packages, device=device_id, description="获取应用包名列表")
+        
+    def get_package_catalog(self, device_id):
+        """获取设备的应用目录（首次使用时从本地缓存加载）"""
+        key = device_id or ""
+        catalog = self.package_catalogs.get(key)
+        if catalog is None:
+            name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+            catalog = PackageCatalog(os.path.join(APP_DATA_DIR, "packages", f"{name}.json"))
+            self.package_catalogs[key] = catalog
+        return catalog
+        
+    def install_apk(self, multi_device=False):
         """安装APK"""
         apk_file = filedialog.askopenfilename(
             title="选择APK文件",
@@ -2439,7 +8140,10 @@ class ADBToolbox:
         )
         if apk_file:
             command = f"adb install -r \"{apk_file}\""
-            self.execute_command(command, f"安装APK: {os.path.basename(apk_file)}")
+            if multi_device:
+                self.execute_command_on_devices(command, f"安装APK: {os.path.basename(apk_file)}")
+            else:
+                self.execute_command(command, f"安装APK: {os.path.basename(apk_file)}")
             
     def uninstall_app(self):
         """卸载应用"""
@@ -2493,6 +8197,10 @@ class ADBToolbox:
     def clear_console(self):
         """清空控制台"""
         self.console_text.delete(1.0, tk.END)
+        try:
+            self.console_history.clear()
+        except OSError as e:
+            print(f"清除历史日志失败: {e}")
         self.log_message("控制台已清空", "INFO")
         
     def save_log(self):
@@ -2505,6 +8213,12 @@ class ADBToolbox:
         if filename:
             try:
                 with open(filename, 'w', encoding='utf-8') as f:
+                    if self.console_history.dropped_bytes:
+                        f.write(f"[日志不完整] 历史日志超出保留上限，最早的 "
+                                f"{format_size(self.console_history.dropped_bytes)} 日志已被丢弃\n\n")
+                    # 先写入已移出控制台的历史日志，再写入控制台中的最近日志
+                    for chunk in self.console_history.iter_chunks():
+                        f.write(chunk)
                     f.write(self.console_text.get(1.0, tk.END))
                 self.log_message(f"日志已保存到: {filename}", "SUCCESS")
             except Exception as e:
@@ -2862,6 +8576,53 @@ GitHub: https://github.com/yys20071108/-adb-
         ttk.Checkbutton(advanced_frame, text="启用调试模式", 
                        variable=debug_mode).grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=5)
         
+        # 原生ADB协议
+        use_native_adb = tk.BooleanVar(value=self.settings.get("use_native_adb", True))
+        ttk.Checkbutton(advanced_frame, text="直接连接ADB服务（减少进程启动开销）", 
+                       variable=use_native_adb).grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=5)
+        
+        # 控制台最大行数
+        ttk.Label(advanced_frame, text="控制台最大行数:").grid(row=3, column=0, sticky=tk.W, pady=5)
+        console_max_lines_entry = ttk.Entry(advanced_frame, width=10)
+        console_max_lines_entry.insert(0, str(self.settings.get("console_max_lines", 5000)))
+        console_max_lines_entry.grid(row=3, column=1, sticky=tk.W, pady=5)
+        
+        # 并发任务数
+        ttk.Label(advanced_frame, text="并发任务数(重启生效):").grid(row=4, column=0, sticky=tk.W, pady=5)
+        max_workers_entry = ttk.Entry(advanced_frame, width=10)
+        max_workers_entry.insert(0, str(self.settings.get("max_workers", 4)))
+        max_workers_entry.grid(row=4, column=1, sticky=tk.W, pady=5)
+        
+        # 并行传输连接数
+        ttk.Label(advanced_frame, text="并行传输连接数:").grid(row=5, column=0, sticky=tk.W, pady=5)
+        transfer_streams_entry = ttk.Entry(advanced_frame, width=10)
+        transfer_streams_entry.insert(0, str(self.settings.get("transfer_streams", 4)))
+        transfer_streams_entry.grid(row=5, column=1, sticky=tk.W, pady=5)
+        
+        # 文件缓存上限
+        ttk.Label(advanced_frame, text="文件缓存上限(MB):").grid(row=6, column=0, sticky=tk.W, pady=5)
+        file_cache_entry = ttk.Entry(advanced_frame, width=10)
+        file_cache_entry.insert(0, str(self.settings.get("file_cache_mb", 1024)))
+        file_cache_entry.grid(row=6, column=1, sticky=tk.W, pady=5)
+        
+        def clear_file_cache():
+            self.file_cache.clear()
+            self.log_message("文件缓存已清空", "SUCCESS")
+            
+        ttk.Button(advanced_frame, text="清空缓存", command=clear_file_cache).grid(row=6, column=2, padx=5)
+        
+        # 缩略图缓存上限
+        ttk.Label(advanced_frame, text="缩略图缓存上限(MB):").grid(row=7, column=0, sticky=tk.W, pady=5)
+        thumbnail_cache_entry = ttk.Entry(advanced_frame, width=10)
+        thumbnail_cache_entry.insert(0, str(self.settings.get("thumbnail_cache_mb", 256)))
+        thumbnail_cache_entry.grid(row=7, column=1, sticky=tk.W, pady=5)
+        
+        def clear_thumbnail_cache():
+            self.thumbnail_cache.clear()
+            self.log_message("缩略图缓存已清空", "SUCCESS")
+            
+        ttk.Button(advanced_frame, text="清空缓存", command=clear_thumbnail_cache).grid(row=7, column=2, padx=5)
+        
         # 保存设置按钮
         button_frame = ttk.Frame(settings_window)
         button_frame.pack(pady=10)
@@ -2876,6 +8637,19 @@ GitHub: https://github.com/yys20071108/-adb-
             self.settings["console_font_size"] = int(font_size.get())
             self.settings["log_level"] = log_level.get()
             self.settings["debug_mode"] = debug_mode.get()
+            self.settings["use_native_adb"] = use_native_adb.get()
+            self.settings["console_max_lines"] = max(int(console_max_lines_entry.get()), 100)
+            self.settings["max_workers"] = min(max(int(max_workers_entry.get()), 1), 64)
+            self.settings["transfer_streams"] = min(max(int(transfer_streams_entry.get()), 1), 16)
+            self.adb_client.pool.resize(self.adb_pool_size())
+            if self.settings["use_native_adb"]:
+                self.start_device_tracker()
+            else:
+                self.stop_device_tracker()
+            self.settings["file_cache_mb"] = max(int(file_cache_entry.get()), 0)
+            self.file_cache.max_bytes = self.settings["file_cache_mb"] * 1024 * 1024
+            self.settings["thumbnail_cache_mb"] = max(int(thumbnail_cache_entry.get()), 0)
+            self.thumbnail_cache.max_bytes = self.settings["thumbnail_cache_mb"] * 1024 * 1024
             
             # 应用设置
             self.adb_path = self.settings["adb_path"]
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+原生ADB协议客户端测试（使用本地socket模拟adb server）
+"""
+
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ADBConnectionPool, ADBError, ADBServerClient
+
+
+def okay(payload=None):
+    """OKAY响应，payload不为None时附带长度前缀的内容"""
+    if payload is None:
+        return b"OKAY"
+    data = payload.encode("utf-8")
+    return b"OKAY" + b"%04x" % len(data) + data
+
+
+def fail(message):
+    data = message.encode("utf-8")
+    return b"FAIL" + b"%04x" % len(data) + data
+
+
+def shell_packet(packet_id, data=b""):
+    return struct.pack("<BI", packet_id, len(data)) + data
+
+
+class FakeADBServer:
+    """按请求内容返回预设响应的adb server
+
+    responses 为 {请求: 响应字节或可调用对象}；未知请求返回FAIL。
+    每个连接可以依次发送多个请求（例如先切换transport再打开服务），收到的请求按连接记录。
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.connections = []
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self.sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _addr = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _recv_exact(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _handle(self, conn):
+        requests = []
+        self.connections.append(requests)
+        with conn:
+            while True:
+                header = self._recv_exact(conn, 4)
+                if header is None:
+                    return
+                request = self._recv_exact(conn, int(header, 16)).decode("utf-8")
+                requests.append(request)
+                response = self.responses.get(request, fail(f"unknown request: {request}"))
+                if callable(response):
+                    response(conn)
+                    return
+                conn.sendall(response)
+                if response.startswith(b"FAIL") or len(response) > 4:
+                    return
+
+
+class ADBServerClientTest(unittest.TestCase):
+
+    def start(self, responses):
+        server = FakeADBServer(responses)
+        self.addCleanup(server.close)
+        client = ADBServerClient(port=server.port, timeout=2)
+        self.addCleanup(client.close)
+        return server, client
+
+    def test_okay_response(self):
+        _server, client = self.start({"host:version": okay("0029")})
+        self.assertEqual(client.host_request("host:version"), "0029")
+
+    def test_fail_response(self):
+        _server, client = self.start({"host:devices": fail("cannot connect to daemon")})
+        with self.assertRaises(ADBError) as context:
+            client.host_request("host:devices")
+        self.assertEqual(str(context.exception), "cannot connect to daemon")
+
+    def test_transport_switch_before_service(self):
+        def reply(conn):
+            conn.sendall(b"OKAY" + b"hello\n\n" + ADBServerClient.EXIT_MARKER + b"0\n")
+
+        service = "shell:" + ADBServerClient._with_exit_marker("echo hello")
+        server, client = self.start({
+            "host-serial:emu-1:features": okay("cmd"),
+            "host:transport:emu-1": okay(),
+            service: reply,
+        })
+        self.assertEqual(client.shell("emu-1", "echo hello"), (0, b"hello\n", b""))
+        self.assertIn(["host:transport:emu-1", service], server.connections)
+
+    def test_shell_v1_exit_code(self):
+        def reply(conn):
+            # 使用pty的旧设备输出\r\n
+            conn.sendall(b"OKAY" + b"no such file\r\n\r\n" + ADBServerClient.EXIT_MARKER + b"2\r\n")
+
+        _server, client = self.start({
+            "host-serial:emu-1:features": okay("cmd"),
+            "host:transport:emu-1": okay(),
+            "shell:" + ADBServerClient._with_exit_marker("ls /x"): reply,
+        })
+        self.assertEqual(client.shell("emu-1", "ls /x"), (2, b"no such file\r\n", b""))
+
+    def test_shell_v1_stream_hides_split_marker(self):
+        def reply(conn):
+            data = b"line1\nline2" + b"\n" + ADBServerClient.EXIT_MARKER + b"1\n"
+            conn.sendall(b"OKAY")
+            for i in range(0, len(data), 4):
+                conn.sendall(data[i:i + 4])
+                time.sleep(0.01)
+
+        _server, client = self.start({
+            "host-serial:emu-1:features": okay("cmd"),
+            "host:transport:emu-1": okay(),
+            "shell:" + ADBServerClient._with_exit_marker("cat f"): reply,
+        })
+        chunks = []
+        returncode = client.shell_stream("emu-1", "cat f", lambda stream, data: chunks.append(data))
+        self.assertEqual(returncode, 1)
+        self.assertEqual(b"".join(chunks), b"line1\nline2")
+
+    def test_unknown_device_fails_on_transport(self):
+        _server, client = self.start({
+            "host-serial:gone:features": okay("shell_v2"),
+            "host:transport:gone": fail("device 'gone' not found"),
+        })
+        with self.assertRaises(ADBError):
+            client.shell("gone", "true")
+
+    def test_shell_v2_framing(self):
+        def reply(conn):
+            data = (shell_packet(ADBServerClient.SHELL_V2_STDOUT, b"out1\n")
+                    + shell_packet(ADBServerClient.SHELL_V2_STDERR, b"err\n")
+                    + shell_packet(ADBServerClient.SHELL_V2_STDOUT, b"out2\n")
+                    + shell_packet(ADBServerClient.SHELL_V2_EXIT, b"\x03"))
+            conn.sendall(b"OKAY")
+            # 数据包跨越多次发送，头部也可能被拆开
+            for i in range(0, len(data), 3):
+                conn.sendall(data[i:i + 3])
+
+        _server, client = self.start({
+            "host-serial:emu-1:features": okay("shell_v2,cmd"),
+            "host:transport:emu-1": okay(),
+            "shell,v2,raw:ls": reply,
+        })
+        self.assertEqual(client.shell("emu-1", "ls"), (3, b"out1\nout2\n", b"err\n"))
+
+    def test_features_not_cached_on_error(self):
+        responses = {"host-serial:emu-1:features": fail("device offline")}
+        _server, client = self.start(responses)
+        self.assertEqual(client.get_features("emu-1"), set())
+        responses["host-serial:emu-1:features"] = okay("shell_v2,stat_v2")
+        self.assertEqual(client.get_features("emu-1"), {"shell_v2", "stat_v2"})
+        # 成功的结果会被缓存
+        responses["host-serial:emu-1:features"] = fail("device offline")
+        self.assertEqual(client.get_features("emu-1"), {"shell_v2", "stat_v2"})
+
+
+class ADBConnectionPoolTest(unittest.TestCase):
+
+    def test_release_refills_in_background(self):
+        server = FakeADBServer({})
+        self.addCleanup(server.close)
+        pool = ADBConnectionPool(port=server.port, max_idle=2, timeout=2)
+        self.addCleanup(pool.close)
+        opened = []
+        gate = threading.Event()
+        open_socket = pool._open
+
+        def slow_open():
+            gate.wait(2)
+            opened.append(1)
+            return open_socket()
+
+        sock = pool.acquire()
+        pool._open = slow_open
+        started = time.time()
+        pool.release(sock)
+        # 归还连接不等待补充连接建立
+        self.assertLess(time.time() - started, 0.5)
+        gate.set()
+        for _ in range(100):
+            if len(pool._idle) == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(pool._idle), 2)
+        self.assertEqual(len(opened), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tar流目录传输（成员过滤、shell v2 错误与退出码、推送打包）测试
+"""
+
+import io
+import os
+import socket
+import struct
+import sys
+import tarfile
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ADBError, ADBServerClient, ArchiveTransfer, TransferItem
+
+
+def shell_packet(packet_id, data=b""):
+    return struct.pack("<BI", packet_id, len(data)) + data
+
+
+def make_tar(members):
+    """members 为 [(名称, 内容或None表示目录或 ("link", 目标))]"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            if data is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            elif isinstance(data, tuple):
+                info.type = tarfile.SYMTYPE
+                info.linkname = data[1]
+                tar.addfile(info)
+            else:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class FakeClient(ADBServerClient):
+    """服务请求交给 handler(device_sock, service) 在另一端处理的客户端"""
+
+    def __init__(self, features, handler):
+        super().__init__(port=1)
+        self.features = features
+        self.handler = handler
+        self.services = []
+
+    def get_features(self, serial):
+        return set(self.features)
+
+    def open_service(self, serial, service, timeout=None):
+        self.services.append(service)
+        sock, device = socket.socketpair()
+        threading.Thread(target=self._handle, args=(device, service), daemon=True).start()
+        return sock
+
+    def _handle(self, device, service):
+        with device:
+            self.handler(device, service)
+
+
+class SafeMemberTest(unittest.TestCase):
+
+    def member(self, name, member_type=tarfile.REGTYPE):
+        info = tarfile.TarInfo(name)
+        info.type = member_type
+        return info
+
+    def test_accepts_files_and_dirs_inside_target(self):
+        self.assertTrue(ArchiveTransfer._safe_member(self.member("./a/b.txt")))
+        self.assertTrue(ArchiveTransfer._safe_member(self.member("a/..b/c", tarfile.DIRTYPE)))
+
+    def test_rejects_escaping_paths(self):
+        for name in ("/etc/passwd", "../x", "a/../../x", "a\\..\\x"):
+            self.assertFalse(ArchiveTransfer._safe_member(self.member(name)), name)
+
+    def test_rejects_links_and_special_files(self):
+        for member_type in (tarfile.SYMTYPE, tarfile.LNKTYPE, tarfile.CHRTYPE, tarfile.FIFOTYPE):
+            self.assertFalse(ArchiveTransfer._safe_member(self.member("./x", member_type)))
+
+    def test_should_use_for_many_small_files(self):
+        small = [TransferItem(f"/s/{i}", f"/l/{i}", 1024, 0, 0) for i in range(ArchiveTransfer.MIN_FILES)]
+        self.assertTrue(ArchiveTransfer.should_use(small))
+        self.assertFalse(ArchiveTransfer.should_use(small[:-1]))
+        large = [item._replace(size=ArchiveTransfer.SMALL_FILE_SIZE) for item in small]
+        self.assertFalse(ArchiveTransfer.should_use(large))
+
+
+class ArchiveTransferTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.temp = temp.name
+
+    def test_pull_over_shell_v2_reports_missing_files(self):
+        archive = make_tar([
+            (".", None),
+            ("./a.txt", b"hello"),
+            ("./sub", None),
+            ("./sub/b.txt", b"world" * 1000),
+            ("../evil.txt", b"evil"),
+            ("./link", ("link", "/etc/passwd")),
+        ])
+
+        def handler(device, service):
+            data = b"".join(shell_packet(ADBServerClient.SHELL_V2_STDOUT, archive[i:i + 700])
+                            for i in range(0, len(archive), 700))
+            device.sendall(data + shell_packet(ADBServerClient.SHELL_V2_STDERR, b"tar: ./secret.txt: Permission denied\n")
+                           + shell_packet(ADBServerClient.SHELL_V2_EXIT, b"\x01"))
+
+        client = FakeClient({"shell_v2"}, handler)
+        local = os.path.join(self.temp, "out")
+        items = [TransferItem(f"/sdcard/dir/{name}", "", size, 0, 0)
+                 for name, size in (("a.txt", 5), ("sub/b.txt", 5000), ("secret.txt", 10))]
+        result = ArchiveTransfer(client, "emu-1").pull("/sdcard/dir", local, items)
+
+        self.assertEqual(client.services, ["shell,v2,raw:tar -cf - -C /sdcard/dir ."])
+        with open(os.path.join(local, "sub", "b.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"world" * 1000)
+        self.assertFalse(os.path.exists(os.path.join(self.temp, "evil.txt")))
+        self.assertFalse(os.path.lexists(os.path.join(local, "link")))
+        self.assertEqual(result["done_files"], 2)
+        self.assertEqual(result["failed"], [("/sdcard/dir/secret.txt", "tar: ./secret.txt: Permission denied")])
+
+    def test_pull_fails_when_device_has_no_tar(self):
+        def handler(device, service):
+            device.sendall(shell_packet(ADBServerClient.SHELL_V2_STDERR, b"/system/bin/sh: tar: not found\n")
+                           + shell_packet(ADBServerClient.SHELL_V2_EXIT, b"\x7f"))
+
+        client = FakeClient({"shell_v2"}, handler)
+        items = [TransferItem("/sdcard/dir/a.txt", "", 5, 0, 0)]
+        with self.assertRaises(ADBError) as context:
+            ArchiveTransfer(client, "emu-1").pull("/sdcard/dir", os.path.join(self.temp, "out"), items)
+        self.assertIn("tar: not found", str(context.exception))
+
+    def test_push_over_shell_v2(self):
+        source = os.path.join(self.temp, "src")
+        os.makedirs(os.path.join(source, "sub"))
+        with open(os.path.join(source, "a.txt"), "wb") as f:
+            f.write(b"hello")
+        with open(os.path.join(source, "sub", "b.bin"), "wb") as f:
+            f.write(os.urandom(100 * 1024))
+        received = io.BytesIO()
+
+        def handler(device, service):
+            while True:
+                header = ADBServerClient._recv_exact(device, 5)
+                packet_id, length = struct.unpack("<BI", header)
+                if packet_id == ADBServerClient.SHELL_V2_CLOSE_STDIN:
+                    break
+                received.write(ADBServerClient._recv_exact(device, length))
+            device.sendall(shell_packet(ADBServerClient.SHELL_V2_EXIT, b"\x00"))
+
+        client = FakeClient({"shell_v2"}, handler)
+        result = ArchiveTransfer(client, "emu-1").push(source, "/sdcard/dst dir")
+
+        self.assertEqual(client.services, ["shell,v2,raw:mkdir -p '/sdcard/dst dir' && tar -xf - -C '/sdcard/dst dir'"])
+        self.assertEqual(result["done_files"], 2)
+        received.seek(0)
+        with tarfile.open(fileobj=received) as tar:
+            names = sorted(tar.getnames())
+            data = tar.extractfile("./sub/b.bin").read()
+        self.assertEqual(names, [".", "./a.txt", "./sub", "./sub/b.bin"])
+        with open(os.path.join(source, "sub", "b.bin"), "rb") as f:
+            self.assertEqual(data, f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量文件操作（脚本生成、按长度分段、逐项结果解析）测试
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ADBError, BatchFileOperation
+
+
+def run_local_shell(script):
+    """在本机的sh中执行脚本，代替设备端shell"""
+    result = subprocess.run(["sh", "-c", script], capture_output=True, text=True)
+    return result.returncode, result.stdout, result.stderr
+
+
+class BatchFileOperationTest(unittest.TestCase):
+
+    def test_rejects_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            BatchFileOperation("format", ["/sdcard/a"])
+        with self.assertRaises(ValueError):
+            BatchFileOperation("move", ["/sdcard/a"])
+        with self.assertRaises(ValueError):
+            BatchFileOperation("chmod", ["/sdcard/a"], mode="755; reboot")
+        BatchFileOperation("chmod", ["/sdcard/a"], mode="u+x,go-w")
+
+    def test_one_script_with_a_marker_per_item(self):
+        operation = BatchFileOperation("move", ["/sdcard/a b.txt", "/sdcard/it's.txt"], target="/sdcard/dst")
+        scripts = operation.scripts()
+        self.assertEqual(len(scripts), 1)
+        self.assertTrue(scripts[0].startswith("mkdir -p -- /sdcard/dst\n"))
+        self.assertIn("mv -- '/sdcard/a b.txt' /sdcard/dst/", scripts[0])
+        self.assertEqual(scripts[0].count(BatchFileOperation.MARKER), 2)
+
+    def test_long_batches_are_split(self):
+        paths = [f"/sdcard/DCIM/Camera/IMG_{i:05d}.jpg" for i in range(2000)]
+        scripts = BatchFileOperation("copy", paths, target="/sdcard/backup").scripts()
+        self.assertGreater(len(scripts), 1)
+        for script in scripts:
+            self.assertLessEqual(len(script), BatchFileOperation.SCRIPT_LIMIT)
+            self.assertTrue(script.startswith("mkdir -p -- /sdcard/backup\n"))
+        self.assertEqual(sum(script.count("cp -R") for script in scripts), len(paths))
+
+    def test_parse_output(self):
+        marker = BatchFileOperation.MARKER
+        output = (f"\n{marker} 0 0\n"
+                  f"rm: /sdcard/x: Permission denied\n\n{marker} 1 1\r\n"
+                  f"81a4\npartial line{marker} 2 0\n")
+        self.assertEqual(BatchFileOperation.parse_output(output), {
+            0: (True, ""),
+            1: (False, "rm: /sdcard/x: Permission denied"),
+        })
+
+    def test_run_reports_missing_items_and_script_errors(self):
+        marker = BatchFileOperation.MARKER
+        operation = BatchFileOperation("delete", ["/a", "/b"])
+        results = operation.run(lambda script: (0, f"\n{marker} 0 0\n", ""))
+        self.assertEqual(results, [("/a", True, ""), ("/b", False, "未执行")])
+        with self.assertRaises(ADBError):
+            operation.run(lambda script: (127, "", "sh: not found"))
+
+
+@unittest.skipUnless(shutil.which("sh") and shutil.which("stat"), "需要POSIX shell")
+class BatchFileOperationShellTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.root = temp.name
+        for name in ("a.txt", "b c.txt"):
+            with open(os.path.join(self.root, name), "w") as f:
+                f.write(name)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def test_move_reports_each_item(self):
+        operation = BatchFileOperation("move", [self.path("a.txt"), self.path("missing"), self.path("b c.txt")],
+                                       target=self.path("dst"))
+        results = operation.run(run_local_shell)
+        self.assertEqual([success for _path, success, _output in results], [True, False, True])
+        self.assertIn("missing", results[1][2])
+        self.assertEqual(sorted(os.listdir(self.path("dst"))), ["a.txt", "b c.txt"])
+
+    def test_chmod_returns_new_mode(self):
+        results = BatchFileOperation("chmod", [self.path("a.txt")], mode="640").run(run_local_shell)
+        self.assertTrue(results[0][1])
+        self.assertEqual(int(results[0][2], 16) & 0o777, 0o640)
+
+    def test_stat_returns_attributes_and_usage(self):
+        results = BatchFileOperation("stat", [self.path("b c.txt")]).run(run_local_shell)
+        success, output = results[0][1:]
+        self.assertTrue(success)
+        stat_line, usage = output.splitlines()
+        self.assertEqual(stat_line.split("|")[1], str(len("b c.txt")))
+        self.assertTrue(usage.isdigit())
+
+
+if __name__ == "__main__":
+    unittest.main()
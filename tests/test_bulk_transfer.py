@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多连接并行批量传输（清单生成、工作单元切分、并行推送与拉取）测试
+"""
+
+import os
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ADBError, BulkTransfer, SyncEntry, TransferItem
+
+
+def item(name, size):
+    return TransferItem(name, name, size, 0, stat.S_IFREG | 0o644)
+
+
+class FakeSync:
+    """在内存中保存设备文件的sync会话"""
+
+    def __init__(self, device):
+        self.device = device
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        pass
+
+    def stat(self, path):
+        if path in self.device.files:
+            return SyncEntry(path, stat.S_IFREG | 0o644, len(self.device.files[path]), 100)
+        if any(name.startswith(path.rstrip("/") + "/") for name in self.device.files):
+            return SyncEntry(path, stat.S_IFDIR | 0o755, 4096, 100)
+        return None
+
+    def list(self, path):
+        prefix = path.rstrip("/") + "/"
+        children = {}
+        for name, data in self.device.files.items():
+            if name.startswith(prefix):
+                child, _, rest = name[len(prefix):].partition("/")
+                children[child] = SyncEntry(child, stat.S_IFDIR | 0o755, 4096, 100) if rest else \
+                    SyncEntry(child, stat.S_IFREG | 0o644, len(data), 100)
+        return list(children.values())
+
+    def send(self, fileobj, remote_path, mode, mtime, on_data=None):
+        if remote_path in self.device.broken:
+            raise ADBError(f"{remote_path}: Read-only file system")
+        data = fileobj.read()
+        with self.device.lock:
+            self.device.files[remote_path] = data
+        if on_data:
+            on_data(len(data))
+
+    def recv(self, remote_path, fileobj, on_data=None):
+        if remote_path in self.device.broken:
+            raise ADBError(f"{remote_path}: Permission denied")
+        data = self.device.files[remote_path]
+        fileobj.write(data)
+        if on_data:
+            on_data(len(data))
+
+
+class FakeClient:
+    def __init__(self, files=None, broken=()):
+        self.files = dict(files or {})
+        self.broken = set(broken)
+        self.lock = threading.Lock()
+        self.commands = []
+        self.connections = 0
+
+    def open_sync(self, serial):
+        with self.lock:
+            self.connections += 1
+        return FakeSync(self)
+
+    def shell(self, serial, command):
+        self.commands.append(command)
+        return ""
+
+
+class SplitUnitsTest(unittest.TestCase):
+
+    def test_large_files_alone_and_first(self):
+        big = BulkTransfer.UNIT_BYTES
+        units = BulkTransfer.split_units([item("small", 10), item("huge", big * 3), item("big", big)])
+        self.assertEqual([[i.source for i in unit] for unit in units], [["huge"], ["big"], ["small"]])
+
+    def test_small_files_grouped_by_count_and_bytes(self):
+        units = BulkTransfer.split_units([item(str(i), 1) for i in range(BulkTransfer.UNIT_FILES * 2 + 5)])
+        self.assertEqual([len(unit) for unit in units], [BulkTransfer.UNIT_FILES, BulkTransfer.UNIT_FILES, 5])
+
+        quarter = BulkTransfer.UNIT_BYTES // 4
+        units = BulkTransfer.split_units([item(str(i), quarter) for i in range(6)])
+        self.assertEqual([len(unit) for unit in units], [4, 2])
+        self.assertEqual(BulkTransfer.split_units([]), [])
+
+
+class BulkTransferTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.local = temp.name
+
+    def write(self, relative, data):
+        path = os.path.join(self.local, *relative.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def test_push_directory(self):
+        self.write("photos/a.jpg", b"a" * 100)
+        self.write("photos/2024/b.jpg", b"b" * 50)
+        os.makedirs(os.path.join(self.local, "photos", "empty"))
+        items, empty_dirs = BulkTransfer.plan_push(os.path.join(self.local, "photos"), "/sdcard/photos/")
+        self.assertEqual(sorted(i.target for i in items), ["/sdcard/photos/2024/b.jpg", "/sdcard/photos/a.jpg"])
+        self.assertEqual(empty_dirs, ["/sdcard/photos/empty"])
+
+        client = FakeClient(broken={"/sdcard/photos/a.jpg"})
+        result = BulkTransfer(client, "emu-1", streams=4).push(items, empty_dirs)
+        self.assertEqual(client.commands, ["mkdir -p /sdcard/photos/empty"])
+        self.assertEqual(client.files, {"/sdcard/photos/2024/b.jpg": b"b" * 50})
+        self.assertEqual(result["total_bytes"], 150)
+        self.assertEqual((result["done_files"], result["done_bytes"]), (1, 50))
+        self.assertEqual([source for source, _error in result["failed"]], [os.path.join(self.local, "photos", "a.jpg")])
+        self.assertFalse(result["cancelled"])
+
+    def test_pull_directory_in_parallel(self):
+        files = {f"/sdcard/DCIM/{i % 3}/IMG_{i}.jpg": bytes([i]) * i for i in range(1, 200)}
+        client = FakeClient(files)
+        transfer = BulkTransfer(client, "emu-1", streams=3)
+        target = os.path.join(self.local, "DCIM")
+        items, local_dirs = transfer.plan_pull("/sdcard/DCIM", target)
+        self.assertEqual(len(items), 199)
+        self.assertEqual(len(local_dirs), 4)
+
+        result = transfer.pull(items, local_dirs)
+        self.assertEqual(result["failed"], [])
+        self.assertEqual(result["done_files"], 199)
+        self.assertEqual(result["done_bytes"], sum(len(data) for data in files.values()))
+        # 初始遍历一个连接，加上最多三个工作连接
+        self.assertLessEqual(client.connections, 4)
+        with open(os.path.join(target, "1", "IMG_100.jpg"), "rb") as f:
+            self.assertEqual(f.read(), bytes([100]) * 100)
+
+    def test_failed_pull_removes_partial_file(self):
+        client = FakeClient({"/data/a": b"x", "/data/b": b"y"}, broken={"/data/b"})
+        transfer = BulkTransfer(client, "emu-1")
+        items, local_dirs = transfer.plan_pull("/data", self.local)
+        result = transfer.pull(items, local_dirs)
+        self.assertEqual(result["failed"], [("/data/b", "/data/b: Permission denied")])
+        self.assertEqual(os.listdir(self.local), ["a"])
+
+    def test_missing_remote_path(self):
+        with self.assertRaises(ADBError):
+            BulkTransfer(FakeClient(), "emu-1").plan_pull("/sdcard/missing", self.local)
+
+    def test_cancelled_before_start(self):
+        transfer = BulkTransfer(FakeClient(), "emu-1")
+        self.write("a", b"a")
+        items, _empty = BulkTransfer.plan_push(self.local, "/sdcard/x")
+        transfer.cancel_event.set()
+        result = transfer.push(items)
+        self.assertTrue(result["cancelled"])
+        self.assertEqual(result["done_files"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令调度器（优先级、设备并发限制、任务合并与取消）测试
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import CommandScheduler, ScheduledTask
+
+
+class CommandSchedulerTest(unittest.TestCase):
+
+    def start(self, **kwargs):
+        scheduler = CommandScheduler(**kwargs)
+        self.addCleanup(scheduler.shutdown)
+        return scheduler
+
+    def block(self, scheduler, **kwargs):
+        """提交一个等待gate的任务，返回 (gate, task)，任务开始运行后才返回"""
+        gate = threading.Event()
+        started = threading.Event()
+
+        def job():
+            started.set()
+            gate.wait(5)
+
+        task = scheduler.submit(job, **kwargs)
+        self.assertTrue(started.wait(2))
+        self.addCleanup(gate.set)
+        return gate, task
+
+    def test_interactive_runs_before_queued_background(self):
+        scheduler = self.start(max_workers=1)
+        gate, _task = self.block(scheduler)
+        order = []
+        background = scheduler.submit(order.append, "background", priority=CommandScheduler.PRIORITY_BACKGROUND)
+        interactive = scheduler.submit(order.append, "interactive")
+        gate.set()
+        self.assertTrue(background.wait(2))
+        self.assertTrue(interactive.wait(2))
+        self.assertEqual(order, ["interactive", "background"])
+
+    def test_per_device_limit(self):
+        scheduler = self.start(max_workers=3, per_device_limit=1)
+        gate, _task = self.block(scheduler, device="emu-1")
+        same = scheduler.submit(lambda: None, device="emu-1")
+        other = scheduler.submit(lambda: None, device="emu-2")
+        # 其他设备的任务不受影响，同一设备的任务等待前一个结束
+        self.assertTrue(other.wait(2))
+        self.assertEqual(same.state, ScheduledTask.QUEUED)
+        gate.set()
+        self.assertTrue(same.wait(2))
+        self.assertEqual(same.state, ScheduledTask.DONE)
+
+    def test_background_tasks_leave_a_worker_for_interactive(self):
+        scheduler = self.start(max_workers=2)
+        gate, _task = self.block(scheduler, priority=CommandScheduler.PRIORITY_BACKGROUND)
+        queued = scheduler.submit(lambda: None, priority=CommandScheduler.PRIORITY_BACKGROUND)
+        interactive = scheduler.submit(lambda: "ok")
+        self.assertTrue(interactive.wait(2))
+        self.assertEqual(interactive.result, "ok")
+        self.assertEqual(queued.state, ScheduledTask.QUEUED)
+        gate.set()
+        self.assertTrue(queued.wait(2))
+
+    def test_same_key_coalesces_and_upgrades_priority(self):
+        scheduler = self.start(max_workers=1)
+        gate, _task = self.block(scheduler)
+        calls = []
+        first = scheduler.submit(calls.append, "refresh", priority=CommandScheduler.PRIORITY_BACKGROUND, key="refresh")
+        other = scheduler.submit(calls.append, "other", priority=CommandScheduler.PRIORITY_BACKGROUND)
+        second = scheduler.submit(calls.append, "refresh", key="refresh")
+        self.assertIs(first, second)
+        self.assertEqual(first.priority, CommandScheduler.PRIORITY_INTERACTIVE)
+        gate.set()
+        self.assertTrue(other.wait(2))
+        self.assertEqual(calls, ["refresh", "other"])
+
+    def test_cancel_queued_task(self):
+        scheduler = self.start(max_workers=1)
+        gate, _task = self.block(scheduler)
+        calls = []
+        task = scheduler.submit(calls.append, "cancelled")
+        scheduler.cancel(task)
+        self.assertTrue(task.wait(0))
+        self.assertEqual(task.state, ScheduledTask.CANCELLED)
+        gate.set()
+        self.assertTrue(scheduler.submit(lambda: None).wait(2))
+        self.assertEqual(calls, [])
+
+    def test_running_task_sees_cancel_event(self):
+        scheduler = self.start(max_workers=1)
+        started = threading.Event()
+
+        def job():
+            task = scheduler.current_task()
+            started.set()
+            task.cancel_event.wait(2)
+            return task.cancelled
+
+        task = scheduler.submit(job)
+        self.assertTrue(started.wait(2))
+        self.assertEqual(scheduler.cancel_all(include_running=True), 1)
+        self.assertTrue(task.wait(2))
+        self.assertTrue(task.result)
+        self.assertEqual(task.state, ScheduledTask.CANCELLED)
+        self.assertIsNone(scheduler.current_task())
+
+    def test_failed_task_keeps_error(self):
+        scheduler = self.start(max_workers=1)
+        task = scheduler.submit(lambda: 1 / 0)
+        self.assertTrue(task.wait(2))
+        self.assertEqual(task.state, ScheduledTask.FAILED)
+        self.assertIsInstance(task.error, ZeroDivisionError)
+        # 失败的任务不影响后续任务
+        self.assertEqual(scheduler.submit(lambda: 2).wait(2), True)
+
+
+if __name__ == "__main__":
+    unittest.main()
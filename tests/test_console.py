@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+控制台日志（线程安全的日志队列与批量写入、超出行数的历史日志）测试
+"""
+
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ADBToolbox, ConsoleHistory
+
+
+class FakeText:
+    """记录写入内容的控制台控件，行号规则与Tk Text相同（从1开始）"""
+
+    def __init__(self):
+        self.text = ""
+        self.inserts = []
+
+    def insert(self, index, *args):
+        self.inserts.append(args)
+        self.text += "".join(args[0::2])
+
+    def see(self, index):
+        pass
+
+    def index(self, index):
+        return f"{self.text.count(chr(10)) + 1}.0"
+
+    def _offset(self, index):
+        line = int(index.split(".")[0])
+        offset = 0
+        for _ in range(line - 1):
+            offset = self.text.index("\n", offset) + 1
+        return offset
+
+    def get(self, start, end):
+        return self.text[self._offset(start):self._offset(end)]
+
+    def delete(self, start, end):
+        self.text = self.text[:self._offset(start)] + self.text[self._offset(end):]
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, func, *args):
+        self.scheduled.append(func)
+
+
+def make_toolbox(**settings):
+    """不创建窗口，只准备日志相关属性的ADBToolbox"""
+    toolbox = ADBToolbox.__new__(ADBToolbox)
+    toolbox.log_queue = queue.Queue()
+    toolbox.console_text = FakeText()
+    toolbox.root = FakeRoot()
+    toolbox.settings = dict(settings)
+    return toolbox
+
+
+class LogQueueTest(unittest.TestCase):
+
+    def test_logs_from_threads_are_written_in_batches(self):
+        toolbox = make_toolbox()
+        threads = [threading.Thread(target=lambda n=n: [toolbox.log_message(f"t{n} {i}") for i in range(100)])
+                   for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        toolbox.process_log_queue()
+        # 400条同级别日志合并为一次写入
+        self.assertEqual(len(toolbox.console_text.inserts), 1)
+        self.assertEqual(toolbox.console_text.text.count("\n"), 400)
+        self.assertEqual(toolbox.root.scheduled, [toolbox.process_log_queue])
+
+    def test_consecutive_levels_share_a_tag_run(self):
+        toolbox = make_toolbox()
+        toolbox.log_message("a")
+        toolbox.log_message("b", "ERROR")
+        toolbox.log_message("c", "ERROR")
+        toolbox.log_message("d", "SUCCESS")
+        toolbox.process_log_queue()
+        insert, = toolbox.console_text.inserts
+        self.assertEqual(insert[1::2], ((), "error", "success"))
+        self.assertIn("[ERROR] b\n", insert[2])
+        self.assertIn("[ERROR] c\n", insert[2])
+
+    def test_batch_size_limits_one_pass(self):
+        toolbox = make_toolbox()
+        toolbox.LOG_BATCH_SIZE = 10
+        for i in range(25):
+            toolbox.log_message(str(i))
+        toolbox.process_log_queue()
+        self.assertEqual(toolbox.console_text.text.count("\n"), 10)
+        self.assertEqual(toolbox.log_queue.qsize(), 15)
+
+    def test_empty_queue_only_reschedules(self):
+        toolbox = make_toolbox()
+        toolbox.process_log_queue()
+        self.assertEqual(toolbox.console_text.inserts, [])
+        self.assertEqual(len(toolbox.root.scheduled), 1)
+
+
+class ConsoleHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.directory = temp.name
+
+    def test_trimmed_lines_are_kept_in_order(self):
+        toolbox = make_toolbox(console_max_lines=100)
+        toolbox.console_history = ConsoleHistory(self.directory)
+        for i in range(500):
+            toolbox.log_message(f"line {i}")
+            if i % 50 == 49:
+                toolbox.process_log_queue()
+        lines = toolbox.console_text.text.splitlines()
+        self.assertLessEqual(len(lines), 110)
+        self.assertTrue(lines[-1].endswith("line 499"))
+        history = "".join(toolbox.console_history.iter_chunks()).splitlines() + lines
+        self.assertEqual([line.rsplit(" ", 1)[1] for line in history], [str(i) for i in range(500)])
+
+    def test_rotation_drops_oldest_and_counts_it(self):
+        history = ConsoleHistory(self.directory, max_bytes=100, backup_count=2)
+        for i in range(10):
+            history.spill(f"{i}".ljust(59) + "\n")
+        # 每个文件写满两段后滚动，只保留两个备份，最早的六段被丢弃
+        self.assertEqual(history.dropped_bytes, 6 * 60)
+        kept = "".join(history.iter_chunks()).split()
+        self.assertEqual(kept, [str(i) for i in range(6, 10)])
+        history.clear()
+        self.assertEqual(history.dropped_bytes, 0)
+        self.assertEqual(list(history.iter_chunks()), [])
+
+    def test_startup_removes_files_of_exited_processes(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        names = [f"console_{process.pid}.log", f"console_{process.pid}.log.2",
+                 f"console_{os.getppid()}.log", "console_notes.log", "other.txt"]
+        for name in names:
+            with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+                f.write("old")
+        ConsoleHistory(self.directory)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         sorted([f"console_{os.getppid()}.log", "console_notes.log", "other.txt"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
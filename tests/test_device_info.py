@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备信息收集脚本、输出解析与缓存测试
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (DEVICE_INFO_PROPS, DEVICE_INFO_SECTION, DeviceInfoCache, build_device_info_script,
+                  format_device_info, parse_device_info)
+
+
+def make_output(props, battery=None, storage=None, memory=None):
+    """按脚本格式拼出设备端的输出，None表示未查询该部分"""
+    lines = [f"{DEVICE_INFO_SECTION}props"] + [f"{prop}={value}" for prop, value in props.items()]
+    for section, text in (("battery", battery), ("storage", storage), ("memory", memory)):
+        if text is not None:
+            lines.append(f"{DEVICE_INFO_SECTION}{section}")
+            lines += text.splitlines()
+    return "\n".join(lines) + "\n"
+
+
+class DeviceInfoScriptTest(unittest.TestCase):
+
+    def test_full_script_reads_all_props_and_sections(self):
+        script = build_device_info_script()
+        for prop, _desc in DEVICE_INFO_PROPS:
+            self.assertIn(prop, script)
+        self.assertIn("ro.build.fingerprint", script)
+        for command in ("dumpsys battery", "df /sdcard", "/proc/meminfo"):
+            self.assertIn(command, script)
+
+    def test_fingerprint_only_script(self):
+        script = build_device_info_script(False, ())
+        self.assertIn("for p in ro.build.fingerprint;", script)
+        self.assertNotIn("ro.product.model", script)
+        self.assertNotIn("dumpsys", script)
+
+
+class ParseDeviceInfoTest(unittest.TestCase):
+
+    def test_parse_all_sections(self):
+        output = make_output(
+            {"ro.product.model": "Pixel 7", "ro.build.version.release": "14", "ro.build.fingerprint": "g/p:14/x:user"},
+            battery="Current Battery Service state:\n  AC powered: false\n  level: 87\n  scale: 100",
+            storage="Filesystem     1K-blocks    Used Available Use% Mounted on\n"
+                    "/dev/fuse      118410624 5242880 113167744   5% /storage/emulated",
+            memory="MemTotal:        7812340 kB\nMemFree:          512000 kB\nMemAvailable:    3000000 kB")
+        info = parse_device_info(output)
+        self.assertEqual(info["props"]["ro.product.model"], "Pixel 7")
+        self.assertEqual(info["props"]["ro.build.fingerprint"], "g/p:14/x:user")
+        self.assertEqual(info["battery_level"], "87")
+        self.assertEqual(info["storage"], {"total": 115635, "used": 5120, "free": 110515})
+        self.assertEqual(info["memory"], {"total": 7629, "used": 7629 - 500, "free": 500})
+
+    def test_sections_not_queried_are_absent(self):
+        info = parse_device_info(make_output({"ro.build.fingerprint": "fp"}))
+        self.assertEqual(info, {"props": {"ro.build.fingerprint": "fp"}})
+
+    def test_failed_sections_are_none(self):
+        info = parse_device_info(make_output({}, battery="Can't find service: battery", storage="",
+                                             memory="cat: /proc/meminfo: Permission denied"))
+        self.assertEqual(info, {"props": {}, "battery_level": None, "storage": None, "memory": None})
+
+    def test_format_device_info(self):
+        text = format_device_info({"props": {"ro.product.model": "Pixel 7"}, "battery_level": "50", "storage": None})
+        self.assertIn("设备型号: Pixel 7", text)
+        self.assertIn("电池电量: 50%", text)
+        self.assertNotIn("存储空间", text)
+        self.assertIn("暂无设备信息", format_device_info(None))
+
+
+class DeviceInfoCacheTest(unittest.TestCase):
+
+    PROPS = {"ro.product.model": "Pixel 7", "ro.build.fingerprint": "google/panther:14/UP1A/1:user/release-keys"}
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.path = os.path.join(temp.name, "device_info.json")
+
+    def test_static_props_persist_by_fingerprint(self):
+        cache = DeviceInfoCache(self.path)
+        self.assertFalse(cache.has_static("emu-1"))
+        self.assertTrue(cache.update("emu-1", {"props": dict(self.PROPS), "battery_level": "80"}))
+
+        reloaded = DeviceInfoCache(self.path)
+        self.assertTrue(reloaded.has_static("emu-1"))
+        self.assertEqual(reloaded.fingerprint("emu-1"), self.PROPS["ro.build.fingerprint"])
+        # 动态信息不持久化
+        self.assertEqual(reloaded.get("emu-1"), {"props": self.PROPS})
+
+    def test_fingerprint_check_detects_reflash(self):
+        cache = DeviceInfoCache()
+        cache.update("emu-1", {"props": dict(self.PROPS)})
+        same = {"props": {"ro.build.fingerprint": self.PROPS["ro.build.fingerprint"]}}
+        self.assertTrue(cache.update("emu-1", same))
+        self.assertTrue(cache.has_static("emu-1"))
+
+        reflashed = {"props": {"ro.build.fingerprint": "google/panther:15/AP3A/2:user/release-keys"}, "memory": None}
+        self.assertFalse(cache.update("emu-1", reflashed))
+        self.assertFalse(cache.has_static("emu-1"))
+        # 同时查询到的动态信息仍然保留
+        self.assertIn("memory", cache.get("emu-1"))
+
+    def test_volatile_sections_expire(self):
+        cache = DeviceInfoCache()
+        self.assertEqual(cache.expired_sections("emu-1"), ["battery", "storage", "memory"])
+        with mock.patch("main.time.time", return_value=1000):
+            cache.update("emu-1", {"props": {}, "battery_level": "80", "storage": None, "memory": None})
+        with mock.patch("main.time.time", return_value=1040):
+            self.assertEqual(cache.expired_sections("emu-1"), ["memory"])
+        with mock.patch("main.time.time", return_value=1100):
+            self.assertEqual(cache.expired_sections("emu-1"), ["battery", "memory"])
+        cache.invalidate("emu-1")
+        self.assertEqual(len(cache.expired_sections("emu-1")), 3)
+
+    def test_devices_without_fingerprint_are_not_shared(self):
+        cache = DeviceInfoCache(self.path)
+        cache.update("emu-1", {"props": {"ro.product.model": "A", "ro.build.fingerprint": ""}})
+        cache.update("emu-2", {"props": {"ro.product.model": "B", "ro.build.fingerprint": ""}})
+        self.assertEqual(cache.get("emu-1")["props"]["ro.product.model"], "A")
+        self.assertEqual(cache.get("emu-2")["props"]["ro.product.model"], "B")
+        self.assertFalse(cache.has_static("emu-1"))
+        self.assertIsNone(DeviceInfoCache(self.path).get("emu-1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
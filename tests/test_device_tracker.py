@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备跟踪（host:track-devices 订阅、事件比较、断线重连）测试
+"""
+
+import os
+import queue
+import socket
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ADBServerClient, DeviceTracker
+
+
+def device_list(devices):
+    data = "".join(f"{serial}\t{state}\n" for serial, state in devices).encode("utf-8")
+    return b"%04x" % len(data) + data
+
+
+class TrackServer:
+    """只处理 host:track-devices 的adb server，每个订阅连接从 updates 队列取出要发送的内容
+
+    队列中的None表示关闭当前连接（模拟adb server重启）。
+    """
+
+    def __init__(self):
+        self.updates = queue.Queue()
+        self.subscriptions = 0
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(4)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self.sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _addr = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            header = conn.recv(4)
+            if not header or conn.recv(int(header, 16)) != b"host:track-devices":
+                return
+            self.subscriptions += 1
+            conn.sendall(b"OKAY")
+            while True:
+                update = self.updates.get()
+                if update is None:
+                    return
+                conn.sendall(update)
+
+
+class DeviceTrackerTest(unittest.TestCase):
+
+    def test_diff_devices(self):
+        events = DeviceTracker.diff_devices({"a": "device", "b": "device", "c": "offline"},
+                                            {"a": "device", "b": "unauthorized", "d": "device"})
+        self.assertEqual(sorted(events), [("connected", "d", "device"), ("disconnected", "c", "offline"),
+                                          ("state", "b", "unauthorized")])
+        self.assertEqual(DeviceTracker.diff_devices({"a": "device"}, {"a": "device"}), [])
+
+    def test_tracks_changes_and_reconnects(self):
+        server = TrackServer()
+        self.addCleanup(server.close)
+        client = ADBServerClient(port=server.port, timeout=2)
+        self.addCleanup(client.close)
+        changes = queue.Queue()
+        statuses = queue.Queue()
+        tracker = DeviceTracker(client, on_change=lambda devices, events: changes.put(events),
+                                on_status=statuses.put, reconnect_delay=0.1)
+        self.addCleanup(tracker.stop)
+        tracker.start()
+
+        self.assertTrue(statuses.get(timeout=2))
+        # 更新被拆成两次发送
+        update = device_list([("emu-1", "device"), ("emu-2", "offline")])
+        server.updates.put(update[:7])
+        server.updates.put(update[7:])
+        self.assertEqual(sorted(changes.get(timeout=2)),
+                         [("connected", "emu-1", "device"), ("connected", "emu-2", "offline")])
+        server.updates.put(device_list([("emu-1", "device"), ("emu-2", "device")]))
+        self.assertEqual(changes.get(timeout=2), [("state", "emu-2", "device")])
+
+        # adb server重启后重新订阅，只报告变化的部分
+        server.updates.put(None)
+        self.assertFalse(statuses.get(timeout=2))
+        self.assertTrue(statuses.get(timeout=2))
+        self.assertEqual(server.subscriptions, 2)
+        server.updates.put(device_list([("emu-1", "device")]))
+        self.assertEqual(changes.get(timeout=2), [("disconnected", "emu-2", "device")])
+        self.assertTrue(tracker.connected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件浏览器目录列表模型与目录缓存测试
+"""
+
+import os
+import stat
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ADBToolbox, DirectoryCache, FileListModel, SyncEntry
+
+
+def file_entry(name, size=0, mtime=0):
+    return SyncEntry(name, stat.S_IFREG | 0o644, size, mtime)
+
+
+def dir_entry(name, mtime=0):
+    return SyncEntry(name, stat.S_IFDIR | 0o755, 4096, mtime)
+
+
+class FileListModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = FileListModel()
+        self.model.set_entries([
+            file_entry("b.txt", 300, 30),
+            dir_entry("Music", 10),
+            file_entry("A.jpg", 100, 20),
+            dir_entry("alarms", 40),
+            file_entry("c.mp4", 200, 10),
+        ], has_parent=True)
+
+    def names(self):
+        return [self.model.entry(position).name for position in range(1, len(self.model))]
+
+    def test_directories_first_sorted_by_name(self):
+        self.assertEqual(len(self.model), 6)
+        self.assertIsNone(self.model.entry(0))
+        self.assertEqual(self.model.row(0), ("../", ("", "", "")))
+        self.assertEqual(self.names(), ["alarms", "Music", "A.jpg", "b.txt", "c.mp4"])
+
+    def test_sort_by_size_and_time(self):
+        self.model.sort("size", reverse=True)
+        # 大小相同的目录保持原来的顺序
+        self.assertEqual(self.names(), ["Music", "alarms", "b.txt", "c.mp4", "A.jpg"])
+        self.model.sort("mtime", reverse=False)
+        self.assertEqual(self.names(), ["Music", "alarms", "c.mp4", "A.jpg", "b.txt"])
+        # 替换内容时保留当前排序方式
+        self.model.set_entries([file_entry("x", mtime=5), file_entry("y", mtime=1)])
+        self.assertEqual([self.model.entry(i).name for i in range(len(self.model))], ["y", "x"])
+
+    def test_positions_and_rows(self):
+        self.assertEqual(self.model.positions_of({"Music", "c.mp4"}), {2, 5})
+        self.assertEqual(self.model.positions_of({None}), {0})
+        name, (size, _date, mode) = self.model.row(1)
+        self.assertEqual((name, size, mode), ("alarms/", 4096, "drwxr-xr-x"))
+        self.assertEqual(self.model.row(3)[0], "A.jpg")
+
+    def test_large_listing(self):
+        model = FileListModel()
+        model.set_entries([file_entry(f"IMG_{i:06d}.jpg", i) for i in range(200000, 0, -1)])
+        self.assertEqual(len(model), 200000)
+        self.assertEqual(model.entry(0).name, "IMG_000001.jpg")
+        self.assertEqual(model.entry(199999).size, 200000)
+
+
+class DirectoryCacheTest(unittest.TestCase):
+
+    def test_diff(self):
+        old = [file_entry("a", 1, 10), file_entry("b", 2, 10), dir_entry("c")]
+        new = [file_entry("a", 1, 10), file_entry("b", 5, 10), file_entry("d")]
+        self.assertEqual(DirectoryCache.diff(old, new), (["d"], ["c"], ["b"]))
+
+    def test_evicts_least_recently_used_directories(self):
+        cache = DirectoryCache(max_dirs=2)
+        cache.put("emu-1", "/a", 1, [file_entry("x")])
+        cache.put("emu-1", "/b", 1, [])
+        cache.get("emu-1", "/a")
+        cache.put("emu-1", "/c", 1, [])
+        self.assertIsNone(cache.get("emu-1", "/b"))
+        self.assertIsNotNone(cache.get("emu-1", "/a"))
+
+    def test_entry_limit_and_invalidate(self):
+        cache = DirectoryCache(max_entries=3)
+        cache.put("emu-1", "/a", 1, [file_entry("x"), file_entry("y")])
+        cache.put("emu-2", "/a", 1, [file_entry("z")])
+        cache.put("emu-1", "/b", 1, [file_entry("w")])
+        self.assertIsNone(cache.get("emu-1", "/a"))
+        cache.invalidate("emu-1")
+        self.assertIsNone(cache.get("emu-1", "/b"))
+        self.assertIsNotNone(cache.get("emu-2", "/a"))
+        # 只剩一个目录时即使超出条目上限也保留
+        cache.put("emu-2", "/big", 1, [file_entry(str(i)) for i in range(10)])
+        self.assertIsNotNone(cache.get("emu-2", "/big"))
+
+
+class FakeSync:
+    """记录请求的sync会话，links 为 {链接路径: 目标状态}"""
+
+    def __init__(self, device):
+        self.device = device
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def stat(self, path):
+        self.device.requests.append(("stat", path))
+        return dir_entry(path, self.device.mtime)
+
+    def list(self, path):
+        self.device.requests.append(("list", path))
+        return list(self.device.entries)
+
+    def stat_many(self, paths):
+        self.device.requests.append(("stat_many", paths))
+        return [self.device.links.get(path) for path in paths]
+
+
+class FakeClient:
+    def __init__(self, entries, links=None, mtime=100):
+        self.entries = entries
+        self.links = links or {}
+        self.mtime = mtime
+        self.requests = []
+
+    def open_sync(self, serial):
+        return FakeSync(self)
+
+    def stat_path(self, serial, path):
+        self.requests.append(("stat", path))
+        return dir_entry(path, self.mtime)
+
+
+def make_toolbox(client):
+    """不创建窗口，只准备目录列表相关属性的ADBToolbox"""
+    toolbox = ADBToolbox.__new__(ADBToolbox)
+    toolbox.settings = {"use_native_adb": True}
+    toolbox.native_adb_retry_at = 0
+    toolbox.adb_client = client
+    toolbox.dir_cache = DirectoryCache()
+    return toolbox
+
+
+class GetDeviceDirTest(unittest.TestCase):
+
+    def test_symlinks_resolved_in_one_batch(self):
+        link = stat.S_IFLNK | 0o777
+        client = FakeClient([SyncEntry("sdcard", link, 21, 0), SyncEntry("vendor", link, 11, 0),
+                             SyncEntry("init.rc", link, 30, 0), file_entry("default.prop")],
+                            links={"/sdcard": dir_entry("sdcard"), "/vendor": dir_entry("vendor"),
+                                   "/init.rc": file_entry("init.rc")})
+        entries, cached = make_toolbox(client).get_device_dir("/")
+        self.assertFalse(cached)
+        self.assertEqual([stat.S_ISDIR(entry.mode) for entry in entries], [True, True, False, False])
+        self.assertTrue(stat.S_ISLNK(entries[2].mode))
+        self.assertEqual(client.requests, [("stat", "/"), ("list", "/"),
+                                           ("stat_many", ["/sdcard", "/vendor", "/init.rc"])])
+
+    def test_mtime_shortcut_only_within_trust_window(self):
+        client = FakeClient([file_entry("a.txt", 1)])
+        toolbox = make_toolbox(client)
+        with mock.patch("main.time.time", return_value=1000):
+            toolbox.get_device_dir("/sdcard", "emu-1")
+        client.entries = [file_entry("a.txt", 2)]
+
+        client.requests = []
+        with mock.patch("main.time.time", return_value=1000 + ADBToolbox.DIR_CACHE_TRUST - 1):
+            entries, cached = toolbox.get_device_dir("/sdcard", "emu-1")
+        self.assertTrue(cached)
+        self.assertEqual(entries[0].size, 1)
+        self.assertEqual(client.requests, [("stat", "/sdcard")])
+
+        # 超过信任时间后重新列出，原地修改的文件大小得到更新
+        with mock.patch("main.time.time", return_value=1000 + ADBToolbox.DIR_CACHE_TRUST):
+            entries, cached = toolbox.get_device_dir("/sdcard", "emu-1")
+        self.assertFalse(cached)
+        self.assertEqual(entries[0].size, 2)
+
+    def test_changed_directory_mtime_relists(self):
+        client = FakeClient([file_entry("a.txt")])
+        toolbox = make_toolbox(client)
+        toolbox.get_device_dir("/sdcard", "emu-1")
+        client.mtime = 200
+        client.entries = [file_entry("a.txt"), file_entry("b.txt")]
+        entries, cached = toolbox.get_device_dir("/sdcard", "emu-1")
+        self.assertFalse(cached)
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(toolbox.dir_cache.get("emu-1", "/sdcard")[0], 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多设备执行的结果汇总测试
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import FanOutResults
+
+
+class FanOutResultsTest(unittest.TestCase):
+
+    def test_counts_and_completion(self):
+        results = FanOutResults(["emu-1", "emu-2", "emu-3"])
+        self.assertEqual(results.counts(), (0, 0, 0, 3))
+        self.assertTrue(results.record("emu-1", True, "ok"))
+        self.assertTrue(results.record("emu-2", False, "error: device offline"))
+        self.assertFalse(results.finished)
+        self.assertTrue(results.summary().startswith("成功 1 / 失败 1 / 已取消 0 / 未完成 1 |"))
+        self.assertTrue(results.record("emu-3", None, ""))
+        self.assertTrue(results.finished)
+        message, level = results.completion_message()
+        self.assertTrue(message.startswith("多设备执行完成: 成功 1/3，已取消 1，"))
+        self.assertEqual(level, "WARNING")
+        self.assertEqual(results.outputs["emu-2"], "error: device offline")
+
+    def test_late_result_after_cancel_is_ignored(self):
+        results = FanOutResults(["emu-1"])
+        self.assertTrue(results.record("emu-1", None, ""))
+        # 取消后工作线程仍可能送回结果，只记录第一次
+        self.assertFalse(results.record("emu-1", True, "ok"))
+        self.assertEqual(results.counts(), (0, 0, 1, 0))
+        self.assertFalse(results.record("emu-9", True, ""))
+
+    def test_all_success(self):
+        results = FanOutResults(["emu-1", "emu-2"])
+        results.record("emu-2", True, "")
+        results.record("emu-1", True, "")
+        message, level = results.completion_message()
+        self.assertNotIn("已取消", message)
+        self.assertEqual(level, "SUCCESS")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地文件缓存（按容量淘汰最久未使用的文件、占用中的文件保留、索引持久化）测试
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import LRUFileCache
+
+
+class LRUFileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.directory = temp.name
+
+    def add(self, cache, name, size):
+        key = LRUFileCache.make_key("emu-1", f"/sdcard/{name}", size)
+        path = cache.path_for(key, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        cache.put(key, path, {"remote": f"/sdcard/{name}"})
+        # 保证访问时间的先后顺序
+        time.sleep(0.02)
+        return key
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUFileCache(self.directory, 250)
+        first = self.add(cache, "a.jpg", 100)
+        second = self.add(cache, "b.jpg", 100)
+        self.assertIsNotNone(cache.get(first))
+        time.sleep(0.02)
+        third = self.add(cache, "c.jpg", 100)
+        self.assertIsNone(cache.get(second))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, second[:2], second)))
+        self.assertIsNotNone(cache.get(first))
+        self.assertIsNotNone(cache.get(third))
+        self.assertEqual(cache.total_size(), 200)
+
+    def test_keeps_new_item_larger_than_capacity(self):
+        cache = LRUFileCache(self.directory, 50)
+        key = self.add(cache, "big.mp4", 100)
+        self.assertTrue(cache.get(key).endswith("big.mp4"))
+        self.assertEqual(cache.total_size(), 100)
+
+    def test_file_in_use_is_kept_until_next_eviction(self):
+        cache = LRUFileCache(self.directory, 150)
+        first = self.add(cache, "open.pdf", 100)
+        real_rmtree = shutil.rmtree
+
+        def locked(path, *args, **kwargs):
+            if first in path:
+                raise PermissionError("file is being used by another process")
+            return real_rmtree(path, *args, **kwargs)
+
+        with mock.patch("main.shutil.rmtree", side_effect=locked):
+            second = self.add(cache, "b.pdf", 100)
+        # 占用中的文件保留在索引中，容量暂时超出
+        self.assertIsNotNone(cache.get(first))
+        self.assertEqual(cache.total_size(), 200)
+
+        time.sleep(0.02)
+        cache.get(second)
+        third = self.add(cache, "c.pdf", 10)
+        self.assertIsNone(cache.get(first))
+        self.assertIsNotNone(cache.get(third))
+        self.assertEqual(cache.total_size(), 110)
+
+    def test_index_survives_restart(self):
+        cache = LRUFileCache(self.directory, 1000)
+        key = self.add(cache, "a.txt", 10)
+        cache.flush()
+        reloaded = LRUFileCache(self.directory, 1000)
+        self.assertEqual(reloaded.get(key), cache.get(key))
+        self.assertEqual(reloaded.total_size(), 10)
+
+    def test_missing_file_is_a_miss(self):
+        cache = LRUFileCache(self.directory, 1000)
+        key = self.add(cache, "a.txt", 10)
+        os.remove(cache.get(key))
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.total_size(), 0)
+
+    def test_discard_only_removes_unregistered_items(self):
+        cache = LRUFileCache(self.directory, 1000)
+        kept = self.add(cache, "a.txt", 10)
+        partial = LRUFileCache.make_key("emu-1", "/sdcard/partial.bin")
+        path = cache.path_for(partial, "partial.bin")
+        with open(path, "wb") as f:
+            f.write(b"partial")
+        cache.discard(partial)
+        cache.discard(kept)
+        self.assertFalse(os.path.exists(os.path.dirname(path)))
+        self.assertIsNotNone(cache.get(kept))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备文件搜索索引与存储空间统计测试
+"""
+
+import os
+import posixpath
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ADBError, DeviceFileIndex, DiskUsageTree, SyncEntry, TransferCancelled
+
+
+class FakeSync:
+    def __init__(self, device):
+        self.device = device
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def stat(self, path):
+        return self.device.nodes.get(path)
+
+    def list(self, path):
+        self.device.listed.append(path)
+        return [SyncEntry(posixpath.basename(child), entry.mode, entry.size, entry.mtime)
+                for child, entry in self.device.nodes.items()
+                if child != path and posixpath.dirname(child) == path]
+
+    def stat_many(self, paths):
+        self.device.batches.append(list(paths))
+        return [self.device.nodes.get(path) for path in paths]
+
+
+class FakeDevice:
+    """在内存中保存目录树，路径 -> SyncEntry"""
+
+    def __init__(self):
+        self.nodes = {}
+        self.listed = []
+        self.batches = []
+
+    def add_dir(self, path, mtime=1):
+        self.nodes[path] = SyncEntry(path, stat.S_IFDIR | 0o755, 4096, mtime)
+
+    def add_file(self, path, size, mtime=1):
+        self.nodes[path] = SyncEntry(path, stat.S_IFREG | 0o644, size, mtime)
+
+    def open_sync(self, serial):
+        return FakeSync(self)
+
+
+def make_device():
+    device = FakeDevice()
+    device.add_dir("/sdcard")
+    device.add_dir("/sdcard/DCIM")
+    device.add_dir("/sdcard/DCIM/Camera")
+    device.add_dir("/sdcard/Music")
+    device.add_file("/sdcard/DCIM/Camera/IMG_0001.jpg", 3000)
+    device.add_file("/sdcard/DCIM/Camera/VID_0002.mp4", 90000)
+    device.add_file("/sdcard/Music/song.MP3", 5000)
+    device.add_file("/sdcard/notes.txt", 10)
+    return device
+
+
+class DeviceFileIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.path = os.path.join(temp.name, "index", "emu-1.json")
+
+    def test_refresh_and_search(self):
+        device = make_device()
+        index = DeviceFileIndex(self.path, "emu-1", "/sdcard/")
+        seen = []
+        self.assertEqual(index.refresh(device, on_dir=lambda directory, entries: seen.append(directory)), (4, 0))
+        self.assertEqual(sorted(seen), ["/sdcard", "/sdcard/DCIM", "/sdcard/DCIM/Camera", "/sdcard/Music"])
+        self.assertEqual(index.file_count, 7)
+
+        results, total = index.search("mp")
+        self.assertEqual(total, 2)
+        self.assertEqual(sorted(path for path, *_rest in results),
+                         ["/sdcard/DCIM/Camera/VID_0002.mp4", "/sdcard/Music/song.MP3"])
+        results, _total = index.search("*.jpg")
+        self.assertEqual(results, [("/sdcard/DCIM/Camera/IMG_0001.jpg", 3000, 1, False)])
+        # 按大小过滤时排除目录
+        results, _total = index.search("", min_size=4000)
+        self.assertEqual(sorted(size for _path, size, _mtime, _is_dir in results), [5000, 90000])
+        results, total = index.search("", limit=2)
+        self.assertEqual((len(results), total), (2, 7))
+
+    def test_unchanged_dirs_reused_and_files_restated(self):
+        device = make_device()
+        DeviceFileIndex(self.path, "emu-1", "/sdcard").refresh(device)
+        # 文件原地修改不改变目录的修改时间，新建文件会改变
+        device.add_file("/sdcard/DCIM/Camera/VID_0002.mp4", 120000, mtime=5)
+        device.add_file("/sdcard/Music/new.flac", 700)
+        device.add_dir("/sdcard/Music", mtime=2)
+        device.listed = []
+
+        index = DeviceFileIndex(self.path, "emu-1", "/sdcard")
+        self.assertEqual(index.file_count, 7)
+        self.assertEqual(index.refresh(device), (1, 3))
+        self.assertEqual(device.listed, ["/sdcard/Music"])
+        results, _total = index.search("vid_")
+        self.assertEqual(results, [("/sdcard/DCIM/Camera/VID_0002.mp4", 120000, 5, False)])
+        self.assertEqual(index.search("new.flac")[1], 1)
+        # 每一层复用的目录只做一次批量STAT
+        self.assertEqual(len(device.batches), 3)
+
+        device.listed = []
+        self.assertEqual(index.refresh(device, force=True), (4, 0))
+        self.assertEqual(len(device.listed), 4)
+
+    def test_removed_directory_dropped(self):
+        device = make_device()
+        index = DeviceFileIndex(self.path, "emu-1", "/sdcard")
+        index.refresh(device)
+        for path in [path for path in device.nodes if path.startswith("/sdcard/Music")]:
+            del device.nodes[path]
+        device.add_dir("/sdcard", mtime=2)
+        index.refresh(device)
+        self.assertNotIn("/sdcard/Music", index.dirs)
+        self.assertEqual(index.search("song")[1], 0)
+
+    def test_missing_root_and_other_root_file(self):
+        device = make_device()
+        DeviceFileIndex(self.path, "emu-1", "/sdcard").refresh(device)
+        index = DeviceFileIndex(self.path, "emu-1", "/sdcard/DCIM")
+        self.assertEqual((index.dirs, index.file_count), ({}, 0))
+        with self.assertRaises(ADBError):
+            DeviceFileIndex(self.path, "emu-1", "/storage/missing").refresh(device)
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        index = DeviceFileIndex(self.path, "emu-1", "/sdcard")
+        with self.assertRaises(TransferCancelled):
+            index.refresh(make_device(), cancel_event=cancel)
+        self.assertIsNone(index.built)
+
+
+class DiskUsageTreeTest(unittest.TestCase):
+
+    def test_sizes_accumulate_into_parents(self):
+        tree = DiskUsageTree("/sdcard/")
+        tree.add_dir("/sdcard", [["DCIM", 4096, 1, True], ["notes.txt", 10, 1, False]])
+        self.assertEqual(tree.total("/sdcard"), (10, 1))
+        tree.add_dir("/sdcard/DCIM/Camera", [["a.jpg", 3000, 1, False], ["b.mp4", 90000, 1, False]])
+        self.assertEqual(tree.total("/sdcard/DCIM/Camera"), (93000, 2))
+        # 尚未扫描的中间目录也得到累计值
+        self.assertEqual(tree.total("/sdcard/DCIM"), (93000, 2))
+        self.assertEqual(tree.total("/sdcard"), (93010, 3))
+        self.assertEqual(tree.total("/sdcard/Music"), (0, 0))
+        self.assertEqual(tree.total("/"), (0, 0))
+        self.assertEqual(tree.version, 2)
+
+    def test_children_sorted_by_size(self):
+        tree = DiskUsageTree("/sdcard")
+        tree.add_dir("/sdcard", [["DCIM", 4096, 1, True], ["Music", 4096, 1, True], ["big.zip", 50000, 1, False]])
+        tree.add_dir("/sdcard/DCIM", [["a.jpg", 90000, 1, False]])
+        tree.add_dir("/sdcard/Music", [["a.mp3", 100, 1, False]])
+        self.assertEqual(tree.children("/sdcard"), [
+            ("DCIM", "/sdcard/DCIM", 90000, 1, True),
+            ("big.zip", "/sdcard/big.zip", 50000, None, False),
+            ("Music", "/sdcard/Music", 100, 1, True),
+        ])
+        self.assertEqual(tree.children("/sdcard/Pictures"), [])
+
+    def test_from_index(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        index = DeviceFileIndex(os.path.join(temp.name, "emu-1.json"), "emu-1", "/sdcard")
+        index.refresh(make_device())
+        tree = DiskUsageTree.from_index(index)
+        self.assertEqual(tree.root, "/sdcard")
+        self.assertEqual(tree.total("/sdcard"), (98010, 4))
+        self.assertEqual([row[0] for row in tree.children("/sdcard")], ["DCIM", "Music", "notes.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
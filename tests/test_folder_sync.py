@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件夹增量同步计划（大小/修改时间比较、哈希确认、删除多余文件）测试
+"""
+
+import hashlib
+import os
+import shlex
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import FolderSync, SyncEntry
+
+
+class FakeSync:
+    """以本地目录模拟设备文件系统的sync会话"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def _entry(self, path, name):
+        st = os.stat(path)
+        return SyncEntry(name, st.st_mode, st.st_size, int(st.st_mtime))
+
+    def stat(self, path):
+        local = os.path.join(self.root, path.lstrip("/"))
+        return self._entry(local, os.path.basename(path)) if os.path.exists(local) else None
+
+    def list(self, path):
+        local = os.path.join(self.root, path.lstrip("/"))
+        return [self._entry(os.path.join(local, name), name) for name in os.listdir(local)]
+
+
+class FakeClient:
+    def __init__(self, root):
+        self.root = root
+        self.commands = []
+
+    def open_sync(self, serial):
+        return FakeSync(self.root)
+
+    def shell_stream(self, serial, command, on_output, cancel_event=None):
+        self.commands.append(command)
+        args = shlex.split(command)
+        for path in args[1:]:
+            with open(os.path.join(self.root, path.lstrip("/")), "rb") as f:
+                on_output("stdout", f"{hashlib.md5(f.read()).hexdigest()}  {path}\n".encode())
+        return 0
+
+
+class FolderSyncPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.local = os.path.join(temp.name, "local")
+        self.device = os.path.join(temp.name, "device")
+        self.remote = os.path.join(self.device, "sdcard", "sync")
+
+        self.write(self.local, "same.txt", b"same", 1000)
+        self.write(self.remote, "same.txt", b"same", 1000)
+        self.write(self.local, "size.txt", b"longer content", 1000)
+        self.write(self.remote, "size.txt", b"short", 1000)
+        # 内容相同，只是修改时间不同
+        self.write(self.local, "touched.txt", b"abcd", 2000)
+        self.write(self.remote, "touched.txt", b"abcd", 1000)
+        # 大小相同但内容不同
+        self.write(self.local, "edited.txt", b"abcd", 2000)
+        self.write(self.remote, "edited.txt", b"wxyz", 1000)
+        self.write(self.local, "dir/new file.txt", b"new", 1000)
+        self.write(self.remote, "extra/old.txt", b"old", 1000)
+
+    @staticmethod
+    def write(root, relative, data, mtime):
+        path = os.path.join(root, *relative.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        os.utime(path, (mtime, mtime))
+
+    def make_sync(self, direction, delete_extra):
+        client = FakeClient(self.device)
+        return client, FolderSync(client, "emu-1", self.local, "/sdcard/sync/", direction, delete_extra)
+
+    def test_push_plan(self):
+        client, folder_sync = self.make_sync("push", True)
+        plan = folder_sync.plan()
+        self.assertEqual(plan["new"], ["dir/new file.txt"])
+        self.assertEqual(plan["changed"], ["edited.txt", "size.txt"])
+        self.assertEqual(plan["deleted"], ["extra/old.txt"])
+        self.assertEqual(plan["hashed"], 2)
+        self.assertEqual(plan["unchanged"], 2)
+        self.assertEqual(plan["transfer_bytes"], len(b"new") + len(b"abcd") + len(b"longer content"))
+        # 只对大小相同、修改时间不同的文件计算哈希
+        self.assertEqual(len(client.commands), 1)
+        self.assertEqual(sorted(shlex.split(client.commands[0])[1:]),
+                         ["/sdcard/sync/edited.txt", "/sdcard/sync/touched.txt"])
+
+    def test_pull_plan_keeps_extra_files_by_default(self):
+        _client, folder_sync = self.make_sync("pull", False)
+        plan = folder_sync.plan()
+        self.assertEqual(plan["new"], ["extra/old.txt"])
+        self.assertEqual(plan["changed"], ["edited.txt", "size.txt"])
+        self.assertEqual(plan["deleted"], [])
+        self.assertEqual(plan["source"]["size.txt"], (5, 1000))
+
+    def test_missing_remote_folder_is_all_new(self):
+        client = FakeClient(self.device)
+        folder_sync = FolderSync(client, "emu-1", self.local, "/sdcard/missing", "push", True)
+        plan = folder_sync.plan()
+        self.assertEqual(len(plan["new"]), 5)
+        self.assertEqual(plan["deleted"], [])
+        self.assertEqual(client.commands, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令输出分行与批量回调测试
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import OutputLineBatcher
+
+
+class OutputLineBatcherTest(unittest.TestCase):
+
+    def make(self, **kwargs):
+        batches = []
+        batcher = OutputLineBatcher(lambda stream, lines: batches.append((stream, list(lines))), **kwargs)
+        return batcher, batches
+
+    def test_lines_split_across_chunks(self):
+        batcher, batches = self.make(interval=60)
+        data = "第一行\r\n第二行\n未完".encode("utf-8")
+        # 在多字节字符中间切开
+        for i in range(0, len(data), 4):
+            batcher.feed("stdout", data[i:i + 4])
+        batcher.flush()
+        self.assertEqual(batches, [("stdout", ["第一行", "第二行"])])
+        batcher.flush(final=True)
+        self.assertEqual(batches[-1], ("stdout", ["未完"]))
+
+    def test_batches_by_line_count(self):
+        batcher, batches = self.make(max_lines=3, interval=60)
+        batcher.feed("stdout", b"1\n2\n")
+        self.assertEqual(batches, [])
+        batcher.feed("stdout", b"3\n4")
+        self.assertEqual(batches, [("stdout", ["1", "2", "3"])])
+
+    def test_batches_by_interval(self):
+        batcher, batches = self.make(interval=0)
+        batcher.feed("stdout", b"a\n")
+        self.assertEqual(batches, [("stdout", ["a"])])
+
+    def test_streams_are_kept_apart(self):
+        batcher, batches = self.make(interval=60)
+        batcher.feed("stdout", b"out")
+        batcher.feed("stderr", b"err\n")
+        batcher.feed("stdout", b" line\n")
+        batcher.flush(final=True)
+        self.assertEqual(sorted(batches), [("stderr", ["err"]), ("stdout", ["out line"])])
+
+
+if __name__ == "__main__":
+    unittest.main()
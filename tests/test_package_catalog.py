@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+应用目录（pm list / dumpsys package 解析与增量刷新）测试
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import PackageCatalog, PackageDumpParser, parse_package_list
+
+
+def make_dump(packages):
+    """生成 dumpsys package 的 Packages: 部分"""
+    lines = ["Packages:"]
+    for package, version in packages:
+        lines += [
+            f"  Package [{package}] (1a2b3c):",
+            "    userId=10100",
+            f"    codePath=/data/app/{package}-1",
+            f"    versionCode={version} minSdk=21 targetSdk=33",
+            f"    versionName={version}.0",
+            "    flags=[ HAS_CODE ALLOW_CLEAR_USER_DATA ]",
+            "    lastUpdateTime=2024-01-01 10:00:00",
+        ]
+    lines.append("Hidden system packages:")
+    return "\n".join(lines) + "\n"
+
+
+class FakeDevice:
+    """模拟设备端的 pm list 与 dumpsys，记录执行过的命令
+
+    with_versions 为False时模拟不支持 -U/--show-versioncode 的旧版本 pm。
+    """
+
+    def __init__(self, packages, with_versions=True, fingerprint="vendor/device:14/UP1A/1:user/release-keys"):
+        self.packages = dict(packages)
+        self.with_versions = with_versions
+        self.fingerprint = fingerprint
+        self.commands = []
+
+    def run_shell(self, command):
+        self.commands.append(command)
+        lines = [self.fingerprint]
+        for package, version in sorted(self.packages.items()):
+            line = f"package:/data/app/{package}-1/base.apk={package}"
+            if self.with_versions:
+                line += f" versionCode:{version} uid:10100"
+            lines.append(line)
+        return 0, "\n".join(lines) + "\n", ""
+
+    def stream_shell(self, command, on_lines):
+        self.commands.append(command)
+        if command == PackageCatalog.DUMP_COMMAND:
+            packages = sorted(self.packages.items())
+        else:
+            packages = [(package, version) for package, version in sorted(self.packages.items())
+                        if f"'{package}'" in command or f" {package} " in f" {command} " or f" {package};" in command]
+        on_lines("stdout", make_dump(packages).splitlines())
+
+
+class ParsePackageListTest(unittest.TestCase):
+
+    def test_versioned_listing(self):
+        text = ("package:/data/app/~~Xy==/com.example.app-Ab==/base.apk=com.example.app versionCode:42 uid:10123\n"
+                "package:/system/priv-app/SettingsProvider/SettingsProvider.apk=com.android.providers.settings"
+                " versionCode:33 uid:1000,10500\n"
+                "Error: unknown option\n")
+        first, second = parse_package_list(text)
+        self.assertEqual(first.package, "com.example.app")
+        self.assertEqual(first.apk_path, "/data/app/~~Xy==/com.example.app-Ab==/base.apk")
+        self.assertEqual((first.version_code, first.uid, first.label), (42, 10123, "app"))
+        # 共享UID时只取第一个，系统应用名取APK所在目录
+        self.assertEqual((second.uid, second.label), (1000, "SettingsProvider"))
+
+    def test_plain_listing(self):
+        package, = parse_package_list("package:/data/app/com.example.a-1/base.apk=com.example.a\r\n")
+        self.assertEqual(package.apk_path, "/data/app/com.example.a-1/base.apk")
+        self.assertIsNone(package.version_code)
+        self.assertIsNone(package.uid)
+
+
+class PackageDumpParserTest(unittest.TestCase):
+
+    def parse(self, text):
+        parser = PackageDumpParser()
+        results = [parser.feed(line) for line in text.splitlines()]
+        results.append(parser.finish())
+        return [fields for fields in results if fields]
+
+    def test_fields_from_packages_section(self):
+        text = make_dump([("com.example.a", 7), ("com.example.b", 8)]).replace(
+            "Hidden system packages:\n",
+            "Hidden system packages:\n  Package [com.example.a] (9f9f):\n    versionCode=1 minSdk=21\n")
+        first, second = self.parse(text)
+        self.assertEqual(first, {"package": "com.example.a", "uid": 10100, "code_path": "/data/app/com.example.a-1",
+                                 "version_code": 7, "version_name": "7.0", "system": False,
+                                 "last_update": "2024-01-01 10:00:00"})
+        self.assertEqual(second["package"], "com.example.b")
+        self.assertEqual(second["version_code"], 8)
+
+    def test_system_package(self):
+        text = ("Packages:\n"
+                "  Package [android] (1):\n"
+                "    userId=1000\n"
+                "    versionCode=34 minSdk=34 targetSdk=34\n"
+                "    flags=[ SYSTEM HAS_CODE PERSISTENT ]\n"
+                "    User 0: ceDataInode=1 installed=true hidden=false\n"
+                "      lastDisabledCaller: null\n")
+        self.assertEqual(self.parse(text), [{"package": "android", "uid": 1000, "version_code": 34, "system": True}])
+
+
+class PackageCatalogRefreshTest(unittest.TestCase):
+
+    def check_second_refresh_is_incremental(self, with_versions, count):
+        packages = {f"com.example.app{i}": 100 + i for i in range(count)}
+        device = FakeDevice(packages, with_versions)
+        catalog = PackageCatalog()
+
+        first = catalog.refresh(device.run_shell, device.stream_shell)
+        self.assertEqual(first["added"], count)
+        self.assertTrue(first["full"])
+        self.assertEqual(catalog.packages["com.example.app3"].version_code, 103)
+        self.assertEqual(catalog.packages["com.example.app3"].version_name, "103.0")
+
+        device.commands = []
+        second = catalog.refresh(device.run_shell, device.stream_shell)
+        self.assertEqual(second, {"added": 0, "removed": 0, "changed": 0, "full": False})
+        # 没有变化时只执行一次 pm list
+        self.assertEqual(device.commands, [PackageCatalog.LIST_COMMAND])
+        self.assertEqual(catalog.packages["com.example.app3"].version_name, "103.0")
+
+    def test_refresh_twice_with_versioned_listing(self):
+        self.check_second_refresh_is_incremental(True, 60)
+
+    def test_refresh_twice_with_plain_listing(self):
+        self.check_second_refresh_is_incremental(False, 60)
+        self.check_second_refresh_is_incremental(False, 10)
+
+    def test_changed_and_removed_packages(self):
+        device = FakeDevice({"com.example.a": 1, "com.example.b": 1, "com.example.c": 1})
+        catalog = PackageCatalog()
+        catalog.refresh(device.run_shell, device.stream_shell)
+
+        device.packages["com.example.a"] = 2
+        del device.packages["com.example.c"]
+        device.packages["com.example.d"] = 1
+        removed = []
+        result = catalog.refresh(device.run_shell, device.stream_shell, on_remove=removed.extend)
+        self.assertEqual(result, {"added": 1, "removed": 1, "changed": 1, "full": False})
+        self.assertEqual(removed, ["com.example.c"])
+        self.assertEqual(catalog.packages["com.example.a"].version_name, "2.0")
+        self.assertEqual(sorted(catalog.packages), ["com.example.a", "com.example.b", "com.example.d"])
+
+    def test_fingerprint_change_forces_full_refresh(self):
+        device = FakeDevice({"com.example.a": 1})
+        catalog = PackageCatalog()
+        catalog.refresh(device.run_shell, device.stream_shell)
+        device.fingerprint = "vendor/device:15/AP1A/2:user/release-keys"
+        self.assertTrue(catalog.refresh(device.run_shell, device.stream_shell)["full"])
+
+    def test_concurrent_refreshes_run_one_at_a_time(self):
+        device = FakeDevice({f"com.example.app{i}": 1 for i in range(5)})
+        catalog = PackageCatalog()
+        active = []
+        overlaps = []
+
+        def tracked(func):
+            def wrapper(*args):
+                active.append(args[0])
+                if len(active) > 1:
+                    overlaps.append(list(active))
+                time.sleep(0.05)
+                try:
+                    return func(*args)
+                finally:
+                    active.remove(args[0])
+            return wrapper
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            catalog.refresh(tracked(device.run_shell), tracked(device.stream_shell)))) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(overlaps, [])
+        # 第二次刷新复用第一次的结果，不再执行dumpsys
+        self.assertEqual(sorted(result["full"] for result in results), [False, True])
+        self.assertEqual(len(catalog.packages), 5)
+
+
+class PackageCatalogPersistenceTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.path = os.path.join(temp.name, "packages", "emu-1.json")
+
+    def test_reopened_catalog_only_lists_packages(self):
+        device = FakeDevice({"com.example.a": 3, "com.example.b": 4})
+        PackageCatalog(self.path).refresh(device.run_shell, device.stream_shell)
+
+        catalog = PackageCatalog(self.path)
+        self.assertEqual(catalog.fingerprint, device.fingerprint)
+        self.assertEqual(catalog.packages["com.example.b"].version_name, "4.0")
+        self.assertIsNotNone(catalog.updated)
+        device.commands = []
+        result = catalog.refresh(device.run_shell, device.stream_shell)
+        self.assertEqual(result, {"added": 0, "removed": 0, "changed": 0, "full": False})
+        self.assertEqual(device.commands, [PackageCatalog.LIST_COMMAND])
+
+    def test_corrupt_cache_is_ignored(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write('{"packages": {"com.example.a": {"unknown_field": 1}}}')
+        catalog = PackageCatalog(self.path)
+        self.assertEqual(catalog.packages, {})
+        device = FakeDevice({"com.example.a": 1})
+        self.assertTrue(catalog.refresh(device.run_shell, device.stream_shell)["full"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备文件按需分页读取与预览格式化测试
+"""
+
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import RemoteFileReader, format_hex_dump, looks_like_text
+
+
+class FakeClient:
+    """按 exec:dd 的参数返回文件内容，并记录每次读取的页范围"""
+
+    def __init__(self, data):
+        self.data = data
+        self.reads = []
+
+    def exec_out(self, serial, command):
+        bs, skip, count = (int(value) for value in re.search(r"bs=(\d+) skip=(\d+) count=(\d+)", command).groups())
+        self.reads.append((skip, count))
+        return self.data[skip * bs:(skip + count) * bs]
+
+
+class SmallPageReader(RemoteFileReader):
+    PAGE_SIZE = 16
+    MAX_CACHED_PAGES = 8
+
+
+def make_reader(size=200):
+    data = bytes(range(256))[:size]
+    client = FakeClient(data)
+    return SmallPageReader(client, "emu-1", "/sdcard/a.bin", len(data)), client, data
+
+
+class RemoteFileReaderTest(unittest.TestCase):
+
+    def test_read_fetches_contiguous_pages_once(self):
+        reader, client, data = make_reader()
+        self.assertEqual(reader.read(20, 40), data[20:60])
+        self.assertEqual(client.reads, [(1, 3)])
+        # 已缓存的页不再传输
+        self.assertEqual(reader.read(16, 48), data[16:64])
+        self.assertEqual(client.reads, [(1, 3)])
+        self.assertEqual(reader.bytes_fetched, 48)
+
+    def test_missing_pages_around_cached_ones_are_merged(self):
+        reader, client, data = make_reader()
+        reader.read(32, 16)
+        reader.read(64, 16)
+        client.reads = []
+        self.assertEqual(reader.read(0, 112), data[0:112])
+        self.assertEqual(client.reads, [(0, 2), (3, 1), (5, 2)])
+
+    def test_read_past_end_of_file(self):
+        reader, client, data = make_reader()
+        self.assertEqual(reader.read(190, 100), data[190:])
+        self.assertEqual(reader.read(200, 10), b"")
+        self.assertEqual(reader.read(-5, 10), data[:10])
+
+    def test_cache_is_bounded_lru(self):
+        reader, client, data = make_reader()
+        reader.read(0, 16)
+        reader.read(16, 128)
+        self.assertEqual(len(reader._pages), SmallPageReader.MAX_CACHED_PAGES)
+        client.reads = []
+        # 最近使用的页保留，最早的页被淘汰
+        reader.read(128, 16)
+        self.assertEqual(client.reads, [])
+        reader.read(0, 16)
+        self.assertEqual(client.reads, [(0, 1)])
+
+
+class PreviewFormatTest(unittest.TestCase):
+
+    def test_hex_dump(self):
+        lines = format_hex_dump(b"ADB toolbox\x00\x01\x02\xff hello", offset=0x100).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0], "00000100  41 44 42 20 74 6f 6f 6c 62 6f 78 00 01 02 ff 20  ADB toolbox.... ")
+        self.assertTrue(lines[1].startswith("00000110  68 65 6c 6c 6f"))
+        self.assertTrue(lines[1].endswith("  hello"))
+
+    def test_looks_like_text(self):
+        self.assertTrue(looks_like_text(b""))
+        self.assertTrue(looks_like_text("日志\r\n\tline".encode("utf-8")))
+        self.assertFalse(looks_like_text(b"PK\x03\x04\x00\x00"))
+        self.assertFalse(looks_like_text(bytes(range(1, 32)) * 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+断点续传（分块日志、中断续传、逐块修复）测试
+"""
+
+import hashlib
+import os
+import re
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ResumableTransfer, SyncEntry, TransferCancelled
+
+
+class SmallChunkTransfer(ResumableTransfer):
+    CHUNK_SIZE = 8 * 1024
+    STREAM_BLOCK = 1024
+    RETRY_DELAY = 0
+    JOURNAL_INTERVAL = 0
+
+
+class FakeSocket:
+    def __init__(self, data, limit=None):
+        self.data = data
+        self.limit = len(data) if limit is None else limit
+        self.position = 0
+
+    def recv(self, size):
+        if self.position >= self.limit:
+            return b""
+        data = self.data[self.position:min(self.position + size, self.position + 700, self.limit)]
+        self.position += len(data)
+        return data
+
+
+class FakeClient:
+    """在内存中模拟设备文件的 exec:dd、sha256sum 与逐块校验脚本
+
+    drops 为 {第几次打开: 断开前发送的字节数}，corrupt 为 {第几次打开: 需要损坏的字节位置}。
+    """
+
+    def __init__(self, data, mtime=1700000000):
+        self.data = data
+        self.mtime = mtime
+        self.commands = []
+        self.drops = {}
+        self.corrupt = {}
+        self.on_open = None
+        self.pool = self
+
+    def stat_path(self, serial, path):
+        return SyncEntry(os.path.basename(path), stat.S_IFREG | 0o644, len(self.data), self.mtime)
+
+    def open_service(self, serial, service, timeout=None):
+        self.commands.append(service)
+        if self.on_open:
+            self.on_open(len(self.commands))
+        bs, skip, count = (int(re.search(rf"{name}=(\d+)", service).group(1)) for name in ("bs", "skip", "count"))
+        data = bytearray(self.data[skip * bs:(skip + count) * bs])
+        if len(self.commands) in self.corrupt:
+            data[self.corrupt[len(self.commands)]] ^= 0xff
+        return FakeSocket(bytes(data), self.drops.get(len(self.commands)))
+
+    def release(self, sock):
+        pass
+
+    def shell_stream(self, serial, command, on_output, cancel_event=None):
+        if command.startswith("sha256sum"):
+            on_output("stdout", f"{hashlib.sha256(self.data).hexdigest()}  file\n".encode())
+        else:
+            count = int(re.search(r"-lt (\d+)", command).group(1))
+            size = SmallChunkTransfer.CHUNK_SIZE
+            for i in range(count):
+                chunk = self.data[i * size:(i + 1) * size]
+                on_output("stdout", f"{hashlib.sha256(chunk).hexdigest()}  -\n".encode())
+        return 0
+
+
+class ResumableTransferTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.local_path = os.path.join(temp.name, "big.bin")
+        self.journal_dir = os.path.join(temp.name, "journal")
+        # 5个完整的块加半个块
+        self.data = os.urandom(SmallChunkTransfer.CHUNK_SIZE * 5 + 4000)
+
+    def transfer(self, client):
+        return SmallChunkTransfer(client, "emu-1", "/sdcard/big.bin", self.local_path, self.journal_dir)
+
+    def read_local(self):
+        with open(self.local_path, "rb") as f:
+            return f.read()
+
+    def test_full_pull(self):
+        client = FakeClient(self.data)
+        result = self.transfer(client).pull()
+        self.assertEqual(self.read_local(), self.data)
+        self.assertEqual(result["sha256"], hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(result["resumed_bytes"], 0)
+        self.assertEqual(result["repaired_chunks"], 0)
+        self.assertEqual(len(client.commands), 6)
+        self.assertEqual(os.path.getmtime(self.local_path), client.mtime)
+        self.assertFalse(os.path.exists(self.local_path + ".part"))
+        self.assertEqual(os.listdir(self.journal_dir), [])
+
+    def test_resume_after_cancel(self):
+        client = FakeClient(self.data)
+        transfer = self.transfer(client)
+
+        def cancel_on_fourth_chunk(count):
+            if count == 4:
+                transfer.cancel_event.set()
+
+        client.on_open = cancel_on_fourth_chunk
+        with self.assertRaises(TransferCancelled):
+            transfer.pull()
+        self.assertTrue(os.path.exists(self.local_path + ".part"))
+
+        client = FakeClient(self.data)
+        result = self.transfer(client).pull()
+        self.assertEqual(self.read_local(), self.data)
+        self.assertEqual(result["resumed_bytes"], 3 * SmallChunkTransfer.CHUNK_SIZE)
+        # 只传输剩下的3个块
+        self.assertEqual([re.search(r"skip=(\d+)", command).group(1) for command in client.commands],
+                         ["24", "32", "40"])
+
+    def test_damaged_local_chunk_is_fetched_again(self):
+        client = FakeClient(self.data)
+        transfer = self.transfer(client)
+        client.on_open = lambda count: count == 6 and transfer.cancel_event.set()
+        with self.assertRaises(TransferCancelled):
+            transfer.pull()
+        with open(self.local_path + ".part", "r+b") as f:
+            f.seek(SmallChunkTransfer.CHUNK_SIZE + 10)
+            f.write(b"\0" * 4)
+
+        client = FakeClient(self.data)
+        result = self.transfer(client).pull()
+        self.assertEqual(self.read_local(), self.data)
+        self.assertEqual(result["resumed_bytes"], 4 * SmallChunkTransfer.CHUNK_SIZE)
+        self.assertEqual([re.search(r"skip=(\d+)", command).group(1) for command in client.commands], ["8", "40"])
+
+    def test_dropped_connection_resumes_inside_chunk(self):
+        client = FakeClient(self.data)
+        client.drops = {2: 5000}
+        result = self.transfer(client).pull()
+        self.assertEqual(self.read_local(), self.data)
+        self.assertEqual(result["repaired_chunks"], 0)
+        # 第二个块断开后从已收到的4个对齐单位之后继续
+        self.assertIn("skip=12 count=4", client.commands[2])
+
+    def test_corrupted_transfer_is_repaired(self):
+        client = FakeClient(self.data)
+        client.corrupt = {3: 100}
+        result = self.transfer(client).pull()
+        self.assertEqual(self.read_local(), self.data)
+        self.assertEqual(result["repaired_chunks"], 1)
+        self.assertIn("skip=16 ", client.commands[-1])
+
+    def test_changed_remote_file_restarts(self):
+        client = FakeClient(self.data)
+        transfer = self.transfer(client)
+        client.on_open = lambda count: count == 3 and transfer.cancel_event.set()
+        with self.assertRaises(TransferCancelled):
+            transfer.pull()
+
+        self.data = os.urandom(len(self.data))
+        client = FakeClient(self.data, mtime=1700000100)
+        result = self.transfer(client).pull()
+        self.assertEqual(self.read_local(), self.data)
+        self.assertEqual(result["resumed_bytes"], 0)
+        self.assertEqual(len(client.commands), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+sync协议会话（LIST/LIS2、STAT/STA2、SEND/RECV）与 ls 输出解析测试
+"""
+
+import io
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ADBServerClient, ADBSyncFailure, ADBSyncSession, parse_ls_output
+
+
+class FakeSyncDevice:
+    """在本地目录上实现sync协议的设备端，响应按3字节一段发送以检验分帧
+
+    与adbd一样，STAT使用lstat（不跟随符号链接），STA2跟随符号链接。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.requests = []
+        self.sock, self.peer = socket.socketpair()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _recv_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.peer.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def _send(self, data):
+        for i in range(0, len(data), 3):
+            self.peer.sendall(data[i:i + 3])
+
+    def _path(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def _serve(self):
+        try:
+            while True:
+                header = self._recv_exact(8)
+                command, length = header[:4], struct.unpack("<I", header[4:])[0]
+                if command == b"QUIT":
+                    return
+                arg = self._recv_exact(length).decode("utf-8")
+                self.requests.append((command, arg))
+                getattr(self, "_do_" + command.decode().lower())(arg)
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.peer.close()
+
+    def _fail(self, message):
+        data = message.encode("utf-8")
+        self._send(b"FAIL" + struct.pack("<I", len(data)) + data)
+
+    def _do_list(self, path):
+        directory = self._path(path)
+        if not os.path.isdir(directory):
+            return self._fail("No such file or directory")
+        for name in [".", ".."] + sorted(os.listdir(directory)):
+            st = os.lstat(os.path.join(directory, name))
+            data = name.encode("utf-8")
+            self._send(b"DENT" + struct.pack("<IIII", st.st_mode, st.st_size, int(st.st_mtime), len(data)) + data)
+        self._send(b"DONE" + b"\0" * 16)
+
+    def _do_lis2(self, path):
+        directory = self._path(path)
+        for name in [".", ".."] + sorted(os.listdir(directory)):
+            st = os.lstat(os.path.join(directory, name))
+            data = name.encode("utf-8")
+            self._send(b"DNT2" + ADBSyncSession.DENT_V2.pack(
+                0, 0, 0, st.st_mode, 1, 1000, 1000, st.st_size, 0, int(st.st_mtime), 0, len(data)) + data)
+        self._send(b"DONE" + b"\0" * ADBSyncSession.DENT_V2.size)
+
+    def _do_stat(self, path):
+        try:
+            st = os.lstat(self._path(path))
+            self._send(b"STAT" + struct.pack("<III", st.st_mode, st.st_size, int(st.st_mtime)))
+        except OSError:
+            self._send(b"STAT" + b"\0" * 12)
+
+    def _do_sta2(self, path):
+        try:
+            st = os.stat(self._path(path))
+            self._send(b"STA2" + ADBSyncSession.STAT_V2.pack(
+                0, 0, 0, st.st_mode, 1, 1000, 1000, st.st_size, 0, int(st.st_mtime), 0))
+        except OSError as e:
+            self._send(b"STA2" + ADBSyncSession.STAT_V2.pack(e.errno, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+
+    def _do_recv(self, path):
+        try:
+            with open(self._path(path), "rb") as f:
+                data = f.read()
+        except OSError as e:
+            return self._fail(e.strerror)
+        for i in range(0, len(data), 1000):
+            chunk = data[i:i + 1000]
+            self._send(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+        self._send(b"DONE" + b"\0" * 4)
+
+    def _do_send(self, arg):
+        path, _mode = arg.rsplit(",", 1)
+        target = self._path(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            while True:
+                header = self._recv_exact(8)
+                length = struct.unpack("<I", header[4:])[0]
+                if header[:4] == b"DONE":
+                    break
+                f.write(self._recv_exact(length))
+        os.utime(target, (length, length))
+        self._send(b"OKAY" + b"\0" * 4)
+
+
+class ADBSyncSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.root = temp.name
+        os.makedirs(os.path.join(self.root, "sdcard", "DCIM"))
+        with open(os.path.join(self.root, "sdcard", "a.txt"), "wb") as f:
+            f.write(b"hello")
+        with open(os.path.join(self.root, "sdcard", "文件 1.jpg"), "wb") as f:
+            f.write(b"x" * 300)
+        os.symlink("sdcard", os.path.join(self.root, "link_dir"))
+        os.symlink("sdcard/a.txt", os.path.join(self.root, "link_file"))
+
+    def start(self, features):
+        device = FakeSyncDevice(self.root)
+        self.addCleanup(device.sock.close)
+        client = ADBServerClient(port=1)
+        return device, ADBSyncSession(client, device.sock, features)
+
+    def check_list(self, features):
+        _device, sync = self.start(features)
+        entries = {entry.name: entry for entry in sync.list("/sdcard")}
+        self.assertEqual(sorted(entries), ["DCIM", "a.txt", "文件 1.jpg"])
+        self.assertTrue(stat.S_ISDIR(entries["DCIM"].mode))
+        self.assertEqual(entries["a.txt"].size, 5)
+        self.assertEqual(entries["文件 1.jpg"].size, 300)
+        return entries
+
+    def test_list_v1(self):
+        entries = self.check_list(set())
+        self.assertIsNone(entries["a.txt"].uid)
+
+    def test_list_v2(self):
+        entries = self.check_list({"ls_v2"})
+        self.assertEqual(entries["a.txt"].uid, 1000)
+
+    def test_list_missing_dir_raises_sync_failure(self):
+        _device, sync = self.start(set())
+        with self.assertRaises(ADBSyncFailure):
+            sync.list("/missing")
+
+    def test_stat_missing_file(self):
+        for features in (set(), {"stat_v2"}):
+            _device, sync = self.start(features)
+            self.assertIsNone(sync.stat("/sdcard/missing"))
+
+    def test_stat_v1_follows_directory_links(self):
+        device, sync = self.start(set())
+        entry = sync.stat("/link_dir")
+        self.assertTrue(stat.S_ISDIR(entry.mode))
+        self.assertEqual(entry.name, "link_dir")
+        self.assertIn((b"STAT", "/link_dir/."), device.requests)
+        # 指向文件的链接无法通过 "链接/." 解析，保留链接本身
+        self.assertTrue(stat.S_ISLNK(sync.stat("/link_file").mode))
+
+    def test_stat_many_keeps_order_across_batches(self):
+        for features in (set(), {"stat_v2"}):
+            _device, sync = self.start(features)
+            paths = ["/sdcard/a.txt", "/missing", "/link_dir", "/sdcard/DCIM", "/sdcard/文件 1.jpg"]
+            results = sync.stat_many(paths, batch_size=2)
+            self.assertEqual(results[0].size, 5)
+            self.assertIsNone(results[1])
+            self.assertTrue(stat.S_ISDIR(results[2].mode))
+            self.assertEqual(results[2].name, "link_dir")
+            self.assertTrue(stat.S_ISDIR(results[3].mode))
+            self.assertEqual(results[4].name, "文件 1.jpg")
+
+    def test_send_and_recv(self):
+        _device, sync = self.start(set())
+        data = os.urandom(200 * 1024)
+        sent = []
+        sync.send(io.BytesIO(data), "/sdcard/new/data.bin", 0o644, 1700000000, on_data=sent.append)
+        self.assertEqual(sum(sent), len(data))
+        self.assertEqual(os.path.getmtime(os.path.join(self.root, "sdcard", "new", "data.bin")), 1700000000)
+        output = io.BytesIO()
+        sync.recv("/sdcard/new/data.bin", output)
+        self.assertEqual(output.getvalue(), data)
+        with self.assertRaises(ADBSyncFailure):
+            sync.recv("/sdcard/missing", io.BytesIO())
+
+
+class ParseLsOutputTest(unittest.TestCase):
+
+    def test_toybox_format(self):
+        text = (
+            "total 24\n"
+            "drwxrwx--x  4 root sdcard_rw 4096 2024-03-01 10:20 .\n"
+            "drwxrwx--x  4 root sdcard_rw 4096 2024-03-01 10:20 ..\n"
+            "drwxrwx--x  2 root sdcard_rw 4096 2024-03-01 10:20 DCIM\n"
+            "-rw-rw----  1 u0_a1 sdcard_rw 12345 2024-03-02 08:05 my file.txt\n"
+            "lrwxrwxrwx  1 root root 21 2024-01-01 00:00 sdcard -> /storage/self/primary\n"
+            "crw-rw-rw-  1 root root 1,   3 2024-01-01 00:00 null\n"
+        )
+        entries = {entry.name: entry for entry in parse_ls_output(text)}
+        self.assertEqual(sorted(entries), ["DCIM", "my file.txt", "null", "sdcard"])
+        self.assertTrue(stat.S_ISDIR(entries["DCIM"].mode))
+        self.assertEqual(entries["my file.txt"].size, 12345)
+        self.assertEqual(stat.S_IMODE(entries["my file.txt"].mode), 0o660)
+        self.assertEqual(entries["my file.txt"].uid, "u0_a1")
+        self.assertEqual(entries["my file.txt"].mtime,
+                         int(time.mktime(time.strptime("2024-03-02 08:05", "%Y-%m-%d %H:%M"))))
+        self.assertTrue(stat.S_ISLNK(entries["sdcard"].mode))
+        self.assertTrue(stat.S_ISCHR(entries["null"].mode))
+        self.assertEqual(entries["null"].size, 0)
+
+    def test_busybox_format(self):
+        text = (
+            "-rw-r--r--    1 root     root          100 Jan  5  2021 old.log\n"
+            "-rw-r--r--    1 root     root          200 Mar  2 08:05 new.log\n"
+        )
+        entries = {entry.name: entry for entry in parse_ls_output(text)}
+        self.assertEqual(entries["old.log"].size, 100)
+        self.assertEqual(time.localtime(entries["old.log"].mtime).tm_year, 2021)
+        self.assertEqual(time.localtime(entries["new.log"].mtime).tm_year, time.localtime().tm_year)
+
+    def test_ignores_errors_and_short_lines(self):
+        text = "ls: /data: Permission denied\n\n-rw-r--r-- 1 root\n"
+        self.assertEqual(parse_ls_output(text), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩略图并行获取与缓存测试
+"""
+
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (ADBError, ADBSyncFailure, LRUFileCache, PIL_AVAILABLE, ThumbnailLoader, TransferCancelled,
+                  make_thumbnail)
+
+
+def fake_thumbnail(data, path, size):
+    """代替Pillow：以 bad 开头的数据视为无法识别的图片"""
+    if data.startswith(b"bad"):
+        raise ValueError("cannot identify image file")
+    with open(path, "wb") as f:
+        f.write(b"thumb:" + data)
+
+
+class FakeSync:
+    def __init__(self, device):
+        self.device = device
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def recv(self, remote_path, fileobj, on_data=None):
+        with self.device.lock:
+            self.device.received.append(remote_path)
+        if remote_path in self.device.disconnect:
+            raise ADBError("连接已断开")
+        if remote_path not in self.device.files:
+            raise ADBSyncFailure(f"{remote_path}: No such file or directory")
+        fileobj.write(self.device.files[remote_path])
+
+
+class FakeClient:
+    def __init__(self, files, disconnect=()):
+        self.files = files
+        self.disconnect = set(disconnect)
+        self.lock = threading.Lock()
+        self.received = []
+        self.sessions = 0
+
+    def open_sync(self, serial):
+        with self.lock:
+            self.sessions += 1
+        return FakeSync(self)
+
+
+def make_items(count):
+    return [(f"/sdcard/DCIM/IMG_{i:04d}.jpg", 100 + i, 1700000000 + i) for i in range(count)]
+
+
+class ThumbnailLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.cache = LRUFileCache(temp.name, 1024 * 1024)
+        patcher = mock.patch("main.make_thumbnail", fake_thumbnail)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetches_missing_and_reuses_cache(self):
+        items = make_items(20)
+        client = FakeClient({path: path.encode("utf-8") for path, _size, _mtime in items})
+        ready = []
+        loader = ThumbnailLoader(client, "emu-1", self.cache, items, streams=4, on_ready=ready.append)
+        self.assertEqual(loader.run(), 20)
+        self.assertEqual(sorted(ready), list(range(20)))
+        self.assertLessEqual(client.sessions, 4)
+        with open(loader.cached(3), "rb") as f:
+            self.assertEqual(f.read(), b"thumb:/sdcard/DCIM/IMG_0003.jpg")
+
+        # 已缓存的缩略图不访问设备；尺寸或修改时间不同则是另一个缓存项
+        client.received = []
+        self.assertEqual(ThumbnailLoader(client, "emu-1", self.cache, items).run(), 0)
+        self.assertEqual(client.received, [])
+        changed = [(items[0][0], items[0][1], items[0][2] + 1)]
+        self.assertEqual(ThumbnailLoader(client, "emu-1", self.cache, changed).run(), 1)
+        self.assertIsNone(ThumbnailLoader(client, "emu-1", self.cache, items, size=256).cached(0))
+
+    def test_visible_positions_first(self):
+        items = make_items(10)
+        client = FakeClient({path: b"img" for path, _size, _mtime in items})
+        loader = ThumbnailLoader(client, "emu-1", self.cache, items, streams=1)
+        loader.set_visible(6, 9)
+        loader.run()
+        self.assertEqual([int(path[-8:-4]) for path in client.received], [6, 7, 8, 0, 1, 2, 3, 4, 5, 9])
+
+    def test_failures_only_affect_their_image(self):
+        items = make_items(6) + [("/sdcard/DCIM/huge.png", ThumbnailLoader.MAX_IMAGE_SIZE + 1, 0)]
+        files = {path: b"img" for path, _size, _mtime in items}
+        del files[items[1][0]]
+        del files[items[2][0]]
+        del files[items[3][0]]
+        files[items[4][0]] = b"bad data"
+        client = FakeClient(files)
+        loader = ThumbnailLoader(client, "emu-1", self.cache, items, streams=1)
+        # 三张设备无法读取的图片不会使工作线程停止
+        self.assertEqual(loader.run(), 2)
+        self.assertEqual(loader.failed, 5)
+        self.assertNotIn("/sdcard/DCIM/huge.png", client.received)
+        self.assertIsNone(loader.cached(4))
+
+    def test_worker_stops_after_repeated_connection_errors(self):
+        items = make_items(5)
+        client = FakeClient({path: b"img" for path, _size, _mtime in items},
+                            disconnect=[path for path, _size, _mtime in items[:4]])
+        loader = ThumbnailLoader(client, "emu-1", self.cache, items, streams=1)
+        self.assertEqual(loader.run(), 0)
+        self.assertEqual(loader.failed, ThumbnailLoader.MAX_SESSION_ERRORS)
+        self.assertEqual(client.sessions, ThumbnailLoader.MAX_SESSION_ERRORS)
+
+    def test_cancel(self):
+        items = make_items(3)
+        cancel = threading.Event()
+        cancel.set()
+        loader = ThumbnailLoader(FakeClient({}), "emu-1", self.cache, items, cancel_event=cancel)
+        with self.assertRaises(TransferCancelled):
+            loader.run()
+
+
+@unittest.skipUnless(PIL_AVAILABLE, "需要Pillow")
+class MakeThumbnailTest(unittest.TestCase):
+
+    def test_downsizes_to_jpeg(self):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGBA", (800, 400), (255, 0, 0, 128)).save(buffer, "PNG")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "thumb.jpg")
+            make_thumbnail(buffer.getvalue(), path, 128)
+            with Image.open(path) as image:
+                self.assertEqual((image.format, image.size, image.mode), ("JPEG", (128, 64), "RGB"))
+
+
+if __name__ == "__main__":
+    unittest.main()
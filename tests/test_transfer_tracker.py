@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+传输进度记录与传输历史测试
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import TransferRecord, TransferTracker, format_duration, format_size
+
+
+class TransferRecordTest(unittest.TestCase):
+
+    def test_rates_and_eta(self):
+        with mock.patch("main.time.time", return_value=100):
+            record = TransferRecord(1, "pull a.mp4", "emu-1", "pull", total_bytes=1000)
+        for now, done in ((101, 100), (102, 200), (103, 300), (104, 500), (105, 700)):
+            with mock.patch("main.time.time", return_value=now):
+                record.update(done)
+        with mock.patch("main.time.time", return_value=105):
+            # 瞬时速率只看最近 RATE_WINDOW 秒内的样本
+            self.assertEqual(record.instant_rate, (700 - 200) / 3)
+            self.assertEqual(record.average_rate, 140)
+            self.assertAlmostEqual(record.eta, 300 / (500 / 3))
+            record.add(300)
+            self.assertEqual(record.eta, 0)
+
+    def test_unknown_total_has_no_eta(self):
+        record = TransferRecord(1, "push", "emu-1", "push")
+        record.add(10)
+        self.assertIsNone(record.eta)
+        record.update(10, total_bytes=20)
+        self.assertEqual(record.total_bytes, 20)
+
+    def test_finished_record_uses_average(self):
+        with mock.patch("main.time.time", return_value=100):
+            record = TransferRecord(1, "pull", "emu-1", "pull")
+        with mock.patch("main.time.time", return_value=104):
+            record.update(400)
+        record.finished = 102
+        self.assertEqual(record.elapsed, 2)
+        self.assertEqual(record.instant_rate, 200)
+        self.assertEqual(record.to_dict()["rate"], 200)
+
+
+class TransferTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.path = os.path.join(temp.name, "history", "transfers.json")
+
+    def test_active_and_history_persist(self):
+        tracker = TransferTracker(self.path)
+        first = tracker.start("pull a", "emu-1", "pull", 10)
+        second = tracker.start("push b", "emu-2", "push")
+        self.assertEqual([record.id for record in tracker.active()], [1, 2])
+        first.add(10)
+        tracker.finish(first)
+        tracker.finish(second, "失败", "device offline")
+        self.assertEqual(tracker.active(), [])
+        self.assertEqual(tracker.version, 2)
+
+        history = TransferTracker(self.path).history
+        self.assertEqual([(item["description"], item["status"], item["error"]) for item in history],
+                         [("pull a", "完成", None), ("push b", "失败", "device offline")])
+        self.assertEqual(history[0]["bytes"], 10)
+        tracker.clear_history()
+        self.assertEqual(TransferTracker(self.path).history, [])
+
+    def test_history_is_bounded(self):
+        tracker = TransferTracker()
+        tracker.HISTORY_LIMIT = 3
+        for i in range(5):
+            tracker.finish(tracker.start(f"t{i}", "emu-1", "pull"))
+        self.assertEqual([item["description"] for item in tracker.history], ["t2", "t3", "t4"])
+
+
+class FormatTest(unittest.TestCase):
+
+    def test_format_size(self):
+        self.assertEqual(format_size(512), "512 B")
+        self.assertEqual(format_size(1536), "1.5 KB")
+        self.assertEqual(format_size(5 * 1024 ** 4), "5120.0 GB")
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(42.9), "42s")
+        self.assertEqual(format_duration(125), "2m05s")
+        self.assertEqual(format_duration(3725), "1h02m")
+
+
+if __name__ == "__main__":
+    unittest.main()